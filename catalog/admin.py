@@ -1,20 +1,59 @@
 from django.contrib import admin
-from .models import Author, Genre, Book, BookInstance, Language
+from django.db.models import Subquery
+from django.forms.models import BaseInlineFormSet
+
+from .models import Author, Genre, Book, BookInstance, Language, OverdueLoan
+from .pagination import CachedCountPaginator
 
 
 admin.site.register(Genre)
 admin.site.register(Language)
 
 
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelists of tables with millions of rows: large counts are cached
+      (see CachedCountPaginator) and a filtered list doesn't count the
+      whole table again for the "(n total)" link
+    """
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+
+
+class LimitedInlineFormSet(BaseInlineFormSet):
+    """Inline formset editing only the first 'max_shown' related objects"""
+    max_shown = 20
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            queryset = super().get_queryset()
+            # A sliced queryset can't be filtered or saved, limit by pk
+            self._queryset = queryset.filter(
+                pk__in=Subquery(queryset.values('pk')[:self.max_shown]))
+        return self._queryset
+
+
 class BookInstanceInline(admin.TabularInline):
+    """
+    The book's first copies by due date, the others are edited from the
+      copies' changelist filtered by the book
+    """
     model = BookInstance
+    formset = LimitedInlineFormSet
+    ordering = ('due_back', 'instance_id')
+    raw_id_fields = ('borrower',)
+    show_change_link = True
     extra = 0
 
 
 @admin.register(BookInstance)
-class BookInstanceAdmin(admin.ModelAdmin):
+class BookInstanceAdmin(LargeTableAdmin):
     list_display = ('book', 'status', 'borrower', 'instance_id')
     list_filter = ('status', 'due_back')
+    list_select_related = ('book', 'borrower')
+    # Matches bookinst_due_idx, or bookinst_status_due_idx filtered by status
+    ordering = ('due_back', 'instance_id')
+    raw_id_fields = ('book', 'borrower')
 
     fieldsets = (
         ('Summary', {
@@ -27,11 +66,26 @@ class BookInstanceAdmin(admin.ModelAdmin):
 
 
 @admin.register(Book)
-class BookAdmin(admin.ModelAdmin):
-    list_display = ('title', 'author', 'display_genre')
+class BookAdmin(LargeTableAdmin):
+    list_display = ('title', 'author', 'display_genre', 'copies_available',
+                    'copies_on_loan')
+    list_select_related = ('author',)
+    raw_id_fields = ('author',)
     inlines = [BookInstanceInline]
 
 
 @admin.register(Author)
-class AuthorAdmin(admin.ModelAdmin):
+class AuthorAdmin(LargeTableAdmin):
     list_display = ('last_name', 'first_name', 'dob', 'dod')
+    # Matches author_name_idx
+    ordering = ('last_name', 'first_name', 'id')
+
+
+@admin.register(OverdueLoan)
+class OverdueLoanAdmin(LargeTableAdmin):
+    list_display = ('book', 'borrower', 'due_back', 'days_overdue',
+                    'first_seen', 'resolved')
+    list_filter = (('resolved', admin.EmptyFieldListFilter), 'due_back')
+    list_select_related = ('book', 'borrower')
+    raw_id_fields = ('instance', 'book', 'borrower')
+    date_hierarchy = 'due_back'
@@ -0,0 +1,20 @@
+"""catalog.urls with the read-only pages served by catalog.async_views"""
+from django.urls import path
+
+from . import urls, async_views
+
+
+ASYNC_VIEWS = {
+    'index': async_views.index,
+    'books-all': async_views.BookListView.as_view(),
+    'book-detail': async_views.BookDetailView.as_view(),
+    'books-all-copies': async_views.BookInstanceListView.as_view(),
+    'authors-all': async_views.AuthorListView.as_view(),
+    'authors-detail': async_views.AuthorDetailView.as_view(),
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name], name=pattern.name)
+    if pattern.name in ASYNC_VIEWS else pattern
+    for pattern in urls.urlpatterns
+]
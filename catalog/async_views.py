@@ -0,0 +1,118 @@
+"""
+Async versions of the read-only catalog pages, served in place of the ones
+  in catalog.views under ASGI (see locallibrary/asgi_urls.py). They render
+  the same templates with the same context, but a request waiting on a slow
+  client holds a coroutine instead of a worker thread.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.mixins import PermissionRequiredMixin
+from django.http import Http404
+from django.template.response import TemplateResponse
+
+from . import views, visits
+from .caching import AsyncConditionalPageMixin
+from .pagination import InvalidCursor
+from .stats import aget_dashboard_stats
+
+
+async def index(request):
+    # Independent reads, awaited together
+    num_visits, stats = await asyncio.gather(
+        visits.avisit_count(request),
+        aget_dashboard_stats(),
+    )
+
+    context = {
+        'num_visits': num_visits,
+        **stats,
+    }
+
+    # Rendered in the sync thread, where the templates may query lazily
+    return visits.record_visit(
+        TemplateResponse(request, 'index.html', context), num_visits)
+
+
+class AsyncListMixin:
+    """ListView's get() and context, paged with the async ORM"""
+    async def get(self, request, *args, **kwargs):
+        self.object_list = queryset = self.get_queryset()
+        paginator, page, object_list, is_paginated = \
+            await self.apaginate_queryset(queryset, self.paginate_by)
+
+        context = {
+            'view': self,
+            'paginator': paginator,
+            'page_obj': page,
+            'is_paginated': is_paginated,
+            'object_list': object_list,
+            self.get_context_object_name(queryset): object_list,
+        }
+
+        return self.render_to_response(context)
+
+
+class AsyncDetailMixin:
+    """DetailView's get(), loading the object with the async ORM"""
+    async def aget_object(self):
+        # Loaded already when Last-Modified was computed
+        if getattr(self, 'object', None) is None:
+            queryset = self.get_queryset()
+            try:
+                self.object = await queryset.aget(
+                    pk=self.kwargs[self.pk_url_kwarg])
+            except queryset.model.DoesNotExist:
+                raise Http404(f'No {queryset.model._meta.verbose_name} '
+                              f'found matching the query')
+        return self.object
+
+    async def get(self, request, *args, **kwargs):
+        self.object = await self.aget_object()
+        # Reads the fragment cache's version stamps
+        context = await sync_to_async(self.get_context_data)(
+            object=self.object)
+
+        return self.render_to_response(context)
+
+
+class BookListView(AsyncConditionalPageMixin, AsyncListMixin,
+                   views.BookListView):
+    pass
+
+
+class BookDetailView(AsyncConditionalPageMixin, AsyncDetailMixin,
+                     views.BookDetailView):
+    pass
+
+
+class AuthorListView(AsyncConditionalPageMixin, AsyncListMixin,
+                     views.AuthorListView):
+    pass
+
+
+class AuthorDetailView(AsyncConditionalPageMixin, AsyncDetailMixin,
+                       views.AuthorDetailView):
+    pass
+
+
+class BookInstanceListView(views.BookInstanceListView):
+    """The copies list, its status sections read concurrently"""
+    async def dispatch(self, request, *args, **kwargs):
+        if not await sync_to_async(self.has_permission)():
+            return await sync_to_async(self.handle_no_permission)()
+
+        # PermissionRequiredMixin's sync dispatch() is replaced by this one
+        return await super(PermissionRequiredMixin, self).dispatch(
+            request, *args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            pages = await asyncio.gather(*(
+                paginator.apage(cursor)
+                for paginator, cursor in self.get_paginators()))
+        except InvalidCursor:
+            raise Http404('Invalid page cursor')
+
+        return self.render_to_response(
+            self.get_context_data(pages=pages, **kwargs))
@@ -0,0 +1,332 @@
+"""
+Route benchmark for the catalog: seeds a catalog of a given size with the
+  BulkSeeder (catalog.seeding), times every read route through the test client
+  and compares the results with a JSON baseline (see the benchmark_catalog
+  command). Also measures the concurrent read/write throughput of an SQLite
+  file under the catalog.sqlite pragma profile (see benchmark_sqlite).
+"""
+import datetime
+import platform
+import random
+import sqlite3
+import statistics
+import threading
+import time
+
+import django
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.middleware import QueryRecorder
+from catalog.models import Author, Book, BookInstance
+from catalog.pagination import KeysetPaginator, FORWARD
+from catalog.views import BookListView
+from catalog import counters, sqlite
+from catalog.seeding import BulkSeeder
+
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+DEF_SEED = 'benchmark'
+DEF_ITERATIONS = 50
+DEF_THRESHOLD = 0.2
+# Differences below this are timer noise, whatever the relative change
+DEF_MIN_DELTA_MS = 1.0
+
+COPIES_PER_BOOK = 2
+LOANS = 10
+SAMPLES = 20
+
+PASSWORD = 'benchmark'
+
+DEF_READERS = 4
+DEF_WRITERS = 2
+DEF_SECONDS = 5.0
+
+
+def seed_catalog(books, seed=DEF_SEED):
+    """Insert 'books' books with their authors, genres and copies"""
+    BulkSeeder(seed).books(books, copies=(COPIES_PER_BOOK, COPIES_PER_BOOK))
+
+
+def seed_users():
+    """A librarian and a patron with a few loans"""
+    librarian = User.objects.create_user('librarian', password=PASSWORD,
+                                         is_staff=True)
+    librarian.user_permissions.set(Permission.objects.filter(
+        codename__in=['can_view_all_books', 'can_mark_returned_books']))
+
+    patron = User.objects.create_user('patron', password=PASSWORD)
+    loans = BookInstance.objects.values_list('pk', flat=True)[:LOANS]
+    BookInstance.objects.filter(pk__in=list(loans)).update(
+        status='o', borrower=patron,
+        due_back=datetime.date.today() + datetime.timedelta(weeks=3))
+    counters.reconcile(BookInstance.objects.filter(borrower=patron)
+                       .values_list('book_id', flat=True))
+
+
+def login_clients():
+    """Test clients logged in as the users from seed_users(), by username"""
+    clients = {}
+
+    for user in User.objects.filter(username__in=['librarian', 'patron']):
+        clients[user.username] = Client()
+        clients[user.username].force_login(user)
+
+    return clients
+
+
+def _sample_pks(model, rng):
+    pks = model.objects.order_by('pk').values_list('pk', flat=True)
+    first, last = pks.first(), pks.last()
+    if first is None:
+        return []
+
+    candidates = {rng.randint(first, last) for _ in range(SAMPLES)}
+    return list(model.objects.filter(pk__in=candidates)
+                .values_list('pk', flat=True))
+
+
+def routes(clients, seed=DEF_SEED):
+    """(name, client, urls) for each route in catalog/urls.py timed"""
+    rng = random.Random(seed)
+    anonymous = Client()
+
+    books = _sample_pks(Book, rng)
+    authors = _sample_pks(Author, rng)
+
+    # A cursor from the middle of the book list, the deep pages keyset
+    #   pagination keeps as cheap as the first one
+    paginator = KeysetPaginator(Book.objects.all(),
+                                BookListView.cursor_ordering, 1)
+    middle = Book.objects.order_by(*BookListView.cursor_ordering)\
+        [Book.objects.count() // 2]
+    deep = KeysetPaginator.encode_cursor(paginator.key(middle), FORWARD)
+
+    loans = BookInstance.objects.filter(borrower__username='patron')\
+        .values_list('pk', flat=True)
+
+    return [
+        ('index', anonymous, [reverse('index')]),
+        ('books-all', anonymous, [reverse('books-all')]),
+        ('books-all (deep)', anonymous,
+         [f"{reverse('books-all')}?cursor={deep}"]),
+        ('book-detail', anonymous,
+         [reverse('book-detail', args=[pk]) for pk in books]),
+        ('authors-all', anonymous, [reverse('authors-all')]),
+        ('authors-detail', anonymous,
+         [reverse('authors-detail', args=[pk]) for pk in authors]),
+        ('books-all-copies', clients['librarian'],
+         [reverse('books-all-copies')]),
+        ('my-books', clients['patron'], [reverse('my-books')]),
+        ('books-renew-librarian', clients['librarian'],
+         [reverse('books-renew-librarian', args=[pk]) for pk in loans]),
+    ]
+
+
+def percentile(timings, q):
+    """The q-th percentile of the timings, interpolated between ranks"""
+    if len(timings) == 1:
+        return timings[0]
+
+    return statistics.quantiles(timings, n=100, method='inclusive')[q - 1]
+
+
+def time_route(client, urls, iterations, cached=False):
+    """
+    Timings of GETs of the urls in turn, each with the caches cleared first
+      unless 'cached', when they are warmed up by a request beforehand and
+      every timed one is likely a hit of the page cache
+    """
+    # Warm up the caches and connections the route uses
+    client.get(urls[0])
+
+    timings, queries = [], []
+    for i in range(iterations):
+        url = urls[i % len(urls)]
+        recorder = QueryRecorder()
+        if not cached:
+            cache.clear()
+
+        with connection.execute_wrapper(recorder):
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        if response.status_code != 200:
+            raise AssertionError(f'GET {url} returned {response.status_code}')
+        queries.append(recorder.queries)
+
+    return {
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'queries': max(queries),
+    }
+
+
+def run_benchmark(clients, iterations=DEF_ITERATIONS, seed=DEF_SEED,
+                  progress=None):
+    results = {}
+
+    for name, client, urls in routes(clients, seed):
+        if not urls:
+            continue
+        for label, cached in ((name, False), (f'{name} (cached)', True)):
+            results[label] = time_route(client, urls, iterations, cached)
+            if progress:
+                progress(label, results[label])
+
+    return {
+        'meta': {
+            'books': Book.objects.count(),
+            'copies': BookInstance.objects.count(),
+            'iterations': iterations,
+            'seed': seed,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'sqlite': sqlite3.sqlite_version,
+        },
+        'routes': results,
+    }
+
+
+def compare(baseline, current, threshold=DEF_THRESHOLD,
+            min_delta_ms=DEF_MIN_DELTA_MS):
+    """
+    Regressions of 'current' against 'baseline': a route running more
+      queries, or whose p50/p95/p99 grew by more than 'threshold' (a
+      fraction) and 'min_delta_ms'
+    """
+    regressions = []
+
+    for name, before in baseline['routes'].items():
+        after = current['routes'].get(name)
+        if after is None:
+            regressions.append(f'{name}: missing from the current run')
+            continue
+
+        if after['queries'] > before['queries']:
+            regressions.append(f"{name}: {after['queries']} queries, "
+                               f"baseline {before['queries']}")
+
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            delta = after[key] - before[key]
+            if delta > before[key] * threshold and delta > min_delta_ms:
+                regressions.append(
+                    f'{name}: {key} {after[key]:.2f}, baseline '
+                    f'{before[key]:.2f} (+{delta / before[key]:.0%})')
+
+    return regressions
+
+
+def _throughput_queries():
+    book = Book._meta.db_table
+    copy = BookInstance._meta.db_table
+
+    return {
+        'books': f'SELECT id FROM {book}',
+        'copies': f'SELECT instance_id FROM {copy}',
+        # The book detail page
+        'read': [f'SELECT id, title, summary, isbn FROM {book} WHERE id = ?',
+                 f'SELECT instance_id, imprint, status, due_back FROM {copy} '
+                 f'WHERE book_id = ? ORDER BY due_back, instance_id'],
+        # A renewal
+        'write': f'UPDATE {copy} SET due_back = ?, updated_at = ? '
+                 f'WHERE instance_id = ?',
+    }
+
+
+def concurrent_throughput(path, pragmas, readers=DEF_READERS,
+                          writers=DEF_WRITERS, seconds=DEF_SECONDS,
+                          seed=DEF_SEED):
+    """
+    Reads (a book with its copies) and renewals (a copy's due date) per
+      second, with 'readers' and 'writers' threads each on its own
+      connection to the SQLite file at 'path' set up with 'pragmas'. Busy
+      counts the operations that gave up waiting for a lock.
+    """
+    queries = _throughput_queries()
+
+    # journal_mode is stored in the file, switch it before anyone connects
+    setup = sqlite3.connect(path)
+    try:
+        sqlite.apply_pragmas(setup.cursor(), pragmas)
+        books = [row[0] for row in setup.execute(queries['books'])]
+        copies = [row[0] for row in setup.execute(queries['copies'])]
+    finally:
+        setup.close()
+
+    due_back = connection.ops.adapt_datefield_value(
+        datetime.date.today() + datetime.timedelta(weeks=3))
+    counts = {'reads': 0, 'writes': 0, 'busy': 0}
+    lock = threading.Lock()
+    barrier = threading.Barrier(readers + writers)
+
+    def work(kind, number):
+        rng = random.Random(f'{seed}:{kind}:{number}')
+        db = sqlite3.connect(path, isolation_level=None,
+                             check_same_thread=False)
+        cursor = db.cursor()
+        sqlite.apply_pragmas(cursor, pragmas)
+        done = busy = 0
+
+        barrier.wait()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            try:
+                if kind == 'reads':
+                    pk = rng.choice(books)
+                    cursor.execute('BEGIN')
+                    for sql in queries['read']:
+                        cursor.execute(sql, [pk]).fetchall()
+                    cursor.execute('COMMIT')
+                else:
+                    now = connection.ops.adapt_datetimefield_value(
+                        timezone.now())
+                    cursor.execute('BEGIN IMMEDIATE')
+                    cursor.execute(queries['write'],
+                                   [due_back, now, rng.choice(copies)])
+                    cursor.execute('COMMIT')
+                done += 1
+            except sqlite3.OperationalError:
+                # database is locked, past busy_timeout
+                busy += 1
+                if db.in_transaction:
+                    cursor.execute('ROLLBACK')
+        db.close()
+
+        with lock:
+            counts[kind] += done
+            counts['busy'] += busy
+
+    threads = [threading.Thread(target=work, args=(kind, number))
+               for kind, workers in (('reads', readers), ('writes', writers))
+               for number in range(workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'reads_per_s': round(counts['reads'] / elapsed, 1),
+        'writes_per_s': round(counts['writes'] / elapsed, 1),
+        'busy': counts['busy'],
+        'seconds': round(elapsed, 2),
+    }
+
+
+def compare_profiles(path, **kwargs):
+    """concurrent_throughput() with SQLite's defaults, then with the profile"""
+    return {
+        'defaults': concurrent_throughput(path, sqlite.SQLITE_DEFAULTS,
+                                          **kwargs),
+        'profile': concurrent_throughput(path, sqlite.pragma_profile(),
+                                         **kwargs),
+    }
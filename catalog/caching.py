@@ -0,0 +1,249 @@
+import hashlib
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.views.decorators.http import condition
+
+from . import routers
+
+
+DEF_TIMEOUT = 24 * 60 * 60
+# Bounds how long a page rendered from a lagging replica can outlive the
+#   version bump it missed
+DEF_REPLICA_TIMEOUT = 60
+# A bump only reaches the process making it when the cache is process-local,
+#   this bounds how long the other processes serve the pages (and stamps)
+#   it retired
+DEF_LOCAL_TIMEOUT = 30
+
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+VERSION_PREFIX = 'catalog:version:'
+PAGE_PREFIX = 'catalog:page:'
+# Stamp of the whole catalog, bumped by bulk writes which send no signals
+CATALOG = 'catalog'
+
+
+def is_shared_cache():
+    """Whether the default cache is seen by every process"""
+    return settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS
+
+
+def local_timeout():
+    return getattr(settings, 'CATALOG_LOCAL_CACHE_TIMEOUT', DEF_LOCAL_TIMEOUT)
+
+
+def stamp_timeout():
+    """Version stamps live until bumped, in a cache shared by all processes"""
+    return None if is_shared_cache() else local_timeout()
+
+
+def bounded_timeout(timeout):
+    """'timeout', at most local_timeout() when the cache is process-local"""
+    return timeout if is_shared_cache() else min(timeout, local_timeout())
+
+
+def cache_timeout():
+    timeout = bounded_timeout(getattr(settings, 'CATALOG_CACHE_TIMEOUT',
+                                      DEF_TIMEOUT))
+    if routers.read_alias():
+        timeout = min(timeout, getattr(settings,
+                                       'CATALOG_REPLICA_CACHE_TIMEOUT',
+                                       DEF_REPLICA_TIMEOUT))
+    return timeout
+
+
+def _token():
+    # Never reuse a version, an evicted stamp must not revive old entries
+    return uuid.uuid4().hex[:12]
+
+
+def get_versions(*scopes):
+    """
+    Current version stamp of each scope (eg. 'book:1', 'authors'), plus the
+      catalog stamp
+    """
+    return get_stamps(CATALOG, *scopes)
+
+
+def get_stamps(*scopes):
+    """Version stamps of the scopes alone, a missing one is started afresh"""
+    keys = [VERSION_PREFIX + scope for scope in scopes]
+    found = cache.get_many(keys)
+
+    missing = {key: _token() for key in keys if key not in found}
+    if missing:
+        for key, token in missing.items():
+            # add() keeps a stamp another process set in the meantime
+            cache.add(key, token, stamp_timeout())
+        found.update(cache.get_many(list(missing)))
+
+    return [found.get(key, '') for key in keys]
+
+
+def version_key(*scopes):
+    return '.'.join(get_versions(*scopes))
+
+
+def bump(*scopes):
+    """Give the scopes new version stamps, retiring every entry keyed on them"""
+    cache.set_many({VERSION_PREFIX + scope: _token()
+                    for scope in scopes if scope}, stamp_timeout())
+
+
+def invalidate_catalog():
+    bump(CATALOG)
+
+
+def _url_hash(request):
+    return hashlib.md5(request.get_full_path().encode()).hexdigest()
+
+
+class CachedPageMixin:
+    """
+    Serve anonymous GET requests from the cache, keyed on the URL and the
+      version stamps of get_cache_scopes(); the signals in catalog.signals
+      bump the stamps when the data a page shows changes
+    """
+    cache_scopes = ()
+
+    def get_cache_scopes(self):
+        return self.cache_scopes
+
+    def get_version_key(self):
+        # Read the stamps once per request
+        if not hasattr(self, '_version_key'):
+            self._version_key = version_key(*self.get_cache_scopes())
+        return self._version_key
+
+    def page_key(self, kind='page'):
+        return f'{PAGE_PREFIX}{kind}:{_url_hash(self.request)}:' \
+               f'{self.get_version_key()}'
+
+    def is_cacheable(self):
+        return self.request.method == 'GET' \
+            and not self.request.user.is_authenticated
+
+    def cached_page(self):
+        cached = cache.get(self.page_key())
+        if cached is None:
+            return None
+
+        content, content_type = cached
+        return HttpResponse(content, content_type=content_type)
+
+    def store_page(self, response):
+        key = self.page_key()
+
+        def store(response):
+            if response.status_code == 200:
+                cache.set(key, (response.content, response['Content-Type']),
+                          cache_timeout())
+
+        if hasattr(response, 'add_post_render_callback'):
+            response.add_post_render_callback(store)
+        elif not response.streaming:
+            store(response)
+
+        return response
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.is_cacheable():
+            return super().dispatch(request, *args, **kwargs)
+
+        cached = self.cached_page()
+        if cached is not None:
+            return cached
+
+        return self.store_page(super().dispatch(request, *args, **kwargs))
+
+
+def latest(*values):
+    """The most recent of the given timestamps, ignoring the missing ones"""
+    return max((value for value in values if value is not None),
+               default=None)
+
+
+class ConditionalPageMixin(CachedPageMixin):
+    """
+    Cached page answering conditional GETs. The ETag hashes the page's
+      version stamps, Last-Modified comes from get_last_modified() (a MAX()
+      of the updated_at columns) and is cached under the same stamps, so
+      revalidating an unchanged page reads the cache only. A matching
+      request gets a 304 before the view loads anything.
+
+    Deletions don't move a MAX(updated_at) back, only the ETag notices
+      them; If-None-Match takes precedence over If-Modified-Since, so
+      clients sending both always see them.
+    """
+    def get_etag(self):
+        user = self.request.user
+        identity = f'{user.pk}' if user.is_authenticated else 'anonymous'
+        value = f'{self.request.get_full_path()}:{identity}:' \
+                f'{self.get_version_key()}'
+
+        return hashlib.md5(value.encode()).hexdigest()
+
+    def get_last_modified(self):
+        return None
+
+    def _last_modified(self, request, *args, **kwargs):
+        if 'HTTP_IF_NONE_MATCH' in request.META:
+            return None
+
+        key = self.page_key('modified')
+        # False marks a page without a Last-Modified
+        modified = cache.get(key)
+        if modified is None:
+            modified = self.get_last_modified() or False
+            cache.set(key, modified, cache_timeout())
+
+        return modified or None
+
+    def dispatch(self, request, *args, **kwargs):
+        conditional = condition(
+            etag_func=lambda request, *args, **kwargs: self.get_etag(),
+            last_modified_func=self._last_modified,
+        )
+        return conditional(super().dispatch)(request, *args, **kwargs)
+
+
+class AsyncConditionalPageMixin(ConditionalPageMixin):
+    """
+    ConditionalPageMixin for views with async handlers. The user, the
+      version stamps, Last-Modified and the cached page are read up front in
+      the request's sync thread, where the async ORM runs its queries too;
+      the checks on the event loop then only use the values read.
+    """
+    def _prepare(self, request):
+        self._cacheable = self.is_cacheable()
+        self._etag = self.get_etag()
+        self._modified = self._last_modified(request)
+        self._cached = self.cached_page() if self._cacheable else None
+
+    async def _cached_dispatch(self, request, *args, **kwargs):
+        if self._cached is not None:
+            return self._cached
+
+        # The sync dispatch() of the mixins is replaced by this one
+        response = await super(CachedPageMixin, self).dispatch(
+            request, *args, **kwargs)
+
+        return self.store_page(response) if self._cacheable else response
+
+    async def dispatch(self, request, *args, **kwargs):
+        await sync_to_async(self._prepare)(request)
+
+        conditional = condition(
+            etag_func=lambda request, *args, **kwargs: self._etag,
+            last_modified_func=lambda request, *args, **kwargs:
+                self._modified,
+        )
+        return await conditional(self._cached_dispatch)(
+            request, *args, **kwargs)
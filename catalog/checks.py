@@ -0,0 +1,160 @@
+import datetime
+import re
+import uuid
+
+from django.conf import settings
+from django.core.checks import Error, register, Tags
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
+
+from .models import Book, Author, BookInstance
+from .pagination import KeysetPaginator
+from . import views, overdue, lookups, caching
+
+
+# Plan lines meaning every row of a table (or a whole index) is read, or
+#   every matching row is sorted before the LIMIT applies
+FULL_SCAN_RE = re.compile(r'^SCAN (\S+)(?!.*USING (COVERING )?INDEX)')
+INDEX_SCAN_RE = re.compile(r'^SCAN (\S+) USING (COVERING )?INDEX')
+TEMP_SORT_RE = re.compile(r'USE TEMP B-TREE FOR (RIGHT PART OF )?ORDER BY')
+
+# SQLite prefixes every plan line with its node ids
+PLAN_IDS_RE = re.compile(r'^[\d\s]*')
+
+SAMPLE_PAGE_SIZE = 20
+
+
+def _keyset(queryset, ordering, sample):
+    """The queries a keyset paginated view runs, for the first and a deep page"""
+    paginator = KeysetPaginator(queryset, ordering, SAMPLE_PAGE_SIZE)
+    querysets = paginator.querysets() \
+        + paginator.querysets(sample, forward=True) \
+        + paginator.querysets(sample, forward=False)
+
+    return [qs[:SAMPLE_PAGE_SIZE + 1] for qs in querysets]
+
+
+def view_queries():
+    """
+    Yield (name, queryset, ordered_scan) for the queries behind each catalog
+      view. 'ordered_scan' marks unfiltered listings where walking an index
+      in order until the LIMIT is the intended plan.
+    """
+    today = datetime.date.today()
+    instance_id = uuid.UUID(int=0)
+
+    yield 'index', BookInstance.objects.filter(status__exact='a'), False
+
+    for qs in _keyset(views.BookListView().get_queryset(),
+                      views.BookListView.cursor_ordering, ['m', 1]):
+        yield 'books-all', qs, True
+    # Last-Modified of the lists, the newest row of each updated_at index
+    for model in (Book, Author):
+        yield f'{model._meta.model_name} last modified', \
+            model.objects.order_by('-updated_at')[:1], True
+
+    for qs in _keyset(Author.objects.all(),
+                      views.AuthorListView.cursor_ordering, ['m', 'm', 1]):
+        yield 'authors-all', qs, True
+
+    copies = views.BookInstanceListView()
+    for status, _ in copies.sections:
+        for qs in _keyset(copies.get_queryset().filter(status=status),
+                          copies.ordering, [today, instance_id]):
+            yield f'books-all-copies ({status})', qs, False
+
+    loaned = BookInstance.objects.filter(borrower_id=1, status__exact='o')
+    for qs in _keyset(loaned, views.UserLoanedBooksListView.cursor_ordering,
+                      [today, instance_id]):
+        yield 'my-books', qs, False
+
+    detail = views.BookDetailView().get_queryset()
+    yield 'book-detail', detail.filter(pk=1), False
+    yield 'book-detail (genres)', \
+        Book.genre.through.objects.filter(book_id__in=[1]), False
+    yield 'book-detail (copies)', BookInstance.objects\
+        .filter(book_id__in=[1]).order_by('due_back', 'instance_id'), False
+
+    yield 'authors-detail', \
+        views.AuthorDetailView().get_queryset().filter(pk=1), False
+    yield 'authors-detail (books)', Book.objects.filter(author_id=1), False
+
+    samples = {'author': ['Tolk', 'tolkien, j'],
+               'genre': ['Fant'],
+               'language': ['engl']}
+    for kind, lookup in lookups.LOOKUPS.items():
+        for query in samples[kind]:
+            for qs in _keyset(lookup.queryset(query), lookup.ordering,
+                              ['m', 1]):
+                yield f'catalog-lookup ({kind})', qs, False
+
+    for key in (None, [today, instance_id]):
+        yield 'overdue sweep', \
+            overdue.batch_queryset(today, key)[:SAMPLE_PAGE_SIZE], False
+
+
+def full_scans(plan, ordered_scan=False):
+    """Plan lines showing a full table scan or a sort of all matching rows"""
+    bad = []
+
+    for line in plan.splitlines():
+        line = PLAN_IDS_RE.sub('', line.strip(' -|`'))
+        if FULL_SCAN_RE.match(line) or TEMP_SORT_RE.search(line):
+            bad.append(line)
+        elif INDEX_SCAN_RE.match(line) and not ordered_scan:
+            bad.append(line)
+
+    return bad
+
+
+@register(Tags.database)
+def check_query_plans(app_configs=None, databases=None, **kwargs):
+    """
+    Run EXPLAIN QUERY PLAN on every catalog view's queries and report those
+      falling back to a full scan. Only runs with `manage.py check --database`
+      on SQLite, against a migrated database.
+    """
+    errors = []
+
+    for alias in databases or []:
+        connection = connections[alias]
+        if connection.vendor != 'sqlite':
+            continue
+
+        # Skip databases missing migrations, eg. the check run by `migrate`
+        #   itself before it adds the indexes
+        executor = MigrationExecutor(connection)
+        if executor.migration_plan(executor.loader.graph.leaf_nodes()):
+            continue
+
+        for name, queryset, ordered_scan in view_queries():
+            plan = queryset.using(alias).explain()
+
+            for line in full_scans(plan, ordered_scan):
+                errors.append(Error(
+                    f'Query for "{name}" is not answered from an index: '
+                    f'{line}',
+                    hint=f'Add an index covering this query.\n{queryset.query}',
+                    obj=queryset.model,
+                    id='catalog.E001',
+                ))
+
+    return errors
+
+
+@register(Tags.caches)
+def check_session_cache(app_configs=None, **kwargs):
+    """
+    cached_db sessions need a cache shared by all processes: with one in
+      process memory a logout only retires the session where it happened
+    """
+    cached_db = 'django.contrib.sessions.backends.cached_db'
+    if settings.SESSION_ENGINE == cached_db and not caching.is_shared_cache():
+        return [Error(
+            'Sessions are cached in a process-local cache, a logout leaves '
+            'them valid in the other processes.',
+            hint='Use the db session engine, or a shared cache '
+                 '(DJANGO_REDIS_URL or DJANGO_CACHE_DIR).',
+            id='catalog.E002',
+        )]
+    return []
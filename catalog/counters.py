@@ -0,0 +1,96 @@
+from collections import Counter
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Book, BookInstance
+from . import caching
+
+
+RECONCILE_BATCH_SIZE = 5000
+
+
+def _apply(deltas):
+    """Apply {(book_id, status): delta} to the counters with F() updates"""
+    per_book = {}
+    for (book_id, status), delta in deltas.items():
+        field = Book.COPY_COUNTERS.get(status)
+        if book_id is None or field is None or not delta:
+            continue
+        per_book.setdefault(book_id, {})[field] = F(field) + delta
+
+    # Queryset updates skip auto_now, the book list shows the counters
+    now = timezone.now()
+    for book_id, updates in per_book.items():
+        Book.objects.filter(pk=book_id).update(updated_at=now, **updates)
+
+
+def copy_saved(instance, created):
+    current = (instance.book_id, instance.status)
+    previous = None if created else getattr(instance, '_counted', None)
+
+    if not created and previous is None:
+        # No row read before the save (BookInstance.save()), the old
+        #   state is unknown so count this book's copies again
+        if instance.book_id is not None:
+            reconcile([instance.book_id])
+    elif previous != current:
+        deltas = Counter({current: 1})
+        if previous is not None:
+            deltas[previous] -= 1
+        _apply(deltas)
+
+    instance._counted = current
+
+
+def copy_deleted(instance):
+    previous = getattr(instance, '_counted',
+                       (instance.book_id, instance.status))
+    _apply({previous: -1})
+
+
+def _count_subquery(status):
+    counts = BookInstance.objects\
+        .filter(book=OuterRef('pk'), status=status)\
+        .order_by()\
+        .values('book')\
+        .annotate(n=Count('pk'))\
+        .values('n')
+
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def reconcile(book_ids=None, batch_size=RECONCILE_BATCH_SIZE):
+    """
+    Recompute the copy counters from the BookInstance table, for the given
+      books or (in primary key batches) for all of them. Returns the number
+      of books updated.
+    """
+    updates = {field: _count_subquery(status)
+               for status, field in Book.COPY_COUNTERS.items()}
+    updates['updated_at'] = timezone.now()
+
+    if book_ids is not None:
+        book_ids = list(book_ids)
+        updated = sum(Book.objects.filter(pk__in=book_ids[i:i + batch_size])
+                      .update(**updates)
+                      for i in range(0, len(book_ids), batch_size))
+    else:
+        updated, last_pk = 0, 0
+        while True:
+            batch = list(Book.objects.filter(pk__gt=last_pk).order_by('pk')
+                         .values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+
+            updated += Book.objects\
+                .filter(pk__gte=batch[0], pk__lte=batch[-1])\
+                .update(**updates)
+            last_pk = batch[-1]
+
+    # Cached pages show the counters
+    if updated:
+        caching.invalidate_catalog()
+
+    return updated
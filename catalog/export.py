@@ -0,0 +1,127 @@
+import csv
+import json
+import zlib
+from collections import defaultdict
+from itertools import islice
+
+from django.db.models import F
+
+from .models import Book
+from .importer import GENRE_SEPARATOR
+
+
+DEF_CHUNK_SIZE = 2000
+
+# Same columns the importer reads, plus the copy counts per loan status
+EXPORT_FIELDS = ['isbn', 'title', 'summary', 'author_first_name',
+                 'author_last_name', 'language', 'genres',
+                 'available', 'on_loan', 'reserved', 'maintenance']
+# Export column: Book copy counter
+STATUS_FIELDS = {'available': 'copies_available',
+                 'on_loan': 'copies_on_loan',
+                 'reserved': 'copies_reserved',
+                 'maintenance': 'copies_maintenance'}
+
+FORMATS = {
+    # name: (content type, file extension)
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'ndjson-gzip': ('application/gzip', 'ndjson.gz'),
+}
+
+
+def _book_rows():
+    return Book.objects\
+        .order_by('pk')\
+        .values('pk', 'isbn', 'title', 'summary',
+                author_first_name=F('author__first_name'),
+                author_last_name=F('author__last_name'),
+                language_name=F('language__name'),
+                **{field: F(counter)
+                   for field, counter in STATUS_FIELDS.items()})
+
+
+def _genres(book_ids):
+    genres = defaultdict(list)
+    rows = Book.genre.through.objects\
+        .filter(book_id__in=book_ids)\
+        .values_list('book_id', 'genre__name')
+
+    for book_id, name in rows:
+        genres[book_id].append(name)
+
+    return genres
+
+
+def iter_catalog(chunk_size=DEF_CHUNK_SIZE):
+    """
+    Yield lists of export rows, one list per chunk of books; the database is
+      read through a server-side iterator and the genres of each chunk are
+      fetched in one extra query
+    """
+    rows = _book_rows().iterator(chunk_size=chunk_size)
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        genres = _genres([row['pk'] for row in chunk])
+        yield [{
+            'isbn': row['isbn'],
+            'title': row['title'],
+            'summary': row['summary'],
+            'author_first_name': row['author_first_name'] or '',
+            'author_last_name': row['author_last_name'] or '',
+            'language': row['language_name'] or '',
+            'genres': genres.get(row['pk'], []),
+            **{field: row[field] for field in STATUS_FIELDS},
+        } for row in chunk]
+
+
+class _Echo:
+    """File-like object handing back what csv.writer writes to it"""
+    def write(self, value):
+        return value
+
+
+def write_csv(chunks):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+
+    for chunk in chunks:
+        yield ''.join(
+            writer.writerow([GENRE_SEPARATOR.join(row['genres'])
+                             if field == 'genres' else row[field]
+                             for field in EXPORT_FIELDS])
+            for row in chunk)
+
+
+def write_jsonl(chunks):
+    for chunk in chunks:
+        yield ''.join(json.dumps(row, ensure_ascii=False) + '\n'
+                      for row in chunk)
+
+
+def write_ndjson_gzip(chunks):
+    # wbits=31 makes zlib write a gzip header and trailer
+    compressor = zlib.compressobj(wbits=31)
+
+    for text in write_jsonl(chunks):
+        data = compressor.compress(text.encode('utf-8'))
+        if data:
+            yield data
+
+    yield compressor.flush()
+
+
+WRITERS = {
+    'csv': write_csv,
+    'jsonl': write_jsonl,
+    'ndjson-gzip': write_ndjson_gzip,
+}
+
+
+def export_catalog(fmt, chunk_size=DEF_CHUNK_SIZE):
+    """Stream the whole catalog in the given format, in constant memory"""
+    return WRITERS[fmt](iter_catalog(chunk_size))
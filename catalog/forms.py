@@ -1,20 +1,36 @@
 import datetime
+import re
 
+from django import forms
 from django.forms import ModelForm
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
-from .models import BookInstance
+from .models import Book, BookInstance
+from .widgets import AutocompleteSelect, AutocompleteSelectMultiple
+from . import loans
+
+
+RENEWAL_WEEKS = 3
+MAX_RENEWAL_WEEKS = 4
+
+
+def default_renewal_date():
+    return datetime.date.today() + datetime.timedelta(weeks=RENEWAL_WEEKS)
+
+
+def validate_renewal_date(data):
+    if data < datetime.date.today():
+        raise ValidationError(_('Cannot renew into the past'))
+
+    if data > datetime.date.today() + \
+            datetime.timedelta(weeks=MAX_RENEWAL_WEEKS):
+        raise ValidationError(_('Cannot renew to more than 4 weeks'))
 
 
 class RenewBookForm(ModelForm):
     def clean_due_back(self):
         data = self.cleaned_data['due_back']
-
-        if data < datetime.date.today():
-            raise ValidationError(_('Cannot renew into the past'))
-
-        if data > datetime.date.today() + datetime.timedelta(weeks=4):
-            raise ValidationError(_('Cannot renew to more than 4 weeks'))
+        validate_renewal_date(data)
 
         return data
 
@@ -24,4 +40,74 @@ class RenewBookForm(ModelForm):
         fields = ['due_back']
         labels = {'due_back': _('New renewal date')}
         help_texts = {'due_back': _('Choose a date within the next 4 weeks '
-                                    '(default: 3 weeks)')}
\ No newline at end of file
+                                    '(default: 3 weeks)')}
+
+
+class BulkLoanForm(forms.Form):
+    """
+    Renew or check in many copies at once, listed by instance ID; the IDs
+      are checked one by one when applied (see catalog.loans)
+    """
+    ACTIONS = ((loans.RENEW, _('Renew')),
+               (loans.CHECK_IN, _('Check in')))
+    MAX_INSTANCES = 500
+
+    action = forms.ChoiceField(choices=ACTIONS)
+    instance_ids = forms.CharField(
+        label=_('Copies'),
+        widget=forms.Textarea(attrs={'rows': 10}),
+        help_text=_('Instance IDs, one per line'))
+    due_back = forms.DateField(
+        label=_('New renewal date'),
+        required=False,
+        help_text=_('When renewing, a date within the next 4 weeks'))
+
+    def clean_instance_ids(self):
+        # Scanners separate codes with newlines, people with commas
+        tokens = [token for token in
+                  re.split(r'[\s,]+', self.cleaned_data['instance_ids'])
+                  if token]
+        tokens = list(dict.fromkeys(tokens))
+
+        if not tokens:
+            raise ValidationError(_('List at least one copy'))
+        if len(tokens) > self.MAX_INSTANCES:
+            raise ValidationError(
+                _('At most %(max)d copies at a time'),
+                params={'max': self.MAX_INSTANCES})
+
+        return tokens
+
+    def clean_due_back(self):
+        data = self.cleaned_data['due_back']
+        if data is not None:
+            validate_renewal_date(data)
+
+        return data
+
+    def clean(self):
+        cleaned_data = super().clean()
+
+        if cleaned_data.get('action') == loans.RENEW \
+                and cleaned_data.get('due_back') is None \
+                and 'due_back' not in self.errors:
+            self.add_error('due_back', _('Choose the new renewal date'))
+
+        return cleaned_data
+
+
+class BookForm(ModelForm):
+    """
+    Book create/update form picking the author, genres and language by
+      autocomplete; only the selected ones are rendered, and only the
+      submitted keys are looked up when validating
+    """
+    class Meta:
+        model = Book
+
+        fields = ['title', 'author', 'summary', 'isbn', 'genre', 'language']
+        widgets = {
+            'author': AutocompleteSelect('author'),
+            'genre': AutocompleteSelectMultiple('genre'),
+            'language': AutocompleteSelect('language'),
+        }
@@ -0,0 +1,70 @@
+from collections import defaultdict
+
+from django.utils import timezone
+
+from .models import Book
+
+
+SEPARATOR = ', '
+REFRESH_BATCH_SIZE = 2000
+
+
+def join_names(names):
+    """The Book.genre_names value for the given genre names"""
+    return SEPARATOR.join(sorted(names))
+
+
+def _names(book_ids):
+    names = defaultdict(list)
+    rows = Book.genre.through.objects\
+        .filter(book_id__in=book_ids)\
+        .values_list('book_id', 'genre__name')
+
+    for book_id, name in rows:
+        names[book_id].append(name)
+
+    return {book_id: join_names(n) for book_id, n in names.items()}
+
+
+def refresh_book(book):
+    """Recompute one book's genre names, in the database and on 'book'"""
+    book.genre_names = _names([book.pk]).get(book.pk, '')
+    book.updated_at = timezone.now()
+    Book.objects.filter(pk=book.pk).update(genre_names=book.genre_names,
+                                           updated_at=book.updated_at)
+
+
+def _refresh_batch(book_ids):
+    names = _names(book_ids)
+    now = timezone.now()
+
+    changed = [Book(pk=pk, genre_names=names.get(pk, ''), updated_at=now)
+               for pk, current in Book.objects.filter(pk__in=book_ids)
+               .values_list('pk', 'genre_names')
+               if names.get(pk, '') != current]
+    Book.objects.bulk_update(changed, ['genre_names', 'updated_at'])
+
+    return len(changed)
+
+
+def refresh(book_ids=None, batch_size=REFRESH_BATCH_SIZE):
+    """
+    Recompute the genre names of the given books or (in primary key
+      batches) of all of them. Returns the number of books changed.
+    """
+    if book_ids is not None:
+        book_ids = list(book_ids)
+        return sum(_refresh_batch(book_ids[i:i + batch_size])
+                   for i in range(0, len(book_ids), batch_size))
+
+    updated, last_pk = 0, 0
+    while True:
+        batch = list(Book.objects.filter(pk__gt=last_pk).order_by('pk')
+                     .values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            break
+
+        updated += _refresh_batch(batch)
+        last_pk = batch[-1]
+
+    return updated
@@ -0,0 +1,231 @@
+import csv
+import json
+import time
+from itertools import islice
+
+from django.db import transaction
+
+from .models import Book, Author, BookInstance, Genre, Language, name_key
+from . import search, stats, counters, caching, genre_names, \
+    prefix_index
+
+
+# Keeps the per-chunk IN (...) lookups under SQLite's parameter limit
+DEF_CHUNK_SIZE = 500
+GENRE_SEPARATOR = '|'
+FORMATS = ('csv', 'jsonl')
+
+BOOK_UPDATE_FIELDS = ['title', 'summary', 'author', 'language', 'updated_at']
+
+
+class ImportStats:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.copies = 0
+        self.errors = []
+        self.start = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    @property
+    def rate(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def read_csv(stream):
+    return csv.DictReader(stream)
+
+
+def read_jsonl(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+
+def _clean(value):
+    return '' if value is None else str(value).strip()
+
+
+class CatalogImporter:
+    """
+    Load books (with their author, language, genres and a number of copies)
+      from a stream of records, a chunk at a time. Authors, genres and
+      languages are resolved through in-memory maps which only hit the
+      database for names not seen before; books are upserted on their ISBN.
+
+    Copies are only created for books the import inserts, so re-running an
+      import updates the books without duplicating their copies.
+    """
+    def __init__(self, chunk_size=DEF_CHUNK_SIZE, imprint='', progress=None):
+        self.chunk_size = chunk_size
+        self.imprint = imprint
+        self.progress = progress
+        self.stats = ImportStats()
+
+        self.authors = {}
+        self.genres = {name: pk for pk, name
+                       in Genre.objects.values_list('pk', 'name')}
+        self.languages = {name: pk for pk, name
+                          in Language.objects.values_list('pk', 'name')}
+
+    def run(self, records):
+        records = iter(records)
+
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                break
+
+            self._load_chunk(chunk)
+            self.stats.rows += len(chunk)
+            if self.progress:
+                self.progress(self.stats)
+
+        stats.invalidate_dashboard_stats()
+        caching.invalidate_catalog()
+        # Rebuilt on its next search, bulk inserts send no signals
+        prefix_index.index.clear()
+
+        return self.stats
+
+    def _resolve_authors(self, keys):
+        missing = {key for key in keys if key not in self.authors}
+        if not missing:
+            return
+
+        existing = Author.objects\
+            .filter(last_name__in={last for _, last in missing})\
+            .values_list('pk', 'first_name', 'last_name')
+        for pk, first, last in existing:
+            if (first, last) in missing:
+                self.authors.setdefault((first, last), pk)
+
+        missing = [key for key in missing if key not in self.authors]
+        Author.objects.bulk_create(
+            [Author(first_name=first, last_name=last,
+                    name_key=name_key(last, first))
+             for first, last in missing])
+
+        # Fetch the ids back, not every backend returns them from bulk_create
+        created = Author.objects\
+            .filter(last_name__in={last for _, last in missing})\
+            .values_list('pk', 'first_name', 'last_name')
+        for pk, first, last in created:
+            self.authors.setdefault((first, last), pk)
+
+    def _resolve_names(self, model, lookup, names):
+        missing = {name for name in names if name not in lookup}
+        if not missing:
+            return
+
+        model.objects.bulk_create([model(name=name, name_key=name_key(name))
+                                   for name in missing])
+        lookup.update(model.objects.filter(name__in=missing)
+                      .values_list('name', 'pk'))
+
+    def _parse(self, chunk):
+        """Validate a chunk, the last record wins for a repeated ISBN"""
+        books = {}
+
+        for number, record in enumerate(chunk, start=self.stats.rows + 1):
+            isbn, title = _clean(record.get('isbn')), _clean(record.get('title'))
+            if not isbn or not title:
+                self.stats.errors.append(
+                    f'Record {number}: isbn and title are required')
+                continue
+
+            try:
+                copies = int(record.get('copies') or 0)
+            except (TypeError, ValueError):
+                copies = 0
+
+            genres = record.get('genres')
+            if isinstance(genres, str):
+                genres = genres.split(GENRE_SEPARATOR)
+
+            books[isbn] = {
+                'title': title,
+                'summary': _clean(record.get('summary')),
+                'author': (_clean(record.get('author_first_name')),
+                           _clean(record.get('author_last_name'))),
+                'language': _clean(record.get('language')),
+                'genres': None if genres is None
+                else [_clean(g) for g in genres if _clean(g)],
+                'copies': max(copies, 0),
+                'imprint': _clean(record.get('imprint')) or self.imprint,
+            }
+
+        return books
+
+    @transaction.atomic
+    def _load_chunk(self, chunk):
+        books = self._parse(chunk)
+        if not books:
+            return
+
+        self._resolve_authors({b['author'] for b in books.values()
+                               if any(b['author'])})
+        self._resolve_names(Language, self.languages,
+                            {b['language'] for b in books.values()
+                             if b['language']})
+        self._resolve_names(Genre, self.genres,
+                            {g for b in books.values() for g in b['genres'] or []})
+
+        existing = set(Book.objects.filter(isbn__in=books.keys())
+                       .values_list('isbn', flat=True))
+
+        Book.objects.bulk_create(
+            [Book(isbn=isbn,
+                  title=b['title'],
+                  summary=b['summary'],
+                  author_id=self.authors.get(b['author']),
+                  language_id=self.languages.get(b['language']))
+             for isbn, b in books.items()],
+            update_conflicts=True,
+            unique_fields=['isbn'],
+            update_fields=BOOK_UPDATE_FIELDS,
+        )
+        book_ids = dict(Book.objects.filter(isbn__in=books.keys())
+                        .values_list('isbn', 'pk'))
+
+        # Genres listed in a record replace the book's current ones
+        through = Book.genre.through
+        regenre = [book_ids[isbn] for isbn, b in books.items()
+                   if b['genres'] is not None]
+        through.objects.filter(book_id__in=regenre).delete()
+        through.objects.bulk_create(
+            [through(book_id=book_ids[isbn], genre_id=self.genres[name])
+             for isbn, b in books.items()
+             for name in set(b['genres'] or [])],
+            ignore_conflicts=True,
+        )
+
+        copies = [BookInstance(book_id=book_ids[isbn],
+                               imprint=b['imprint'],
+                               status='a')
+                  for isbn, b in books.items() if isbn not in existing
+                  for _ in range(b['copies'])]
+        BookInstance.objects.bulk_create(copies)
+
+        # bulk_create sends no signals, keep the derived data in step
+        search.index_books(book_ids.values())
+        genre_names.refresh(regenre)
+        if copies:
+            counters.reconcile({copy.book_id for copy in copies})
+
+        self.stats.created += len(books.keys() - existing)
+        self.stats.updated += len(books.keys() & existing)
+        self.stats.copies += len(copies)
+
+
+def import_catalog(stream, fmt, **kwargs):
+    importer = CatalogImporter(**kwargs)
+
+    return importer.run(READERS[fmt](stream))
@@ -0,0 +1,86 @@
+import uuid
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import BookInstance
+from . import caching, counters, stats
+
+
+RENEW = 'renew'
+CHECK_IN = 'check_in'
+
+# Per-copy outcomes of apply()
+RENEWED = 'renewed'
+RETURNED = 'returned'
+NOT_ON_LOAN = 'not on loan'
+NOT_FOUND = 'not found'
+INVALID_ID = 'invalid id'
+
+ON_LOAN = 'o'
+
+
+def _parse(token):
+    try:
+        return uuid.UUID(token)
+    except ValueError:
+        return None
+
+
+def apply(action, tokens, due_back=None):
+    """
+    Renew (to 'due_back') or check in the copies listed by instance ID, with
+      one UPDATE for all of them in a single transaction; only copies on
+      loan are changed. Returns [(token, outcome)] in the order given.
+    """
+    if action not in (RENEW, CHECK_IN):
+        raise ValueError(f'Unknown loan action "{action}"')
+
+    ids = {token: _parse(token) for token in tokens}
+
+    with transaction.atomic():
+        found = {pk: (status, book_id)
+                 for pk, status, book_id in BookInstance.objects
+                 .select_for_update()
+                 .filter(pk__in=[pk for pk in ids.values() if pk])
+                 .values_list('pk', 'status', 'book_id')}
+
+        on_loan = [pk for pk, (status, _) in found.items()
+                   if status == ON_LOAN]
+        book_ids = {found[pk][1] for pk in on_loan} - {None}
+        copies = BookInstance.objects.filter(pk__in=on_loan)
+
+        # Queryset updates skip auto_now and the copies' signals
+        if action == RENEW:
+            copies.update(due_back=due_back, updated_at=timezone.now())
+        else:
+            copies.update(status='a', borrower=None, due_back=None,
+                          updated_at=timezone.now())
+            counters.reconcile(book_ids)
+
+    if on_loan:
+        caching.bump('books', *(f'{scope}:{book_id}'
+                                for book_id in book_ids
+                                for scope in ('book', 'copies')))
+        stats.invalidate_dashboard_stats()
+
+    done = RENEWED if action == RENEW else RETURNED
+    results = []
+    for token, pk in ids.items():
+        if pk is None:
+            outcome = INVALID_ID
+        elif pk not in found:
+            outcome = NOT_FOUND
+        elif found[pk][0] != ON_LOAN:
+            outcome = NOT_ON_LOAN
+        else:
+            outcome = done
+        results.append((token, outcome))
+
+    return results
+
+
+def summarize(results):
+    """Number of copies per outcome"""
+    return dict(Counter(outcome for _, outcome in results))
@@ -0,0 +1,69 @@
+from django.db.models import Q
+
+from .models import Author, Genre, Language, name_key
+from .pagination import KeysetPaginator
+
+
+MAX_QUERY_LENGTH = 100
+
+
+class Lookup:
+    """
+    Prefix search over one model for the autocomplete widgets, paged by keyset
+      on its (name_key, id) index, so every page is a range read of that
+      index. Case and spacing don't matter, both the stored keys and the
+      query are normalized by models.name_key().
+    """
+    ordering = ('name_key', 'id')
+
+    def __init__(self, model, label=str):
+        self.model = model
+        self.label = label
+
+    def key(self, query):
+        """The name_key prefix of the rows matching the query"""
+        return name_key(query)
+
+    def queryset(self, query=''):
+        key = self.key(query.strip()[:MAX_QUERY_LENGTH])
+        return self.model.objects.filter(prefix_range('name_key', key))
+
+    def page(self, query, cursor, per_page):
+        """A KeysetPage of the matching rows, see KeysetPaginator.page()"""
+        return KeysetPaginator(self.queryset(query), self.ordering,
+                               per_page).page(cursor)
+
+    def results(self, page):
+        return [{'id': obj.pk, 'text': self.label(obj)} for obj in page]
+
+
+class AuthorLookup(Lookup):
+    def key(self, query):
+        """
+        'Tolk' matches last names, 'Tolkien, J' first names of the Tolkiens:
+          the key of an author is 'last name, first name'
+        """
+        last_name, comma, first_name = query.partition(',')
+        if not comma:
+            return name_key(last_name)
+        return name_key(last_name, first_name)
+
+
+def prefix_range(field, prefix):
+    """
+    'field' starting with 'prefix' as a range, >= the prefix and < the prefix
+      with its last character incremented. Unlike LIKE (case insensitive on
+      SQLite) a range is answered from an index on the field.
+    """
+    if not prefix:
+        return Q()
+
+    upper = prefix[:-1] + chr(min(ord(prefix[-1]) + 1, 0x10ffff))
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': upper})
+
+
+LOOKUPS = {
+    'author': AuthorLookup(Author),
+    'genre': Lookup(Genre),
+    'language': Lookup(Language),
+}
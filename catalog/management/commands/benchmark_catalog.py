@@ -0,0 +1,90 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, \
+    teardown_test_environment
+
+from catalog.models import Book
+from catalog import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Seed a separate test database with a catalog of the given size, ' \
+           'time every catalog route through the test client and report ' \
+           'p50/p95/p99 latency and query counts. --output saves them as a ' \
+           'JSON baseline, --compare fails on regressions against one.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=benchmark.SIZES, default='10k',
+                            help='Number of books to seed')
+        parser.add_argument('--iterations', type=int,
+                            default=benchmark.DEF_ITERATIONS,
+                            help='Requests timed per route')
+        parser.add_argument('--seed', default=benchmark.DEF_SEED)
+        parser.add_argument('--database-file',
+                            help='Keep the seeded database in this file and '
+                                 'reuse it on the next run (default: in '
+                                 'memory, seeded on every run)')
+        parser.add_argument('--output', '-o',
+                            help='Write the results to this JSON file')
+        parser.add_argument('--compare',
+                            help='Baseline JSON file to compare against')
+        parser.add_argument('--threshold', type=float,
+                            default=benchmark.DEF_THRESHOLD,
+                            help='Allowed relative latency growth')
+        parser.add_argument('--min-delta-ms', type=float,
+                            default=benchmark.DEF_MIN_DELTA_MS,
+                            help='Latency growth always allowed')
+
+    def _progress(self, name, result):
+        self.stdout.write(
+            f"{name:<24} p50 {result['p50_ms']:8.2f}ms  "
+            f"p95 {result['p95_ms']:8.2f}ms  p99 {result['p99_ms']:8.2f}ms  "
+            f"{result['queries']:3d} queries")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        keepdb = bool(options['database_file'])
+        if keepdb:
+            connection.settings_dict['TEST']['NAME'] = options['database_file']
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=keepdb, serialize=False)
+        try:
+            books = benchmark.SIZES[options['size']]
+            seeded = Book.objects.count()
+            if not seeded:
+                self.stdout.write(f'Seeding {books} books...')
+                benchmark.seed_catalog(books, options['seed'])
+                benchmark.seed_users()
+            elif seeded != books:
+                raise CommandError(f'{options["database_file"]} holds '
+                                   f'{seeded} books, not {books}')
+
+            clients = benchmark.login_clients()
+            results = benchmark.run_benchmark(clients, options['iterations'],
+                                              options['seed'], self._progress)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0,
+                                                keepdb=keepdb)
+            teardown_test_environment()
+
+        results['meta']['size'] = options['size']
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+
+        if baseline is not None:
+            regressions = benchmark.compare(baseline, results,
+                                            options['threshold'],
+                                            options['min_delta_ms'])
+            if regressions:
+                raise CommandError('Regressions against the baseline:\n'
+                                   + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions'))
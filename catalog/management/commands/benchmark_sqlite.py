@@ -0,0 +1,89 @@
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, \
+    teardown_test_environment
+
+from catalog.models import Book
+from catalog import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Seed a separate SQLite test database file with a catalog of the ' \
+           'given size, then measure concurrent reads and renewals per ' \
+           'second with SQLite\'s default settings and with the pragma ' \
+           'profile of catalog.sqlite'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=benchmark.SIZES, default='10k',
+                            help='Number of books to seed')
+        parser.add_argument('--readers', type=int,
+                            default=benchmark.DEF_READERS)
+        parser.add_argument('--writers', type=int,
+                            default=benchmark.DEF_WRITERS)
+        parser.add_argument('--seconds', type=float,
+                            default=benchmark.DEF_SECONDS,
+                            help='Duration of each run')
+        parser.add_argument('--seed', default=benchmark.DEF_SEED)
+        parser.add_argument('--database-file',
+                            help='Keep the seeded database in this file and '
+                                 'reuse it on the next run (default: a '
+                                 'temporary file, seeded on every run)')
+        parser.add_argument('--output', '-o',
+                            help='Write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('benchmark_sqlite needs the SQLite backend')
+
+        with tempfile.TemporaryDirectory() as directory:
+            keepdb = bool(options['database_file'])
+            path = options['database_file'] or \
+                os.path.join(directory, 'benchmark.sqlite3')
+            connection.settings_dict['TEST']['NAME'] = path
+
+            setup_test_environment()
+            old_name = connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, keepdb=keepdb, serialize=False)
+            try:
+                books = benchmark.SIZES[options['size']]
+                seeded = Book.objects.count()
+                if not seeded:
+                    self.stdout.write(f'Seeding {books} books...')
+                    benchmark.seed_catalog(books, options['seed'])
+                elif seeded != books:
+                    raise CommandError(f'{path} holds {seeded} books, '
+                                       f'not {books}')
+                # The runs switch the journal mode, which needs the file alone
+                connection.close()
+
+                results = benchmark.compare_profiles(
+                    path, readers=options['readers'],
+                    writers=options['writers'], seconds=options['seconds'],
+                    seed=options['seed'])
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0,
+                                                    keepdb=keepdb)
+                teardown_test_environment()
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<10} {result['reads_per_s']:10.1f} reads/s  "
+                f"{result['writes_per_s']:8.1f} writes/s  "
+                f"{result['busy']:4d} busy")
+
+        before, after = results['defaults'], results['profile']
+        for key in ('reads_per_s', 'writes_per_s'):
+            if before[key]:
+                self.stdout.write(f'{key}: x{after[key] / before[key]:.2f}')
+
+        if options['output']:
+            results['meta'] = {'size': options['size'],
+                               'readers': options['readers'],
+                               'writers': options['writers'],
+                               'seconds': options['seconds']}
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
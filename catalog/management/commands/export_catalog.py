@@ -0,0 +1,42 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.export import export_catalog, DEF_CHUNK_SIZE, FORMATS
+
+
+class Command(BaseCommand):
+    help = 'Stream the full catalog (books with author, language, genres ' \
+           'and copy counts per loan status) as CSV, JSONL or gzipped NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(FORMATS), default='csv')
+        parser.add_argument('--output', '-o', default='-',
+                            help='Output file (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=DEF_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        fmt = options['format']
+        binary = fmt == 'ndjson-gzip'
+        path = options['output']
+
+        if path != '-':
+            out = open(path, 'wb') if binary \
+                else open(path, 'w', newline='', encoding='utf-8')
+            write = out.write
+        elif binary:
+            out, write = None, sys.stdout.buffer.write
+        else:
+            out, write = None, lambda data: self.stdout.write(data, ending='')
+
+        start = time.perf_counter()
+        try:
+            for data in export_catalog(fmt, options['chunk_size']):
+                write(data)
+        finally:
+            if out is not None:
+                out.close()
+
+        self.stderr.write(f'Exported catalog in '
+                          f'{time.perf_counter() - start:.2f}s')
@@ -0,0 +1,51 @@
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.importer import import_catalog, DEF_CHUNK_SIZE, FORMATS
+
+
+class Command(BaseCommand):
+    help = 'Stream books, authors, genres, languages and copies from a CSV ' \
+           'or JSONL file into the catalog, upserting books on their ISBN. ' \
+           'Columns/keys: isbn, title, summary, author_first_name, ' \
+           'author_last_name, language, genres ("|"-separated in CSV, a ' \
+           'list in JSONL), copies, imprint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Input file, "-" for stdin')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Input format (default: from the extension)')
+        parser.add_argument('--chunk-size', type=int, default=DEF_CHUNK_SIZE)
+        parser.add_argument('--imprint', default='',
+                            help='Imprint for copies whose record has none')
+
+    def _progress(self, stats):
+        self.stdout.write(f'{stats.rows} rows, {stats.rate:.0f} rows/s')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or Path(path).suffix.lstrip('.').lower()
+        if fmt not in FORMATS:
+            raise CommandError(f'Unknown input format "{fmt}", use --format')
+
+        stream = sys.stdin if path == '-' \
+            else open(path, newline='', encoding='utf-8')
+        try:
+            stats = import_catalog(stream, fmt,
+                                   chunk_size=options['chunk_size'],
+                                   imprint=options['imprint'],
+                                   progress=self._progress)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for error in stats.errors:
+            self.stderr.write(error)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {stats.rows} rows in {stats.elapsed:.2f}s '
+            f'({stats.rate:.0f} rows/s): {stats.created} books created, '
+            f'{stats.updated} updated, {stats.copies} copies added, '
+            f'{len(stats.errors)} rejected'))
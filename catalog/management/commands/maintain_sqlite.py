@@ -0,0 +1,36 @@
+from django.core.management.base import CommandError
+from django.db import connections
+
+from catalog.management.periodic import PeriodicCommand
+from catalog.sqlite import maintain, DEF_ANALYSIS_LIMIT
+
+
+class Command(PeriodicCommand):
+    help = 'Run PRAGMA optimize and checkpoint the write-ahead log of the ' \
+           'SQLite database, once or every --every seconds with an ' \
+           'in-process scheduler'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--analysis-limit', type=int,
+                            default=DEF_ANALYSIS_LIMIT,
+                            help='Rows sampled per index by PRAGMA optimize')
+
+    def run_once(self):
+        busy, log, checkpointed = maintain(self.connection,
+                                           self.analysis_limit)
+        if log < 0:
+            checkpoint = 'not in WAL mode'
+        else:
+            checkpoint = f'checkpointed {checkpointed}/{log} WAL pages' \
+                + (' (busy, readers held it back)' if busy else '')
+        self.report(f'optimized, {checkpoint}')
+
+    def handle(self, *args, **options):
+        self.connection = connections[options['database']]
+        if self.connection.vendor != 'sqlite':
+            raise CommandError(f'"{options["database"]}" is not an SQLite '
+                               'database')
+        self.analysis_limit = options['analysis_limit']
+        self.schedule(options['every'])
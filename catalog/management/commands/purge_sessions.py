@@ -0,0 +1,29 @@
+import time
+
+from catalog.management.periodic import PeriodicCommand
+from catalog.sessions import purge_expired, DEF_BATCH_SIZE
+
+
+class Command(PeriodicCommand):
+    help = 'Delete expired sessions in batches (unlike clearsessions, ' \
+           'which deletes them all in one statement), once or every ' \
+           '--every seconds with an in-process scheduler'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--batch-size', type=int, default=DEF_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=0,
+                            metavar='SECONDS',
+                            help='Sleep between batches')
+
+    def run_once(self):
+        start = time.perf_counter()
+        deleted = purge_expired(self.batch_size, self.pause)
+        purged = 'purged expired sessions' if deleted is None \
+            else f'purged {deleted} expired sessions'
+        self.report(f'{purged} in {time.perf_counter() - start:.2f}s')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.pause = options['pause']
+        self.schedule(options['every'])
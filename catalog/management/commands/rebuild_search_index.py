@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text book search index from the catalog tables'
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError('The search index requires the SQLite '
+                               'backend, other backends search the tables '
+                               'directly')
+
+        start = time.perf_counter()
+        search.rebuild_index()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt search index in {time.perf_counter() - start:.2f}s'))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.counters import reconcile, RECONCILE_BATCH_SIZE
+from catalog import genre_names
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-status copy counters and the genre names of ' \
+           'every book from its copies and genres, eg. after bulk changes ' \
+           'which bypassed model signals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=RECONCILE_BATCH_SIZE)
+        parser.add_argument('book_ids', nargs='*', type=int,
+                            help='Only reconcile these books')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        book_ids = options['book_ids'] or None
+        updated = reconcile(book_ids, batch_size=options['batch_size'])
+        renamed = genre_names.refresh(book_ids,
+                                      batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Reconciled {updated} books, fixed the genre names of {renamed} '
+            f'in {time.perf_counter() - start:.2f}s'))
@@ -0,0 +1,19 @@
+from catalog.management.periodic import PeriodicCommand
+from catalog.overdue import sweep, DEF_BATCH_SIZE
+
+
+class Command(PeriodicCommand):
+    help = 'Record overdue loans in the OverdueLoan ledger, once or every ' \
+           '--every seconds with an in-process scheduler (no broker needed)'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--batch-size', type=int, default=DEF_BATCH_SIZE)
+
+    def run_once(self):
+        result = sweep(batch_size=self.batch_size)
+        self.report(f'swept: {result}')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.schedule(options['every'])
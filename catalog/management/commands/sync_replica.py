@@ -0,0 +1,41 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database onto the read replicas ' \
+           '(CATALOG_READ_REPLICAS), with SQLite\'s online backup so the ' \
+           'primary stays usable meanwhile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('aliases', nargs='*',
+                            help='Replicas to sync (default: all of them)')
+
+    def handle(self, *args, **options):
+        aliases = options['aliases'] or settings.CATALOG_READ_REPLICAS
+        if not aliases:
+            raise CommandError('No read replicas configured, '
+                               'see DJANGO_REPLICA_DBS')
+
+        primary = connections['default']
+        if primary.vendor != 'sqlite':
+            raise CommandError('sync_replica only copies SQLite databases, '
+                               'use the database\'s own replication')
+        primary.ensure_connection()
+
+        for alias in aliases:
+            if alias not in settings.CATALOG_READ_REPLICAS:
+                raise CommandError(f'"{alias}" is not a read replica')
+
+            # Close the replica's persistent connection, the file is replaced
+            connections[alias].close()
+            target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+
+            self.stdout.write(self.style.SUCCESS(f'Synced {alias}'))
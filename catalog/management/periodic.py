@@ -0,0 +1,57 @@
+import sched
+import time
+import traceback
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+
+class PeriodicCommand(BaseCommand):
+    """
+    Command doing its work (run_once()) once, or every --every seconds with
+      an in-process scheduler, so no broker is needed
+    """
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=int, metavar='SECONDS',
+                            help='Keep running, repeating at this interval')
+
+    def run_once(self):
+        raise NotImplementedError
+
+    def report(self, message, stream=None):
+        stream = stream or self.stdout
+        stream.write(f'{time.strftime("%Y-%m-%d %H:%M:%S")} {message}')
+
+    def _run(self, scheduler=None, every=None):
+        close_old_connections()
+        try:
+            self.run_once()
+        except Exception:
+            if scheduler is None:
+                raise
+            # A transient failure (eg. a locked database) must not end the
+            #   loop, the next run tries again
+            self.report(f'Run failed\n{traceback.format_exc()}',
+                        self.stderr)
+        finally:
+            close_old_connections()
+            if scheduler is not None:
+                # Schedule from the planned start, so runs don't drift
+                scheduler.enterabs(self.next_run, 0, self._run,
+                                   (scheduler, every))
+                self.next_run += every
+
+    def schedule(self, every):
+        """run_once() now, and every 'every' seconds after when given"""
+        if not every:
+            self._run()
+            return
+
+        scheduler = sched.scheduler(time.monotonic, time.sleep)
+        self.next_run = time.monotonic() + every
+        scheduler.enter(0, 0, self._run, (scheduler, every))
+
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped')
@@ -0,0 +1,187 @@
+import math
+import threading
+from bisect import bisect_left
+from collections import defaultdict, deque
+
+from django.conf import settings
+
+
+# Observations kept per view and metric for the recent quantiles, older
+#   ones roll out of the window
+DEF_WINDOW = 1000
+WINDOW_QUANTILES = (.5, .9, .99)
+
+# name: (help, bucket upper bounds)
+HISTOGRAMS = {
+    'catalog_request_queries': (
+        'SQL queries run per request',
+        (1, 2, 3, 5, 10, 20, 50, 100)),
+    'catalog_request_sql_seconds': (
+        'Time spent in SQL per request',
+        (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1)),
+    'catalog_request_render_seconds': (
+        'Template render time per request, for TemplateResponse views',
+        (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1)),
+    'catalog_request_seconds': (
+        'Total time per request',
+        (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5)),
+    'catalog_response_bytes': (
+        'Response body size, for non-streaming responses',
+        (1024, 4096, 16384, 65536, 262144, 1048576)),
+}
+
+COUNTERS = {
+    'catalog_requests_total': 'Requests served',
+    'catalog_query_budget_exceeded_total':
+        'Requests running more queries than CATALOG_QUERY_BUDGET',
+}
+
+# Read when scraped, from the callables given to Registry.gauge()
+GAUGES = {
+    'catalog_prefix_index_bytes':
+        'Approximate memory held by the autocomplete prefix index',
+    'catalog_prefix_index_keys': 'Keys in the autocomplete prefix index',
+    'catalog_prefix_index_build_seconds':
+        'Time the last build of the autocomplete prefix index took',
+}
+
+
+def _label(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"')\
+        .replace('\n', r'\n')
+
+
+def _bound(value):
+    return '+Inf' if value == float('inf') else repr(value)
+
+
+def _quantile(values, q):
+    """Nearest-rank quantile of sorted values"""
+    return values[max(math.ceil(q * len(values)) - 1, 0)]
+
+
+class Histogram:
+    """Observation counts per bucket, their sum and count since start"""
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * len(bounds)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        i = bisect_left(self.bounds, value)
+        if i < len(self.bounds):
+            self.buckets[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(bound, observations <= bound), ending with +Inf"""
+        total, counts = 0, []
+        for bound, count in zip(self.bounds, self.buckets):
+            total += count
+            counts.append((bound, total))
+        return counts + [(float('inf'), self.count)]
+
+
+class Registry:
+    """
+    In-memory, per-process metrics keyed by view name. Histograms and
+      counters only grow, as Prometheus' rate() expects. The last 'window'
+      observations of each view are exported besides, as gauges of their
+      quantiles, which follow the current behaviour rather than the whole
+      uptime.
+    """
+    def __init__(self, window=None):
+        self.window = window or getattr(settings, 'CATALOG_METRICS_WINDOW',
+                                        DEF_WINDOW)
+        self.lock = threading.Lock()
+        # Not observations, kept across reset()
+        self.gauges = {}
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.samples = defaultdict(lambda: deque(maxlen=self.window))
+            self.histograms = {}
+            self.counters = defaultdict(int)
+
+    def observe(self, view, name, value):
+        with self.lock:
+            self.samples[name, view].append(value)
+            if (name, view) not in self.histograms:
+                self.histograms[name, view] = Histogram(HISTOGRAMS[name][1])
+            self.histograms[name, view].observe(value)
+
+    def increment(self, view, name, amount=1):
+        with self.lock:
+            self.counters[name, view] += amount
+
+    def gauge(self, name, read):
+        """Report the value returned by 'read' as gauge 'name' when scraped"""
+        with self.lock:
+            self.gauges[name] = read
+
+    def snapshot(self):
+        """The recent observations and the counters"""
+        with self.lock:
+            return ({key: list(values) for key, values in self.samples.items()},
+                    dict(self.counters))
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format"""
+        samples, counters = self.snapshot()
+        with self.lock:
+            histograms = {key: (histogram.cumulative(), histogram.sum,
+                                histogram.count)
+                          for key, histogram in self.histograms.items()}
+        lines = []
+
+        for name, (help_text, _) in HISTOGRAMS.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+
+            for (metric, view), (buckets, total, count) in \
+                    sorted(histograms.items()):
+                if metric != name:
+                    continue
+
+                label = f'view="{_label(view)}"'
+                for bound, observed in buckets:
+                    lines.append(f'{name}_bucket{{{label},le="{_bound(bound)}"}} '
+                                 f'{observed}')
+                lines.append(f'{name}_sum{{{label}}} {total}')
+                lines.append(f'{name}_count{{{label}}} {count}')
+
+            window = f'{name}_window'
+            lines += [f'# HELP {window} {help_text}, quantiles of the last '
+                      f'{self.window} requests',
+                      f'# TYPE {window} gauge']
+
+            for (metric, view), values in sorted(samples.items()):
+                if metric != name or not values:
+                    continue
+
+                values = sorted(values)
+                for q in WINDOW_QUANTILES:
+                    lines.append(f'{window}{{view="{_label(view)}",'
+                                 f'quantile="{q}"}} {_quantile(values, q)}')
+
+        for name, help_text in COUNTERS.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+
+            for (metric, view), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{{view="{_label(view)}"}} {value}')
+
+        with self.lock:
+            gauges = dict(self.gauges)
+        for name, help_text in GAUGES.items():
+            if name in gauges:
+                lines += [f'# HELP {name} {help_text}',
+                          f'# TYPE {name} gauge',
+                          f'{name} {gauges[name]()}']
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
@@ -0,0 +1,180 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, \
+    sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from .metrics import registry
+from . import routers
+
+
+logger = logging.getLogger('catalog.metrics')
+
+# How long a client reads from the primary after writing
+DEF_PIN_SECONDS = 10
+
+
+class QueryRecorder:
+    """execute_wrapper counting the queries run and the time spent in them"""
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.seconds += time.perf_counter() - start
+
+
+class RequestMetricsMiddleware:
+    """
+    Record the query count, SQL time, template render time, total time and
+      response size of every request in the metrics registry, labelled by
+      view name. Requests running more than CATALOG_QUERY_BUDGET queries
+      (when set) are logged to the 'catalog.metrics' logger.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _wrap_connections(recorder):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        return stack
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        recorder = QueryRecorder()
+        request._metrics_render = None
+        start = time.perf_counter()
+
+        with self._wrap_connections(recorder):
+            response = self.get_response(request)
+
+        self.record(request, response, recorder, time.perf_counter() - start)
+
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        request._metrics_render = None
+        start = time.perf_counter()
+
+        # The async ORM queries from the request's sync thread, wrap the
+        #   connections of that thread
+        stack = await sync_to_async(self._wrap_connections)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+
+        self.record(request, response, recorder, time.perf_counter() - start)
+
+        return response
+
+    def process_template_response(self, request, response):
+        # Runs right before the response is rendered, the callback after it
+        start = time.perf_counter()
+
+        def rendered(response):
+            request._metrics_render = time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+
+        return response
+
+    def record(self, request, response, recorder, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+
+        registry.increment(view, 'catalog_requests_total')
+        registry.observe(view, 'catalog_request_queries', recorder.queries)
+        registry.observe(view, 'catalog_request_sql_seconds', recorder.seconds)
+        registry.observe(view, 'catalog_request_seconds', elapsed)
+        if request._metrics_render is not None:
+            registry.observe(view, 'catalog_request_render_seconds',
+                             request._metrics_render)
+        if not response.streaming:
+            registry.observe(view, 'catalog_response_bytes',
+                             len(response.content))
+
+        budget = getattr(settings, 'CATALOG_QUERY_BUDGET', None)
+        if budget is not None and recorder.queries > budget:
+            registry.increment(view, 'catalog_query_budget_exceeded_total')
+            logger.warning(
+                'Query budget exceeded: %s %s (%s) ran %d queries '
+                '(budget %d) in %.1fms of SQL',
+                request.method, request.path, view, recorder.queries, budget,
+                recorder.seconds * 1000)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Route the catalog reads of safe requests to a read replica, when
+      CATALOG_READ_REPLICAS lists any. A request writing (any other method)
+      reads from the primary and pins its client to the primary for
+      CATALOG_REPLICA_PIN_SECONDS, so it reads its own writes while the
+      replicas catch up.
+    """
+    PIN_COOKIE = 'catalog_primary'
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _read_alias(self, request):
+        if request.method in self.SAFE_METHODS \
+                and self.PIN_COOKIE not in request.COOKIES:
+            return routers.pick_replica()
+        return None
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = routers.use_replica(self._read_alias(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.reset(token)
+
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        # sync_to_async() copies the context, the ORM's threads see the alias
+        token = routers.use_replica(self._read_alias(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            routers.reset(token)
+
+        return self.pin(request, response)
+
+    def pin(self, request, response):
+        if request.method not in self.SAFE_METHODS and routers.replicas():
+            response.set_cookie(
+                self.PIN_COOKIE, '1',
+                max_age=getattr(settings, 'CATALOG_REPLICA_PIN_SECONDS',
+                                DEF_PIN_SECONDS),
+                httponly=True, samesite='Lax')
+
+        return response
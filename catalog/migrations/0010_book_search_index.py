@@ -0,0 +1,49 @@
+from django.db import migrations
+
+
+CREATE_SQL = """
+CREATE VIRTUAL TABLE catalog_book_search USING fts5(
+    title, summary, author, genres,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+POPULATE_SQL = """
+INSERT INTO catalog_book_search(rowid, title, summary, author, genres)
+SELECT b.id, b.title, b.summary,
+       COALESCE(a.first_name || ' ' || a.last_name, ''),
+       COALESCE((SELECT GROUP_CONCAT(g.name, ' ')
+                 FROM catalog_book_genre bg
+                 JOIN catalog_genre g ON g.id = bg.genre_id
+                 WHERE bg.book_id = b.id), '')
+FROM catalog_book b
+LEFT JOIN catalog_author a ON a.id = b.author_id
+"""
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is specific to SQLite, other backends fall back to icontains
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    schema_editor.execute(CREATE_SQL)
+    schema_editor.execute(POPULATE_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    schema_editor.execute('DROP TABLE IF EXISTS catalog_book_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_alter_author_dob'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:16
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+COPY_COUNTERS = {'a': 'copies_available',
+                 'o': 'copies_on_loan',
+                 'r': 'copies_reserved',
+                 'm': 'copies_maintenance'}
+
+
+def count_copies(apps, schema_editor):
+    Book = apps.get_model('catalog', 'Book')
+    BookInstance = apps.get_model('catalog', 'BookInstance')
+
+    def count(status):
+        counts = BookInstance.objects\
+            .filter(book=OuterRef('pk'), status=status)\
+            .order_by()\
+            .values('book')\
+            .annotate(n=Count('pk'))\
+            .values('n')
+        return Coalesce(Subquery(counts), Value(0))
+
+    Book.objects.update(**{field: count(status)
+                           for status, field in COPY_COUNTERS.items()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='copies_available',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_maintenance',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_on_loan',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_reserved',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_copies, migrations.RunPython.noop),
+    ]
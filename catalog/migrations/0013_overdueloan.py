@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_book_copy_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OverdueLoan',
+            fields=[
+                ('instance', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='overdue', serialize=False, to='catalog.bookinstance')),
+                ('due_back', models.DateField()),
+                ('first_seen', models.DateField()),
+                ('last_seen', models.DateField()),
+                ('resolved', models.DateField(blank=True, null=True)),
+                ('book', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='catalog.book')),
+                ('borrower', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['due_back'],
+                'indexes': [models.Index(fields=['resolved', 'due_back'], name='overdue_open_due_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:41
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def fill_genre_names(apps, schema_editor):
+    Book = apps.get_model('catalog', 'Book')
+
+    names = defaultdict(list)
+    for book_id, name in Book.genre.through.objects\
+            .values_list('book_id', 'genre__name'):
+        names[book_id].append(name)
+
+    Book.objects.bulk_update(
+        [Book(pk=pk, genre_names=', '.join(sorted(n)))
+         for pk, n in names.items()],
+        ['genre_names'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0014_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='genre_names',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_genre_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0016_bookinstance_due_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='genre',
+            index=models.Index(fields=['name', 'id'], name='genre_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='language',
+            index=models.Index(fields=['name', 'id'], name='language_name_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:03
+
+from django.db import migrations, models
+
+
+def name_key(*parts):
+    return ', '.join(' '.join(part.split()) for part in parts).casefold()
+
+
+def fill_name_keys(apps, schema_editor):
+    Author = apps.get_model('catalog', 'Author')
+    Author.objects.bulk_update(
+        [Author(pk=pk, name_key=name_key(last_name, first_name))
+         for pk, first_name, last_name in Author.objects
+         .values_list('pk', 'first_name', 'last_name').iterator()],
+        ['name_key'], batch_size=2000)
+
+    for model in ('Genre', 'Language'):
+        model = apps.get_model('catalog', model)
+        model.objects.bulk_update(
+            [model(pk=pk, name_key=name_key(name))
+             for pk, name in model.objects.values_list('pk', 'name')],
+            ['name_key'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0017_name_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='genre',
+            name='genre_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='language',
+            name='language_name_idx',
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='name_key',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='name_key',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='language',
+            name='name_key',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_name_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['name_key', 'id'], name='author_name_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='genre',
+            index=models.Index(fields=['name_key', 'id'], name='genre_name_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='language',
+            index=models.Index(fields=['name_key', 'id'], name='language_name_key_idx'),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.urls import reverse
 from django.contrib.auth.models import User
 import uuid
@@ -20,7 +20,32 @@ LANGUAGES = ['English', 'Russian', 'Korean', 'Spanish', 'Mandarin', 'Cantonese',
              'Ukrainian', 'Italian', 'French', 'Japanese']
 
 
-class Author(models.Model):
+def name_key(*parts):
+    """
+    Case and spacing insensitive form of a name made of 'parts', joined by
+      ', ': the key the autocomplete searches by prefix (catalog.lookups)
+    """
+    return ', '.join(' '.join(part.split()) for part in parts).casefold()
+
+
+class NameKeyModel(models.Model):
+    """A model whose name_key is kept in step with its name_parts() on save"""
+    name_key = models.TextField(blank=True, default='', editable=False)
+
+    class Meta:
+        abstract = True
+
+    def name_parts(self):
+        raise NotImplementedError
+
+    def save(self, *args, **kwargs):
+        self.name_key = name_key(*self.name_parts())
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'name_key'}
+        super().save(*args, **kwargs)
+
+
+class Author(NameKeyModel):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     dob = models.DateField(
@@ -32,21 +57,34 @@ class Author(models.Model):
         null=True,
         blank=True
     )
+    # Last-Modified of the pages showing the author (catalog.caching)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f'{self.last_name}, {self.first_name}'
 
+    def name_parts(self):
+        return self.last_name, self.first_name
+
     def get_absolute_url(self):
         return reverse('authors-detail', args=[str(self.id)])
 
     class Meta:
         ordering = ['last_name', 'first_name']
+        indexes = [
+            # Author list ordering and cursor pagination
+            models.Index(fields=['last_name', 'first_name', 'id'],
+                         name='author_name_idx'),
+            # Prefix lookups of the book form's autocomplete (catalog.lookups)
+            models.Index(fields=['name_key', 'id'],
+                         name='author_name_key_idx'),
+        ]
         permissions = (
             ('can_edit_authors', 'Can modify available list of authors'),
         )
 
 
-class Genre(models.Model):
+class Genre(NameKeyModel):
     name = models.CharField(
         max_length=DEF_CHARFIELD_LENGTH,
         help_text='Enter a book genre (eg. Science Fiction, Biography)'
@@ -55,8 +93,17 @@ class Genre(models.Model):
     def __str__(self):
         return self.name
 
+    def name_parts(self):
+        return self.name,
+
+    class Meta:
+        indexes = [
+            # Prefix lookups of the book form's autocomplete (catalog.lookups)
+            models.Index(fields=['name_key', 'id'], name='genre_name_key_idx'),
+        ]
+
 
-class Language(models.Model):
+class Language(NameKeyModel):
     name = models.CharField(
         max_length=DEF_CHARFIELD_LENGTH,
         help_text='Specify the book\'s language (eg. Russian)'
@@ -65,6 +112,15 @@ class Language(models.Model):
     def __str__(self):
         return self.name
 
+    def name_parts(self):
+        return self.name,
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name_key', 'id'],
+                         name='language_name_key_idx'),
+        ]
+
 
 class Book(models.Model):
     title = models.CharField(
@@ -96,10 +152,29 @@ class Book(models.Model):
         on_delete=models.SET_NULL,
         null=True
     )
+    # Number of copies per loan status, maintained by catalog.counters
+    copies_available = models.IntegerField(default=0, editable=False)
+    copies_on_loan = models.IntegerField(default=0, editable=False)
+    copies_reserved = models.IntegerField(default=0, editable=False)
+    copies_maintenance = models.IntegerField(default=0, editable=False)
+    # The genres' names, maintained by catalog.genre_names for list displays
+    genre_names = models.TextField(blank=True, default='', editable=False)
+    # Last-Modified of the pages showing the book (catalog.caching), also
+    #   moved by the copy counters
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
-    # Return comma-separated list of genres for list display
+    # Counter field for each BookInstance.LOAN_STATUS
+    COPY_COUNTERS = {'a': 'copies_available',
+                     'o': 'copies_on_loan',
+                     'r': 'copies_reserved',
+                     'm': 'copies_maintenance'}
+    # Written by their receivers only, never by saving a (maybe stale) book
+    MAINTAINED_FIELDS = (*COPY_COUNTERS.values(), 'genre_names')
+
+    # Return comma-separated list of genres for list display, from the
+    #   denormalized column so a changelist doesn't query per row
     def display_genre(self):
-        return ', '.join(genre.name for genre in self.genre.all()[:])
+        return self.genre_names
 
     display_genre.short_description = 'Genre'
 
@@ -109,7 +184,33 @@ class Book(models.Model):
     def get_absolute_url(self):
         return reverse('book-detail', args=[str(self.id)])
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the author, the cache of its page is evicted on a change
+        if 'author_id' in field_names:
+            instance._loaded_author_id = instance.author_id
+        return instance
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert') \
+                and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred
+                and field.name not in self.MAINTAINED_FIELDS]
+        super().save(*args, **kwargs)
+
+    def copies(self):
+        """The book's copies, in the order the detail page lists them"""
+        return self.bookinstance_set.order_by('due_back', 'instance_id')
+
     class Meta:
+        indexes = [
+            # Book list ordering and cursor pagination
+            models.Index(fields=['title', 'id'], name='book_title_idx'),
+        ]
         permissions = (
             ('can_edit_books', 'Can edit available books'),
         )
@@ -136,7 +237,8 @@ class BookInstance(models.Model):
     book = models.ForeignKey(
         'Book',
         on_delete=models.RESTRICT,
-        null=True
+        null=True,
+        db_index=False  # Leads bookinst_book_due_idx instead
     )
     imprint = models.CharField(
         max_length=DEF_CHARFIELD_LENGTH
@@ -152,6 +254,31 @@ class BookInstance(models.Model):
         default='m',
         help_text='Book availability'
     )
+    # Read per book through bookinst_book_due_idx, needs no index of its own
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the copy counters currently account this copy as
+        if 'book_id' in field_names and 'status' in field_names:
+            instance._counted = (instance.book_id, instance.status)
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Book's copy counters are updated by a post_save receiver, keep
+        #   them in the same transaction as the copy itself
+        with transaction.atomic(using=kwargs.get('using')):
+            if not self._state.adding:
+                # What the counters account the copy as, read from the row
+                #   (locked where supported) rather than from when this
+                #   instance was loaded, so concurrent saves of the copy
+                #   each apply their change from the state the other left
+                self._counted = BookInstance.objects\
+                    .using(kwargs.get('using')).select_for_update()\
+                    .filter(pk=self.pk).values_list('book_id', 'status')\
+                    .first()
+            super().save(*args, **kwargs)
 
     @property
     def is_overdue(self):
@@ -162,7 +289,70 @@ class BookInstance(models.Model):
 
     class Meta:
         ordering = ['due_back']
+        indexes = [
+            # Copies per status (index counts, all copies list sections)
+            models.Index(fields=['status', 'due_back', 'instance_id'],
+                         name='bookinst_status_due_idx'),
+            # Copies listed on a book's detail page
+            models.Index(fields=['book', 'due_back', 'instance_id'],
+                         name='bookinst_book_due_idx'),
+            # Only copies on loan are looked up by borrower or due date
+            models.Index(fields=['borrower', 'due_back', 'instance_id'],
+                         condition=models.Q(status='o'),
+                         name='bookinst_loan_borrower_idx'),
+            models.Index(fields=['due_back'],
+                         condition=models.Q(status='o'),
+                         name='bookinst_loan_due_idx'),
+            # Admin changelist ordering and its due date filter
+            models.Index(fields=['due_back', 'instance_id'],
+                         name='bookinst_due_idx'),
+        ]
         permissions = (
             ('can_mark_returned_books', 'Can set book as returned'),
             ('can_view_all_books', 'Can view all available book instances'),
         )
+
+
+class OverdueLoan(models.Model):
+    """
+    Ledger of overdue copies written by the overdue sweep (catalog.overdue),
+      one row per copy; 'resolved' is set once the copy is no longer overdue
+    """
+    instance = models.OneToOneField(
+        BookInstance,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='overdue'
+    )
+    book = models.ForeignKey(
+        Book,
+        on_delete=models.SET_NULL,
+        null=True
+    )
+    borrower = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+    due_back = models.DateField()
+    first_seen = models.DateField()
+    last_seen = models.DateField()
+    resolved = models.DateField(
+        null=True,
+        blank=True
+    )
+
+    @property
+    def days_overdue(self):
+        return ((self.resolved or self.last_seen) - self.due_back).days
+
+    def __str__(self):
+        return f'{self.instance_id} (due {self.due_back})'
+
+    class Meta:
+        ordering = ['due_back']
+        indexes = [
+            models.Index(fields=['resolved', 'due_back'],
+                         name='overdue_open_due_idx'),
+        ]
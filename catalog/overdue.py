@@ -0,0 +1,116 @@
+import datetime
+import time
+
+from django.db import transaction
+
+from .models import BookInstance, OverdueLoan
+from .pagination import KeysetPaginator
+
+
+DEF_BATCH_SIZE = 1000
+SWEEP_ORDERING = ('due_back', 'instance_id')
+SWEEP_FIELDS = ('instance_id', 'book_id', 'borrower_id', 'due_back')
+
+
+class SweepResult:
+    def __init__(self, overdue=0, resolved=0, elapsed=0.0):
+        self.overdue = overdue
+        self.resolved = resolved
+        self.elapsed = elapsed
+
+    def __str__(self):
+        return f'{self.overdue} overdue, {self.resolved} resolved ' \
+               f'in {self.elapsed:.2f}s'
+
+
+def overdue_instances(today=None):
+    """Copies on loan past their due date, answered from bookinst_loan_due_idx"""
+    today = today or datetime.date.today()
+
+    return BookInstance.objects.filter(status__exact='o', due_back__lt=today)
+
+
+def batch_queryset(today, key=None):
+    """
+    The overdue copies following 'key' in sweep order. An overdue copy always
+      has a due date, so the paginator's NULL tail is left out.
+    """
+    paginator = KeysetPaginator(overdue_instances(today), SWEEP_ORDERING,
+                                DEF_BATCH_SIZE)
+
+    return paginator.querysets(key)[0]
+
+
+def _batches(today, batch_size):
+    """Walk the overdue copies in keyset batches of plain value tuples"""
+    key = None
+
+    while True:
+        batch = list(batch_queryset(today, key)
+                     .values_list(*SWEEP_FIELDS)[:batch_size])
+        if not batch:
+            return
+        yield batch
+
+        last = batch[-1]
+        key = [last[SWEEP_FIELDS.index(name)] for name in SWEEP_ORDERING]
+
+
+def _first_seen(batch, today):
+    """
+    First day each copy of the batch was seen overdue: kept from its open
+      ledger entry for the same loan, today for a new loan or due date
+    """
+    entries = {instance_id: (borrower_id, due_back, first_seen)
+               for instance_id, borrower_id, due_back, first_seen
+               in OverdueLoan.objects
+               .filter(instance__in=[row[0] for row in batch],
+                       resolved__isnull=True)
+               .values_list('instance_id', 'borrower_id', 'due_back',
+                            'first_seen')}
+
+    first_seen = {}
+    for instance_id, _, borrower_id, due_back in batch:
+        entry = entries.get(instance_id)
+        first_seen[instance_id] = entry[2] \
+            if entry and entry[:2] == (borrower_id, due_back) else today
+    return first_seen
+
+
+def sweep(today=None, batch_size=DEF_BATCH_SIZE):
+    """
+    Record every currently overdue copy in the OverdueLoan ledger and mark
+      the ledger entries of copies which were returned or renewed since the
+      last sweep as resolved
+    """
+    start = time.perf_counter()
+    today = today or datetime.date.today()
+    result = SweepResult()
+
+    for batch in _batches(today, batch_size):
+        with transaction.atomic():
+            first_seen = _first_seen(batch, today)
+            OverdueLoan.objects.bulk_create(
+                [OverdueLoan(instance_id=instance_id,
+                             book_id=book_id,
+                             borrower_id=borrower_id,
+                             due_back=due_back,
+                             first_seen=first_seen[instance_id],
+                             last_seen=today)
+                 for instance_id, book_id, borrower_id, due_back in batch],
+                update_conflicts=True,
+                unique_fields=['instance'],
+                update_fields=['book', 'borrower', 'due_back', 'first_seen',
+                               'last_seen', 'resolved'],
+            )
+        result.overdue += len(batch)
+
+    # Open entries whose copy is no longer overdue, also catches copies
+    #   returned since an earlier sweep on the same day
+    result.resolved = OverdueLoan.objects\
+        .filter(resolved__isnull=True)\
+        .exclude(instance__in=overdue_instances(today).values('pk'))\
+        .update(resolved=today)
+    result.elapsed = time.perf_counter() - start
+
+    return result
@@ -0,0 +1,327 @@
+import hashlib
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import F, Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+CURSOR_SALT = 'catalog.pagination'
+FORWARD = 'n'
+BACKWARD = 'p'
+
+# Counts up to this are exact, larger ones are cached for DEF_COUNT_TIMEOUT
+DEF_EXACT_COUNT = 10000
+DEF_COUNT_TIMEOUT = 5 * 60
+COUNT_PREFIX = 'catalog:count:'
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator for large tables (eg. the admin's changelists): a bounded
+      COUNT over at most CATALOG_EXACT_COUNT + 1 rows tells whether the
+      result is small, when it isn't the full count is computed once and
+      cached for CATALOG_COUNT_TIMEOUT, keyed by the query. Large counts may
+      be off by the changes made since, small ones are always exact.
+    """
+    @property
+    def exact_count_limit(self):
+        return getattr(settings, 'CATALOG_EXACT_COUNT', DEF_EXACT_COUNT)
+
+    def _count_key(self):
+        sql, params = self.object_list.query.sql_with_params()
+        digest = hashlib.md5(f'{sql}:{params!r}'.encode()).hexdigest()
+        return f'{COUNT_PREFIX}{digest}'
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list.order_by()
+        limit = self.exact_count_limit
+
+        bounded = queryset[:limit + 1].count()
+        if bounded <= limit:
+            return bounded
+
+        key = self._count_key()
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, getattr(settings, 'CATALOG_COUNT_TIMEOUT',
+                                          DEF_COUNT_TIMEOUT))
+        return count
+
+
+class KeysetPage:
+    """
+    One page of a keyset paginated queryset; unlike django's Page there is
+      no page number or total count, only cursors to the neighbouring pages
+    """
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self)} objects>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by seeking past the last seen row's ordering key
+      instead of using OFFSET, so every page costs the same single LIMIT
+      query regardless of depth and no COUNT(*) is ever needed.
+
+    'ordering' is a sequence of model field names (prefix with '-' for
+      descending) which together must be unique, eg. ('due_back', 'pk').
+      Nullable fields are ordered with their NULLs last.
+    """
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.keys = [self._resolve_key(queryset.model, name)
+                     for name in ordering]
+
+    @staticmethod
+    def _resolve_key(model, name):
+        descending = name.startswith('-')
+        name = name.lstrip('-')
+
+        try:
+            field = model._meta.pk if name == 'pk' \
+                else model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise ValueError(f'Cannot paginate {model.__name__} on "{name}"')
+
+        return field, descending
+
+    def _order_by(self, forward):
+        """Order expressions, reversed for walking back to previous pages"""
+        expressions = []
+
+        for field, descending in self.keys:
+            expr = F(field.attname)
+            if not field.null:
+                expressions.append(expr.desc() if descending == forward
+                                   else expr.asc())
+            elif forward:
+                expressions.append(expr.desc(nulls_last=True) if descending
+                                   else expr.asc(nulls_last=True))
+            else:
+                expressions.append(expr.asc(nulls_first=True) if descending
+                                   else expr.desc(nulls_first=True))
+
+        return expressions
+
+    def _seek(self, values, forward):
+        """
+        Expand the row comparison (k1, k2, ...) > (v1, v2, ...) into
+          ... OR (k1 = v1 AND k2 > v2) OR k1 > v1, which works on every
+          backend and is answered from a (k1, k2, ...) index.
+
+        Returns the predicates in walking order: the NULLs sorted after a
+          nullable key's values are split into a predicate of their own,
+          an OR including them would stop the index range seek.
+        """
+        prefixes, prefix = [], Q()
+        for (field, _), value in zip(self.keys, values):
+            prefixes.append(prefix)
+            prefix &= Q(**{f'{field.attname}__isnull': True}) \
+                if value is None else Q(**{field.attname: value})
+
+        segments, current, bound = [], [], Q()
+        # The deepest key varies first, so its rows are the nearest ones
+        for (field, descending), value, prefix in reversed(
+                list(zip(self.keys, values, prefixes))):
+            name = field.attname
+            after = 'lt' if descending == forward else 'gt'
+
+            if value is None:
+                if forward:
+                    # NULLs are last, nothing follows them on this key
+                    continue
+                current.append(prefix & Q(**{f'{name}__isnull': False}))
+                bound = prefix
+            else:
+                current.append(prefix & Q(**{f'{name}__{after}': value}))
+                # Redundant range on the outermost varying key, lets the
+                #   database seek into the index instead of filtering a scan
+                bound = prefix & Q(**{f'{name}__{after}e': value})
+
+            if forward and field.null:
+                segments.append(bound & reduce(or_, current))
+                segments.append(prefix & Q(**{f'{name}__isnull': True}))
+                current = []
+
+        if current:
+            segments.append(bound & reduce(or_, current))
+
+        return segments
+
+    def querysets(self, values=None, forward=True):
+        """
+        The ordered querysets read, in turn, to fill the page next to the
+          given key; a single one unless a nullable key has to be crossed
+        """
+        ordered = self.queryset.order_by(*self._order_by(forward))
+
+        if values is None:
+            return [ordered]
+
+        return [ordered.filter(q) for q in self._seek(values, forward)]
+
+    def key(self, obj):
+        return [getattr(obj, field.attname) for field, _ in self.keys]
+
+    @staticmethod
+    def encode_cursor(values, direction):
+        values = [v if v is None else str(v) for v in values]
+
+        return signing.dumps({'k': values, 'd': direction},
+                             salt=CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        try:
+            data = signing.loads(cursor, salt=CURSOR_SALT)
+            values, direction = data['k'], data['d']
+
+            if len(values) != len(self.keys) \
+                    or direction not in (FORWARD, BACKWARD):
+                raise ValueError
+
+            values = [v if v is None else field.to_python(v)
+                      for (field, _), v in zip(self.keys, values)]
+        except (signing.BadSignature, ValidationError, KeyError, TypeError,
+                ValueError):
+            raise InvalidCursor('Invalid page cursor')
+
+        return values, direction
+
+    def _position(self, cursor):
+        values, direction = self.decode_cursor(cursor) if cursor \
+            else (None, FORWARD)
+
+        return values, direction == FORWARD
+
+    def page(self, cursor=None):
+        """Return the page following (or preceding) the given cursor"""
+        values, forward = self._position(cursor)
+
+        # Fetch one extra row to find out whether another page follows
+        rows = []
+        for queryset in self.querysets(values, forward):
+            rows.extend(queryset[:self.per_page + 1 - len(rows)])
+            if len(rows) > self.per_page:
+                break
+
+        if self._walked_back_to_start(rows, forward):
+            return self.page()
+
+        return self._page(rows, values, forward)
+
+    async def apage(self, cursor=None):
+        """page() for async views, reading the rows with the async ORM"""
+        values, forward = self._position(cursor)
+
+        rows = []
+        for queryset in self.querysets(values, forward):
+            rows.extend([row async for row in
+                         queryset[:self.per_page + 1 - len(rows)]])
+            if len(rows) > self.per_page:
+                break
+
+        if self._walked_back_to_start(rows, forward):
+            return await self.apage()
+
+        return self._page(rows, values, forward)
+
+    def _walked_back_to_start(self, rows, forward):
+        # Show a full first page instead of a short one
+        return not forward and len(rows) <= self.per_page
+
+    def _page(self, rows, values, forward):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if not forward:
+            rows.reverse()
+
+        has_next = has_more if forward else True
+        has_previous = values is not None if forward else True
+
+        if rows:
+            next_key, previous_key = self.key(rows[-1]), self.key(rows[0])
+        else:
+            # Everything past the cursor is gone, allow stepping back
+            next_key = previous_key = values
+
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor(next_key, FORWARD)
+            if has_next and rows else None,
+            previous_cursor=self.encode_cursor(previous_key, BACKWARD)
+            if has_previous else None,
+        )
+
+
+class CursorPaginationMixin:
+    """
+    Keyset pagination for ListViews: set 'paginate_by' as usual and
+      'cursor_ordering' to a unique ordering key. The template receives a
+      KeysetPage as 'page_obj' with next/previous cursor tokens to pass back
+      in the 'cursor' query parameter.
+    """
+    cursor_ordering = ('pk',)
+    cursor_param = 'cursor'
+
+    def get_cursor_ordering(self):
+        return self.cursor_ordering
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, self.get_cursor_ordering(),
+                                    page_size)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_param))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    async def apaginate_queryset(self, queryset, page_size):
+        """paginate_queryset() for async views"""
+        paginator = KeysetPaginator(queryset, self.get_cursor_ordering(),
+                                    page_size)
+        try:
+            page = await paginator.apage(
+                self.request.GET.get(self.cursor_param))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,106 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+
+from .caching import get_stamps, bump, is_shared_cache
+
+
+PERMS_PREFIX = 'catalog:perms:'
+DEF_TIMEOUT = 60 * 60
+
+# Version stamps the cached permissions are checked against: one per user
+#   (their own permissions, groups, is_superuser), one per group (its
+#   permissions and members) and one for all of them (renamed permissions)
+ALL_PERMISSIONS = 'perms'
+
+
+def user_scope(user_id):
+    return f'perms-user:{user_id}'
+
+
+def group_scope(group_id):
+    return f'perms-group:{group_id}'
+
+
+def _names(permissions):
+    return {f'{app_label}.{codename}' for app_label, codename in
+            permissions.values_list('content_type__app_label', 'codename')
+            .order_by()}
+
+
+def load_permissions(user):
+    """
+    The user's permissions from the database, along with the version stamps
+      of their groups, read first so a change made meanwhile shows as stale
+    """
+    group_ids = list(user.groups.values_list('pk', flat=True))
+    groups = dict(zip(group_ids,
+                      get_stamps(*map(group_scope, group_ids))))
+
+    if user.is_superuser:
+        names = _names(Permission.objects.all())
+    else:
+        names = _names(user.user_permissions.all()) | \
+            _names(Permission.objects.filter(group__in=group_ids))
+
+    return groups, frozenset(names)
+
+
+def cached_permissions(user):
+    """
+    All permission names of the user, from the cache while neither the user,
+      their groups nor the permissions themselves changed. Only a cache shared
+      by all processes is used: a revoked permission would otherwise stay
+      granted by the other processes until their entry expires.
+    """
+    if not is_shared_cache():
+        return load_permissions(user)[1]
+
+    key = PERMS_PREFIX + '.'.join(
+        [str(user.pk), *get_stamps(ALL_PERMISSIONS, user_scope(user.pk))])
+    entry = cache.get(key)
+
+    if entry is not None:
+        groups, names = entry
+        if list(groups.values()) == get_stamps(*map(group_scope, groups)):
+            return names
+
+    groups, names = load_permissions(user)
+    cache.set(key, (groups, names),
+              getattr(settings, 'CATALOG_PERMISSION_CACHE_TIMEOUT',
+                      DEF_TIMEOUT))
+
+    return names
+
+
+def invalidate_users(*user_ids):
+    bump(*map(user_scope, user_ids))
+
+
+def invalidate_groups(*group_ids):
+    bump(*map(group_scope, group_ids))
+
+
+def invalidate_all():
+    bump(ALL_PERMISSIONS)
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend whose permission checks read the user's permissions from the
+      cache when it is shared between processes (see settings.CACHES),
+      instead of querying the user and group permissions on every request.
+      Signals retire the entries (see catalog.signals). With a process-local
+      cache the permissions are loaded once per request, as ModelBackend does.
+    """
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            user_obj._perm_cache = cached_permissions(user_obj)
+        return user_obj._perm_cache
+
+    async def aget_all_permissions(self, user_obj, obj=None):
+        return await sync_to_async(self.get_all_permissions)(user_obj, obj)
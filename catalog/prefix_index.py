@@ -0,0 +1,298 @@
+import re
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from heapq import merge
+
+from django.conf import settings
+
+from .models import Book, Author
+from .metrics import registry
+
+
+BOOK = 'book'
+AUTHOR = 'author'
+
+DEF_LIMIT = 10
+# Signals keep the index of the process making a change current, the others
+#   (and bulk writes, which send no signals) catch up when it expires
+DEF_MAX_AGE = 5 * 60
+
+_SEPARATORS = re.compile(r'[\s,]+')
+
+
+def normalize(text):
+    """Case and spacing insensitive form of the keys and the prefixes"""
+    return _SEPARATORS.sub(' ', text).strip().casefold()
+
+
+def book_keys(title):
+    return (normalize(title),)
+
+
+def author_keys(first_name, last_name):
+    """Matched by 'Tolk', 'Tolkien, J' as well as 'John Tol'"""
+    return tuple(dict.fromkeys([normalize(f'{last_name} {first_name}'),
+                                normalize(f'{first_name} {last_name}')]))
+
+
+def _joined(values):
+    """The byte strings joined in one buffer, with their offsets in it"""
+    values = list(values)
+    offsets = array('q', [0])
+    for value in values:
+        offsets.append(offsets[-1] + len(value))
+    return b''.join(values), offsets
+
+
+class SortedKeys:
+    """
+    The keys of one kind, utf-8 encoded (which sorts as the strings do) and
+      joined in one buffer in sorted order, their offsets and pks in packed
+      arrays alongside; the labels likewise, by pk. Searched by bisection.
+
+    The buffers are written once, when built: changes made since go to a
+      small overlay (the changed objects' keys in a sorted list, the pks
+      retired from the buffers in a set) merged in by search() until the
+      next build.
+    """
+    def __init__(self, entries=()):
+        # [(pk, label, keys)]
+        entries = sorted(entries, key=lambda entry: entry[0])
+        pairs = sorted((key.encode(), pk) for pk, _, keys in entries
+                       for key in keys)
+
+        self.data, self.offsets = _joined(key for key, _ in pairs)
+        self.pks = array('q', [pk for _, pk in pairs])
+        self.ids = array('q', [pk for pk, _, _ in entries])
+        # Keys per object, by position in ids, counted off size() on removal
+        self.key_counts = array('B', [len(keys) for _, _, keys in entries])
+        self.labels, self.label_offsets = _joined(
+            label.encode() for _, label, _ in entries)
+
+        # Computed once, footprint() is read under the index's lock
+        self.packed_bytes = sum(sys.getsizeof(value) for value in (
+            self.data, self.offsets, self.pks, self.ids, self.key_counts,
+            self.labels, self.label_offsets))
+
+        self.changed = {}  # {pk: (label, encoded keys)}
+        self.changed_keys = []  # sorted [(encoded key, pk)]
+        self.retired = set()
+        self.retired_keys = 0
+        self.changed_bytes = 0
+
+    def _key(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]]
+
+    def _lower_bound(self, key):
+        lo, hi = 0, len(self.pks)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _packed(self, pk):
+        """Position of the object in the packed labels, None if not there"""
+        i = bisect_left(self.ids, pk)
+        return i if i < len(self.ids) and self.ids[i] == pk else None
+
+    def label(self, pk):
+        if pk in self.changed:
+            return self.changed[pk][0]
+        i = self._packed(pk)
+        return self.labels[self.label_offsets[i]:
+                           self.label_offsets[i + 1]].decode()
+
+    @staticmethod
+    def _entry_bytes(label, keys):
+        return sys.getsizeof(label) + sum(sys.getsizeof(key) for key in keys)
+
+    def add(self, pk, label, keys):
+        self.remove(pk)
+        keys = tuple(key.encode() for key in keys)
+        for key in keys:
+            insort(self.changed_keys, (key, pk))
+        self.changed[pk] = (label, keys)
+        self.changed_bytes += self._entry_bytes(label, keys)
+
+    def remove(self, pk):
+        if pk in self.changed:
+            label, keys = self.changed.pop(pk)
+            for key in keys:
+                del self.changed_keys[bisect_left(self.changed_keys,
+                                                  (key, pk))]
+            self.changed_bytes -= self._entry_bytes(label, keys)
+
+        i = self._packed(pk)
+        if i is not None and pk not in self.retired:
+            self.retired.add(pk)
+            self.retired_keys += self.key_counts[i]
+
+    def _packed_matches(self, prefix):
+        i = self._lower_bound(prefix)
+        while i < len(self.pks):
+            key = self._key(i)
+            if not key.startswith(prefix):
+                return
+            if self.pks[i] not in self.retired:
+                yield key, self.pks[i]
+            i += 1
+
+    def _changed_matches(self, prefix):
+        i = bisect_left(self.changed_keys, (prefix,))
+        while i < len(self.changed_keys) \
+                and self.changed_keys[i][0].startswith(prefix):
+            yield self.changed_keys[i]
+            i += 1
+
+    def search(self, prefix, limit):
+        """[(pk, label)] of the first 'limit' objects with a key so prefixed"""
+        prefix = prefix.encode()
+        found = []
+
+        for _, pk in merge(self._packed_matches(prefix),
+                           self._changed_matches(prefix)):
+            if len(found) == limit:
+                break
+            if pk not in found:
+                found.append(pk)
+
+        return [(pk, self.label(pk)) for pk in found]
+
+    def size(self):
+        return len(self.pks) - self.retired_keys + len(self.changed_keys)
+
+    def footprint(self):
+        """Bytes held by the buffers, arrays and overlay, roughly"""
+        return self.packed_bytes + self.changed_bytes + \
+            sys.getsizeof(self.changed) + sys.getsizeof(self.changed_keys) + \
+            sys.getsizeof(self.retired)
+
+
+class PrefixIndex:
+    """
+    In-process index of book titles and author names for the autocomplete,
+      built from the database on first use and rebuilt when older than
+      CATALOG_PREFIX_INDEX_MAX_AGE seconds, by one request while the others
+      search the old index. Lookups never query.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.kinds = None
+            self.built = None
+            self.build_seconds = 0.0
+            # Changes made while a build reads the database, replayed on the
+            #   new index as the read may have missed them
+            self.pending = None
+
+    @staticmethod
+    def _load():
+        books = [(pk, title, book_keys(title)) for pk, title in
+                 Book.objects.values_list('pk', 'title').iterator()]
+        authors = [(pk, f'{last_name}, {first_name}',
+                    author_keys(first_name, last_name))
+                   for pk, first_name, last_name in Author.objects
+                   .values_list('pk', 'first_name', 'last_name').iterator()]
+
+        return {BOOK: SortedKeys(books), AUTHOR: SortedKeys(authors)}
+
+    def _stale(self):
+        max_age = getattr(settings, 'CATALOG_PREFIX_INDEX_MAX_AGE',
+                          DEF_MAX_AGE)
+        return self.built is None or time.monotonic() - self.built > max_age
+
+    def build(self):
+        start = time.perf_counter()
+        with self.lock:
+            self.pending = []
+
+        try:
+            kinds = self._load()
+            with self.lock:
+                for change in self.pending:
+                    self._apply(kinds, *change)
+                self.kinds = kinds
+                self.built = time.monotonic()
+                self.build_seconds = time.perf_counter() - start
+        finally:
+            with self.lock:
+                self.pending = None
+
+    def _ensure(self):
+        if not self._stale():
+            return
+        # Only the first build is waited for: once there is an index, one
+        #   thread rebuilds it and the others keep searching the old one
+        if self.kinds is None:
+            with self.build_lock:
+                if self._stale():
+                    self.build()
+        elif self.build_lock.acquire(blocking=False):
+            try:
+                if self._stale():
+                    self.build()
+            finally:
+                self.build_lock.release()
+
+    def search(self, prefix, limit=DEF_LIMIT):
+        """{kind: [(pk, label)]} of the books and authors matching 'prefix'"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return {BOOK: [], AUTHOR: []}
+
+        self._ensure()
+        with self.lock:
+            return {kind: keys.search(prefix, limit)
+                    for kind, keys in self.kinds.items()}
+
+    @staticmethod
+    def _apply(kinds, kind, pk, entry):
+        if entry is None:
+            kinds[kind].remove(pk)
+        else:
+            kinds[kind].add(pk, *entry)
+
+    def _change(self, kind, pk, entry=None):
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append((kind, pk, entry))
+            # Not built yet, the build will read the change from the database
+            if self.kinds is not None:
+                self._apply(self.kinds, kind, pk, entry)
+
+    def update(self, kind, pk, label, keys):
+        self._change(kind, pk, (label, keys))
+
+    def remove(self, kind, pk):
+        self._change(kind, pk)
+
+    def size(self):
+        with self.lock:
+            if self.kinds is None:
+                return 0
+            return sum(keys.size() for keys in self.kinds.values())
+
+    def footprint(self):
+        with self.lock:
+            if self.kinds is None:
+                return 0
+            return sys.getsizeof(self.kinds) + \
+                sum(keys.footprint() for keys in self.kinds.values())
+
+
+index = PrefixIndex()
+
+registry.gauge('catalog_prefix_index_bytes', index.footprint)
+registry.gauge('catalog_prefix_index_keys', index.size)
+registry.gauge('catalog_prefix_index_build_seconds',
+               lambda: index.build_seconds)
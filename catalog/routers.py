@@ -0,0 +1,65 @@
+import contextvars
+import random
+
+from django.conf import settings
+
+
+# Replica alias the catalog reads of the current request go to, None reads
+#   from the primary; set per request by ReplicaRoutingMiddleware
+_read_alias = contextvars.ContextVar('catalog_read_alias', default=None)
+
+# Models read from the replicas, everything else (sessions, users,
+#   permissions) always reads from the primary
+REPLICA_APPS = {'catalog'}
+
+
+def replicas():
+    return list(getattr(settings, 'CATALOG_READ_REPLICAS', []))
+
+
+def use_replica(alias):
+    """Send this context's catalog reads to 'alias', returns a reset token"""
+    return _read_alias.set(alias)
+
+
+def use_primary():
+    return _read_alias.set(None)
+
+
+def reset(token):
+    _read_alias.reset(token)
+
+
+def read_alias():
+    return _read_alias.get()
+
+
+def pick_replica():
+    """A replica for one request, its reads all see the same snapshot"""
+    aliases = replicas()
+    return random.choice(aliases) if aliases else None
+
+
+class ReplicaRouter:
+    """
+    Catalog reads go to the replica picked for the current request, when
+      there is one (see ReplicaRoutingMiddleware); all writes, and reads
+      outside requests or pinned to the primary, go to 'default'
+    """
+    def db_for_read(self, model, **hints):
+        alias = read_alias()
+        if alias and model._meta.app_label in REPLICA_APPS:
+            return alias
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        aliases = {'default', *replicas()}
+        return obj1._state.db in aliases and obj2._state.db in aliases
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary, see the sync_replica command
+        return db == 'default'
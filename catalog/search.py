@@ -0,0 +1,159 @@
+import re
+from functools import reduce
+from operator import and_
+
+from django.db import connections, router, transaction
+from django.db.models import Q
+
+from .models import Book, Author, Genre
+
+
+SEARCH_TABLE = 'catalog_book_search'
+# bm25() column weights: title, summary, author, genres
+RANK_WEIGHTS = (10.0, 1.0, 5.0, 2.0)
+# Keep IN (...) lists well under SQLite's bound parameter limit
+ID_CHUNK_SIZE = 500
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _using():
+    """Database searched, a replica when the request reads from one"""
+    return Book.objects.all().db
+
+
+def _write_using():
+    """Database the index is written to, the books' own"""
+    return router.db_for_write(Book)
+
+
+def is_supported(using=None):
+    """The FTS5 index only exists on SQLite (see migration 0010)"""
+    return connections[using or _using()].vendor == 'sqlite'
+
+
+def _document_sql():
+    """SELECT producing one search document per book"""
+    book, author, genre = Book._meta, Author._meta, Genre._meta
+    through = Book.genre.through._meta
+
+    return (
+        f'SELECT b.{book.pk.column}, b.title, b.summary, '
+        f"COALESCE(a.first_name || ' ' || a.last_name, ''), "
+        f"COALESCE((SELECT GROUP_CONCAT(g.name, ' ') "
+        f'FROM {through.db_table} bg '
+        f'JOIN {genre.db_table} g ON g.{genre.pk.column} = bg.genre_id '
+        f'WHERE bg.book_id = b.{book.pk.column}), \'\') '
+        f'FROM {book.db_table} b '
+        f'LEFT JOIN {author.db_table} a '
+        f'ON a.{author.pk.column} = b.author_id'
+    )
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for i in range(0, len(ids), ID_CHUNK_SIZE):
+        yield ids[i:i + ID_CHUNK_SIZE]
+
+
+def remove_books(book_ids, using=None):
+    using = using or _write_using()
+    if not is_supported(using):
+        return
+
+    with connections[using].cursor() as cursor:
+        for chunk in _chunks(book_ids):
+            marks = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({marks})', chunk)
+
+
+def index_books(book_ids, using=None):
+    """(Re)build the search documents of the given books"""
+    using = using or _write_using()
+    if not is_supported(using):
+        return
+
+    book_ids = list(book_ids)
+
+    with transaction.atomic(using), connections[using].cursor() as cursor:
+        remove_books(book_ids, using)
+
+        for chunk in _chunks(book_ids):
+            marks = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE}'
+                f'(rowid, title, summary, author, genres) '
+                f'{_document_sql()} WHERE b.{Book._meta.pk.column} '
+                f'IN ({marks})', chunk)
+
+
+def rebuild_index(using=None):
+    """Drop every search document and rebuild them from the book table"""
+    using = using or _write_using()
+    if not is_supported(using):
+        return
+
+    with transaction.atomic(using), connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE}'
+            f'(rowid, title, summary, author, genres) {_document_sql()}')
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) "
+                       f"VALUES ('optimize')")
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+def _match_expression(tokens):
+    # Every token must match, the last characters typed may be a prefix
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _search_ids(tokens, limit, offset, using):
+    weights = ', '.join(str(w) for w in RANK_WEIGHTS)
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s '
+            f'ORDER BY bm25({SEARCH_TABLE}, {weights}) '
+            f'LIMIT %s OFFSET %s',
+            [_match_expression(tokens), limit, offset])
+
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fallback_queryset(tokens):
+    """Unranked table scan for backends without the FTS5 index"""
+    matches = [Q(title__icontains=t) | Q(summary__icontains=t)
+               | Q(author__first_name__icontains=t)
+               | Q(author__last_name__icontains=t)
+               | Q(genre__name__icontains=t)
+               for t in tokens]
+
+    return Book.objects.filter(reduce(and_, matches))\
+        .order_by('title', 'id')\
+        .distinct()
+
+
+def search_books(query, limit=20, offset=0):
+    """
+    Books matching every word of 'query' (as a prefix) in their title,
+      summary, author name or genres, best match first
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+
+    using = _using()
+    if not is_supported(using):
+        return list(_fallback_queryset(tokens)
+                    .select_related('author')[offset:offset + limit])
+
+    ids = _search_ids(tokens, limit, offset, using)
+    books = Book.objects.select_related('author').in_bulk(ids)
+
+    return [books[i] for i in ids if i in books]
@@ -0,0 +1,197 @@
+import datetime
+import random
+import uuid
+
+from dateutil.relativedelta import relativedelta
+from django.db import transaction
+from faker import Faker
+
+from .models import Author, Book, BookInstance, Genre, Language, \
+    BOOK_GENRES, LANGUAGES, name_key
+from . import search, stats, caching, prefix_index
+from .genre_names import join_names
+
+
+BULK_BATCH_SIZE = 2000
+# Synthetic ISBNs are numbered from this prefix
+ISBN_PREFIX = '979'
+
+
+def isbn13(number, prefix=ISBN_PREFIX):
+    """The ISBN-13 with the given serial number and its check digit"""
+    digits = f'{prefix}{number:0{12 - len(prefix)}d}'
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits))
+
+    return f'{digits}{-total % 10}'
+
+
+class BulkSeeder:
+    """
+    Seed large catalogs in seconds: objects are built unsaved from pools of
+      Faker values drawn once per seeder, then inserted with bulk_create in
+      dependency order (languages, genres, authors, books and their genre
+      rows, copies). Genres and languages are reused by name, authors from
+      the pool built by authors().
+
+    The copy counters and genre names of each book are filled in before it
+      is inserted and the search index updated per batch, as bulk_create
+      sends no signals.
+    """
+    POOL_SIZE = 1000
+
+    def __init__(self, seed=None, batch_size=BULK_BATCH_SIZE):
+        fake = Faker()
+        if seed is not None:
+            fake.seed_instance(seed)
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+
+        self.first_names = [fake.first_name() for _ in range(self.POOL_SIZE)]
+        self.last_names = [fake.last_name() for _ in range(self.POOL_SIZE)]
+        self.titles = [fake.text(max_nb_chars=20).rstrip('.')
+                       for _ in range(self.POOL_SIZE)]
+        self.summaries = [fake.paragraph(nb_sentences=5)
+                          for _ in range(self.POOL_SIZE)]
+        self.imprints = [fake.company() for _ in range(self.POOL_SIZE // 10)]
+
+        self._languages = None
+        self._genres = None
+        self._authors = []
+
+    def _pool(self, model, names):
+        existing = {obj.name: obj for obj in model.objects.filter(name__in=names)}
+        model.objects.bulk_create([model(name=name, name_key=name_key(name))
+                                   for name in names if name not in existing])
+
+        return list(model.objects.filter(name__in=names))
+
+    def languages(self):
+        if self._languages is None:
+            self._languages = self._pool(Language, LANGUAGES)
+        return self._languages
+
+    def genres(self):
+        if self._genres is None:
+            self._genres = self._pool(Genre, BOOK_GENRES)
+        return self._genres
+
+    def _date(self, start, end):
+        return start + datetime.timedelta(
+            days=self.rng.randint(0, (end - start).days))
+
+    def authors(self, count):
+        """Insert 'count' authors and add them to the pool books draw from"""
+        today = datetime.date.today()
+        created = []
+
+        for start in range(0, count, self.batch_size):
+            batch = []
+            for _ in range(min(self.batch_size, count - start)):
+                dob = self._date(datetime.date(1900, 1, 1),
+                                 today - relativedelta(years=18))
+                # Same rule as AuthorFactory.dod: alive if the date is ahead
+                dod = self._date(dob + relativedelta(years=13),
+                                 datetime.date(2040, 1, 1))
+                first_name = self.rng.choice(self.first_names)
+                last_name = self.rng.choice(self.last_names)
+                batch.append(Author(first_name=first_name, last_name=last_name,
+                                    name_key=name_key(last_name, first_name),
+                                    dob=dob,
+                                    dod=dod if dod < today else None))
+            created += Author.objects.bulk_create(batch)
+
+        self._authors += created
+
+        return created
+
+    def _next_isbn(self):
+        last = Book.objects.filter(isbn__startswith=ISBN_PREFIX)\
+            .order_by('-isbn').values_list('isbn', flat=True).first()
+
+        return int(last[len(ISBN_PREFIX):-1]) + 1 if last else 0
+
+    def _copies(self, book, count, borrowers):
+        today = datetime.date.today()
+        copies = []
+
+        for _ in range(count):
+            status = self.rng.choice(BookInstance.LOAN_STATUS)[0]
+            setattr(book, Book.COPY_COUNTERS[status],
+                    getattr(book, Book.COPY_COUNTERS[status]) + 1)
+            copies.append(BookInstance(
+                instance_id=uuid.UUID(int=self.rng.getrandbits(128), version=4),
+                book=book,
+                imprint=self.rng.choice(self.imprints),
+                due_back=self._date(today - relativedelta(years=1),
+                                    today + relativedelta(years=1)),
+                status=status,
+                borrower=self.rng.choice(borrowers)
+                if borrowers and status == 'o' else None,
+            ))
+
+        return copies
+
+    def books(self, count, copies=(1, 3), genres=(1, 3), borrowers=None):
+        """
+        Insert 'count' books, each with a number of copies and genres picked
+          from the given (min, max) ranges; copies on loan are lent to one of
+          'borrowers' if given. Returns the number of copies created.
+        """
+        if not self._authors:
+            self.authors(max(count // 10, 1))
+        languages, genre_pool = self.languages(), self.genres()
+        through = Book.genre.through
+        serial = self._next_isbn()
+        total = 0
+
+        for start in range(0, count, self.batch_size):
+            books, instances, genre_rows = [], [], []
+
+            for _ in range(min(self.batch_size, count - start)):
+                book = Book(title=self.rng.choice(self.titles),
+                            summary=self.rng.choice(self.summaries),
+                            isbn=isbn13(serial),
+                            author=self.rng.choice(self._authors),
+                            language=self.rng.choice(languages))
+                serial += 1
+                instances += self._copies(book, self.rng.randint(*copies),
+                                          borrowers)
+                genre_rows.append(self.rng.sample(
+                    genre_pool, min(self.rng.randint(*genres),
+                                    len(genre_pool))))
+                book.genre_names = join_names(g.name for g in genre_rows[-1])
+                books.append(book)
+
+            with transaction.atomic():
+                Book.objects.bulk_create(books)
+                if books[0].pk is None:
+                    # Backends not returning the ids from bulk_create
+                    ids = dict(Book.objects
+                               .filter(isbn__in=[b.isbn for b in books])
+                               .values_list('isbn', 'pk'))
+                    for book in books:
+                        book.pk = ids[book.isbn]
+
+                through.objects.bulk_create(
+                    [through(book_id=book.pk, genre_id=genre.pk)
+                     for book, book_genres in zip(books, genre_rows)
+                     for genre in book_genres])
+                for copy in instances:
+                    copy.book_id = copy.book.pk
+                BookInstance.objects.bulk_create(instances)
+
+                search.index_books([book.pk for book in books])
+
+            total += len(instances)
+
+        stats.invalidate_dashboard_stats()
+        caching.invalidate_catalog()
+        # Rebuilt on its next search, bulk inserts send no signals
+        prefix_index.index.clear()
+
+        return total
+
+
+def seed_catalog(books, seed=None, **kwargs):
+    """Seed 'books' books with the BulkSeeder, see BulkSeeder.books()"""
+    return BulkSeeder(seed).books(books, **kwargs)
@@ -0,0 +1,46 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.db import transaction
+from django.utils import timezone
+
+
+DEF_BATCH_SIZE = 1000
+
+
+def session_store():
+    return import_module(settings.SESSION_ENGINE).SessionStore
+
+
+def purge_expired(batch_size=DEF_BATCH_SIZE, pause=0):
+    """
+    Delete the expired sessions of the database backed engines (db,
+      cached_db) a batch at a time, each batch in its own short transaction
+      so requests writing sessions aren't locked out for the whole purge.
+      Other engines clear their own (the file engine one file at a time).
+      Returns the number of sessions deleted, None when the engine doesn't
+      tell.
+    """
+    store = session_store()
+    if not issubclass(store, DBStore):
+        store.clear_expired()
+        return None
+
+    sessions = store.get_model_class().objects
+    now = timezone.now()
+    deleted = 0
+
+    while True:
+        with transaction.atomic(using=sessions.db):
+            keys = list(sessions.filter(expire_date__lt=now)
+                        .values_list('session_key', flat=True)[:batch_size])
+            if keys:
+                deleted += sessions.filter(session_key__in=keys).delete()[0]
+
+        # A short batch was the last one
+        if len(keys) < batch_size:
+            return deleted
+        if pause:
+            time.sleep(pause)
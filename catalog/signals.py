@@ -0,0 +1,351 @@
+from django.contrib.auth.models import Group, Permission, User
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete, \
+    pre_delete, m2m_changed
+
+from .models import Book, Author, BookInstance, Genre, Language
+from . import stats, search, counters, caching, sqlite, genre_names, \
+    permissions, prefix_index
+
+
+DASHBOARD_MODELS = (Book, Author, BookInstance, Genre, Language)
+
+
+def invalidate_dashboard(sender, **kwargs):
+    """
+    Evict the dashboard snapshot right away and again once the transaction
+      commits, so a reader can't re-cache the pre-commit state in between
+    """
+    stats.invalidate_dashboard_stats()
+    transaction.on_commit(stats.invalidate_dashboard_stats)
+
+
+for model in DASHBOARD_MODELS:
+    post_save.connect(invalidate_dashboard, sender=model,
+                      dispatch_uid=f'dashboard_save_{model.__name__}')
+    post_delete.connect(invalidate_dashboard, sender=model,
+                        dispatch_uid=f'dashboard_delete_{model.__name__}')
+
+
+# Full-text search index, written in the same transaction as the change
+
+def index_book(sender, instance, raw=False, using=None, **kwargs):
+    if not raw:
+        search.index_books([instance.pk], using)
+
+
+def unindex_book(sender, instance, using=None, **kwargs):
+    search.remove_books([instance.pk], using)
+
+
+def _regenred_books(instance, action, reverse, pk_set, using=None):
+    """
+    Ids of the books whose genres an m2m_changed signal of Book.genre
+      reports changed, None before the change is done
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return None
+
+    if not reverse:
+        return None if action == 'pre_clear' else [instance.pk]
+    if action == 'pre_clear':
+        # The cleared books are unknown afterwards, remember them now
+        instance._related_book_ids = list(
+            instance.book_set.using(using).values_list('pk', flat=True))
+        return None
+    if action == 'post_clear':
+        return getattr(instance, '_related_book_ids', [])
+    return pk_set
+
+
+def index_book_genres(sender, instance, action, reverse, pk_set,
+                      using=None, **kwargs):
+    book_ids = _regenred_books(instance, action, reverse, pk_set, using)
+    if book_ids is not None:
+        search.index_books(book_ids, using)
+
+
+def index_related_books(sender, instance, raw=False, using=None, **kwargs):
+    """Author names and genre names are part of their books' documents"""
+    if not raw:
+        search.index_books(instance.book_set.using(using)
+                           .values_list('pk', flat=True), using)
+
+
+def collect_related_books(sender, instance, using=None, **kwargs):
+    # The relations are gone by post_delete, remember the affected books
+    instance._related_book_ids = list(
+        instance.book_set.using(using).values_list('pk', flat=True))
+
+
+def reindex_related_books(sender, instance, using=None, **kwargs):
+    search.index_books(getattr(instance, '_related_book_ids', []), using)
+
+
+post_save.connect(index_book, sender=Book, dispatch_uid='search_book_save')
+post_delete.connect(unindex_book, sender=Book,
+                    dispatch_uid='search_book_delete')
+m2m_changed.connect(index_book_genres, sender=Book.genre.through,
+                    dispatch_uid='search_book_genres')
+
+for model in (Author, Genre):
+    post_save.connect(index_related_books, sender=model,
+                      dispatch_uid=f'search_save_{model.__name__}')
+    pre_delete.connect(collect_related_books, sender=model,
+                       dispatch_uid=f'search_pre_delete_{model.__name__}')
+    post_delete.connect(reindex_related_books, sender=model,
+                        dispatch_uid=f'search_delete_{model.__name__}')
+
+
+# Denormalized genre names on Book
+
+def book_genre_names(sender, instance, action, reverse, pk_set, using=None,
+                     **kwargs):
+    book_ids = _regenred_books(instance, action, reverse, pk_set, using)
+    if book_ids is None:
+        return
+
+    if reverse:
+        genre_names.refresh(book_ids)
+    else:
+        # Keep the instance in step, a later save() writes the column back
+        genre_names.refresh_book(instance)
+
+
+def rename_genre(sender, instance, raw=False, created=False, **kwargs):
+    if not raw and not created:
+        genre_names.refresh(instance.book_set.values_list('pk', flat=True))
+
+
+def drop_genre(sender, instance, **kwargs):
+    # Collected before the delete by collect_related_books
+    genre_names.refresh(getattr(instance, '_related_book_ids', []))
+
+
+m2m_changed.connect(book_genre_names, sender=Book.genre.through,
+                    dispatch_uid='genre_names_book_genres')
+post_save.connect(rename_genre, sender=Genre,
+                  dispatch_uid='genre_names_genre_save')
+post_delete.connect(drop_genre, sender=Genre,
+                    dispatch_uid='genre_names_genre_delete')
+
+
+# Per-status copy counters on Book
+
+def count_copy(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        counters.copy_saved(instance, created)
+
+
+def uncount_copy(sender, instance, **kwargs):
+    counters.copy_deleted(instance)
+
+
+post_save.connect(count_copy, sender=BookInstance,
+                  dispatch_uid='counters_copy_save')
+post_delete.connect(uncount_copy, sender=BookInstance,
+                    dispatch_uid='counters_copy_delete')
+
+
+# Version stamps of the cached pages and fragments (catalog.caching)
+
+def _bump(*scopes):
+    # Like the dashboard, once now and once the change is visible to readers
+    caching.bump(*scopes)
+    transaction.on_commit(lambda: caching.bump(*scopes))
+
+
+def _author_scopes(author_id):
+    if author_id is None:
+        return []
+    return [f'author:{author_id}', f'author-books:{author_id}']
+
+
+def book_changed(sender, instance, **kwargs):
+    scopes = ['books', f'book:{instance.pk}']
+    for author_id in {instance.author_id,
+                      getattr(instance, '_loaded_author_id', None)}:
+        scopes += _author_scopes(author_id)
+    _bump(*scopes)
+    instance._loaded_author_id = instance.author_id
+
+
+def book_genres_changed(sender, instance, action, reverse, **kwargs):
+    if action.startswith('post_'):
+        # Books show their genres under the 'genres' stamp
+        _bump('genres' if reverse else f'book:{instance.pk}')
+
+
+def author_changed(sender, instance, **kwargs):
+    """Books show their author's name, in the list and on their page"""
+    book_ids = getattr(instance, '_related_book_ids', None)
+    if book_ids is None:
+        book_ids = instance.book_set.values_list('pk', flat=True)
+
+    _bump('authors', 'books', *_author_scopes(instance.pk),
+          *(f'book:{pk}' for pk in book_ids))
+
+
+def name_changed(sender, instance, **kwargs):
+    _bump('genres' if sender is Genre else 'languages')
+
+
+def copy_pre_save(sender, instance, **kwargs):
+    # The copy counters' receiver overwrites _counted after the save
+    counted = getattr(instance, '_counted', None)
+    instance._cached_book_id = counted[0] if counted else None
+
+
+def copy_changed(sender, instance, **kwargs):
+    scopes = ['books']
+    for book_id in {instance.book_id,
+                    getattr(instance, '_cached_book_id', None)}:
+        if book_id is not None:
+            scopes += [f'book:{book_id}', f'copies:{book_id}']
+    _bump(*scopes)
+
+
+post_save.connect(book_changed, sender=Book, dispatch_uid='cache_book_save')
+post_delete.connect(book_changed, sender=Book,
+                    dispatch_uid='cache_book_delete')
+m2m_changed.connect(book_genres_changed, sender=Book.genre.through,
+                    dispatch_uid='cache_book_genres')
+post_save.connect(author_changed, sender=Author,
+                  dispatch_uid='cache_author_save')
+post_delete.connect(author_changed, sender=Author,
+                    dispatch_uid='cache_author_delete')
+pre_save.connect(copy_pre_save, sender=BookInstance,
+                 dispatch_uid='cache_copy_pre_save')
+post_save.connect(copy_changed, sender=BookInstance,
+                  dispatch_uid='cache_copy_save')
+post_delete.connect(copy_changed, sender=BookInstance,
+                    dispatch_uid='cache_copy_delete')
+
+for model in (Genre, Language):
+    post_save.connect(name_changed, sender=model,
+                      dispatch_uid=f'cache_save_{model.__name__}')
+    post_delete.connect(name_changed, sender=model,
+                        dispatch_uid=f'cache_delete_{model.__name__}')
+
+
+# In-process autocomplete index (catalog.prefix_index), changed once the
+#   transaction commits so a rolled back change never shows
+
+def prefix_index_book_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        pk, title = instance.pk, instance.title
+        transaction.on_commit(lambda: prefix_index.index.update(
+            prefix_index.BOOK, pk, title, prefix_index.book_keys(title)))
+
+
+def prefix_index_author_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        pk, label = instance.pk, str(instance)
+        keys = prefix_index.author_keys(instance.first_name,
+                                        instance.last_name)
+        transaction.on_commit(lambda: prefix_index.index.update(
+            prefix_index.AUTHOR, pk, label, keys))
+
+
+def prefix_index_deleted(sender, instance, **kwargs):
+    kind = prefix_index.BOOK if sender is Book else prefix_index.AUTHOR
+    pk = instance.pk
+    transaction.on_commit(lambda: prefix_index.index.remove(kind, pk))
+
+
+post_save.connect(prefix_index_book_saved, sender=Book,
+                  dispatch_uid='prefix_index_book_save')
+post_save.connect(prefix_index_author_saved, sender=Author,
+                  dispatch_uid='prefix_index_author_save')
+for model in (Book, Author):
+    post_delete.connect(prefix_index_deleted, sender=model,
+                        dispatch_uid=f'prefix_index_delete_{model.__name__}')
+
+
+# Cached permissions of users (catalog.permissions)
+
+def _retire(invalidate, *ids):
+    invalidate(*ids)
+    transaction.on_commit(lambda: invalidate(*ids))
+
+
+def user_changed(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Logging in only stamps last_login
+    if not raw and set(update_fields or ()) != {'last_login'}:
+        _retire(permissions.invalidate_users, instance.pk)
+
+
+def user_groups_changed(sender, instance, action, reverse, pk_set,
+                        **kwargs):
+    if not action.startswith('post_'):
+        return
+
+    if not reverse:
+        _retire(permissions.invalidate_users, instance.pk)
+        return
+
+    # Members removed from the group had its stamp in their entries
+    _retire(permissions.invalidate_groups, instance.pk)
+    if pk_set:
+        _retire(permissions.invalidate_users, *pk_set)
+
+
+def user_permissions_changed(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    if not action.startswith('post_'):
+        return
+
+    if not reverse:
+        _retire(permissions.invalidate_users, instance.pk)
+    elif pk_set:
+        _retire(permissions.invalidate_users, *pk_set)
+    else:
+        # Cleared from every user, who are unknown by now
+        _retire(permissions.invalidate_all)
+
+
+def group_permissions_changed(sender, instance, action, reverse, pk_set,
+                              **kwargs):
+    if not action.startswith('post_'):
+        return
+
+    if not reverse:
+        _retire(permissions.invalidate_groups, instance.pk)
+    elif pk_set:
+        _retire(permissions.invalidate_groups, *pk_set)
+    else:
+        _retire(permissions.invalidate_all)
+
+
+def group_deleted(sender, instance, **kwargs):
+    _retire(permissions.invalidate_groups, instance.pk)
+
+
+def permission_changed(sender, instance, raw=False, created=False, **kwargs):
+    # A new permission isn't granted to anyone yet
+    if not raw and not created:
+        _retire(permissions.invalidate_all)
+
+
+post_save.connect(user_changed, sender=User, dispatch_uid='perms_user_save')
+m2m_changed.connect(user_groups_changed, sender=User.groups.through,
+                    dispatch_uid='perms_user_groups')
+m2m_changed.connect(user_permissions_changed,
+                    sender=User.user_permissions.through,
+                    dispatch_uid='perms_user_permissions')
+m2m_changed.connect(group_permissions_changed,
+                    sender=Group.permissions.through,
+                    dispatch_uid='perms_group_permissions')
+post_delete.connect(group_deleted, sender=Group,
+                    dispatch_uid='perms_group_delete')
+post_save.connect(permission_changed, sender=Permission,
+                  dispatch_uid='perms_permission_save')
+post_delete.connect(permission_changed, sender=Permission,
+                    dispatch_uid='perms_permission_delete')
+
+
+# SQLite pragma profile, on every new connection
+
+connection_created.connect(sqlite.configure_connection,
+                           dispatch_uid='sqlite_pragmas')
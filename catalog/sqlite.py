@@ -0,0 +1,90 @@
+import re
+
+from django.conf import settings
+
+
+# Applied to every new SQLite connection. WAL lets readers carry on while a
+#   renewal writes, and synchronous=NORMAL is durable enough under WAL (a
+#   power loss can only drop the last commits, never corrupt the file)
+DEF_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # Negative: in KiB, so 64MiB per connection
+    'temp_store': 'memory',
+    'busy_timeout': 5000,
+}
+
+# SQLite's own defaults (busy_timeout as Python's sqlite3 sets it), what the
+#   concurrency benchmark compares the profile with
+SQLITE_DEFAULTS = {
+    'journal_mode': 'delete',
+    'synchronous': 'full',
+    'mmap_size': 0,
+    'cache_size': -2000,
+    'temp_store': 'default',
+    'busy_timeout': 5000,
+}
+
+# Rows PRAGMA optimize samples per index, bounds how long maintain() takes
+DEF_ANALYSIS_LIMIT = 400
+
+_NAME = re.compile(r'^[a-z_]+$')
+_VALUE = re.compile(r'^-?\w+$')
+
+
+def pragma_profile():
+    """
+    DEF_PRAGMAS updated with CATALOG_SQLITE_PRAGMAS, where None drops a
+      pragma (leaving SQLite's default)
+    """
+    pragmas = {**DEF_PRAGMAS,
+               **getattr(settings, 'CATALOG_SQLITE_PRAGMAS', {})}
+    return {name: value for name, value in pragmas.items()
+            if value is not None}
+
+
+def apply_pragmas(cursor, pragmas):
+    """Set the pragmas on a DB-API cursor's connection, returns their values"""
+    applied = {}
+
+    for name, value in pragmas.items():
+        # Pragmas take no parameters, so only plain names and values go in
+        if not _NAME.match(name) or not _VALUE.match(str(value)):
+            raise ValueError(f'Invalid SQLite pragma: {name}={value!r}')
+
+        cursor.execute(f'PRAGMA {name} = {value}')
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute(f'PRAGMA {name}')
+            row = cursor.fetchone()
+        applied[name] = row[0] if row else None
+
+    return applied
+
+
+def configure_connection(sender, connection, **kwargs):
+    """connection_created receiver applying pragma_profile() to SQLite"""
+    if connection.vendor != 'sqlite':
+        return
+
+    # The raw cursor skips the execute wrappers and the debug query log
+    cursor = connection.connection.cursor()
+    try:
+        apply_pragmas(cursor, pragma_profile())
+    finally:
+        cursor.close()
+
+
+def maintain(connection, analysis_limit=DEF_ANALYSIS_LIMIT):
+    """
+    Refresh the query planner's statistics where they have drifted (PRAGMA
+      optimize) and fold the write-ahead log back into the database,
+      truncating it. Returns the checkpoint's (busy, log pages, checkpointed
+      pages), busy being 1 when readers kept it from completing.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA analysis_limit = {int(analysis_limit)}')
+        cursor.execute('PRAGMA optimize')
+        cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return tuple(cursor.fetchone())
@@ -0,0 +1,72 @@
+// Autocomplete for the selects rendered by catalog.widgets: they only hold
+//   the selected options, a search box above each one fetches the matching
+//   ones page by page from the lookup endpoint (catalog.lookups)
+(function () {
+    'use strict';
+
+    const DELAY_MS = 250;
+
+    function attach(select) {
+        const search = document.createElement('input');
+        search.type = 'search';
+        search.placeholder = 'Type to search...';
+        search.autocomplete = 'off';
+        select.parentNode.insertBefore(search, select);
+
+        const more = document.createElement('button');
+        more.type = 'button';
+        more.textContent = 'More';
+        more.hidden = true;
+        select.parentNode.insertBefore(more, select.nextSibling);
+
+        let timer = null;
+        let next = null;
+        let request = 0;
+
+        function load(cursor) {
+            const url = new URL(select.dataset.lookupUrl,
+                                window.location.href);
+            url.searchParams.set('q', search.value);
+            if (cursor) {
+                url.searchParams.set('cursor', cursor);
+            }
+
+            // Only the answer to the latest search is shown
+            const current = ++request;
+            fetch(url, {headers: {'Accept': 'application/json'}})
+                .then((response) => response.json())
+                .then((data) => {
+                    if (current !== request) {
+                        return;
+                    }
+                    if (!cursor) {
+                        // Keep the selected options (and the empty one)
+                        Array.from(select.options)
+                            .filter((option) => option.value
+                                    && !option.selected)
+                            .forEach((option) => option.remove());
+                    }
+
+                    const shown = new Set(Array.from(select.options,
+                                                     (o) => o.value));
+                    data.results
+                        .filter((result) => !shown.has(String(result.id)))
+                        .forEach((result) => select.add(
+                            new Option(result.text, result.id)));
+
+                    next = data.next;
+                    more.hidden = !next;
+                });
+        }
+
+        search.addEventListener('input', () => {
+            clearTimeout(timer);
+            timer = setTimeout(() => load(null), DELAY_MS);
+        });
+        more.addEventListener('click', () => load(next));
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('select[data-lookup-url]').forEach(attach);
+    });
+})();
@@ -0,0 +1,120 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from .models import Book, Author, BookInstance, Genre, Language
+from . import caching
+
+
+DASHBOARD_CACHE_KEY = 'catalog:dashboard'
+# Signals evict the snapshot on every change, the timeout only bounds how
+#   stale it can get after writes that bypass signals (eg. queryset.update())
+#   and, with a process-local cache, in the processes not making the change
+#   (capped to CATALOG_LOCAL_CACHE_TIMEOUT then, see catalog.caching)
+DASHBOARD_CACHE_TIMEOUT = getattr(settings, 'CATALOG_DASHBOARD_TIMEOUT', 600)
+# ASCII unit separator, will not show up in genre or language names
+NAME_SEPARATOR = '\x1f'
+
+NAME_AGGREGATES = {
+    'postgresql': 'STRING_AGG(%s, %%s)',
+}
+DEF_NAME_AGGREGATE = 'GROUP_CONCAT(%s, %%s)'
+
+
+def _dashboard_queries():
+    """
+    Querysets making up the dashboard, kept as querysets so the lookups
+      (eg. iexact) are compiled by the ORM the same way as anywhere else
+    """
+    counts = {
+        'num_books': Book.objects.all(),
+        'num_authors': Author.objects.all(),
+        'num_author_rinat': Author.objects.filter(
+            first_name__iexact='rinat',
+            last_name__iexact='ibragimov'),
+        'num_instances': BookInstance.objects.all(),
+        'num_instances_available': BookInstance.objects.filter(
+            status__exact='a'),
+    }
+    names = {
+        'num_languages': Language.objects.all(),
+        'num_genres': Genre.objects.all(),
+    }
+
+    return counts, names
+
+
+def _compile(queryset, using):
+    return queryset.query.get_compiler(using=using).as_sql()
+
+
+def _dashboard_sql(using):
+    """
+    Build a single SELECT where every statistic is a scalar subquery, so the
+      whole dashboard is one round trip to the database
+    """
+    counts, names = _dashboard_queries()
+    aggregate = NAME_AGGREGATES.get(connections[using].vendor,
+                                    DEF_NAME_AGGREGATE)
+    columns, params = [], []
+
+    for key, qs in counts.items():
+        sql, p = _compile(qs.order_by().values('pk'), using)
+        columns.append((key, f'(SELECT COUNT(*) FROM ({sql}) _{key})'))
+        params.extend(p)
+
+    for key, qs in names.items():
+        sql, p = _compile(qs.order_by().values('name'), using)
+        agg = aggregate % 'name'
+        columns.append((key, f'(SELECT {agg} FROM ({sql}) _{key})'))
+        params.extend(p)
+        params.append(NAME_SEPARATOR)
+
+    sql = 'SELECT ' + ', '.join(col for _, col in columns)
+
+    return [key for key, _ in columns], sql, params
+
+
+def compute_dashboard_stats(using=None):
+    """Compute the homepage statistics in one query"""
+    using = using or Book.objects.all().db
+    keys, sql, params = _dashboard_sql(using)
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+
+    stats = dict(zip(keys, row))
+    for key in ('num_languages', 'num_genres'):
+        stats[key] = stats[key].split(NAME_SEPARATOR) if stats[key] else []
+
+    return stats
+
+
+def get_dashboard_stats():
+    """Return the cached dashboard snapshot, computing it on a miss"""
+    stats = cache.get(DASHBOARD_CACHE_KEY)
+
+    if stats is None:
+        stats = compute_dashboard_stats()
+        cache.set(DASHBOARD_CACHE_KEY, stats,
+                  caching.bounded_timeout(DASHBOARD_CACHE_TIMEOUT))
+
+    return stats
+
+
+async def aget_dashboard_stats():
+    """get_dashboard_stats() for async views"""
+    stats = await cache.aget(DASHBOARD_CACHE_KEY)
+
+    if stats is None:
+        stats = await sync_to_async(compute_dashboard_stats)()
+        await cache.aset(DASHBOARD_CACHE_KEY, stats,
+                         caching.bounded_timeout(DASHBOARD_CACHE_TIMEOUT))
+
+    return stats
+
+
+def invalidate_dashboard_stats():
+    cache.delete(DASHBOARD_CACHE_KEY)
@@ -66,7 +66,7 @@ class BookFactory(f.DjangoModelFactory):
     title = lazy_attribute(lambda x: fake.text(max_nb_chars=20))
     author = SubFactory(AuthorFactory)
     summary = lazy_attribute(lambda x: fake.paragraph(nb_sentences=5))
-    isbn = lazy_attribute(lambda x: fake.isbn13)
+    isbn = lazy_attribute(lambda x: fake.isbn13(separator=''))
     language = SubFactory(LanguageFactory)
 
     @post_generation
@@ -130,12 +130,13 @@ class BookInstanceFactory(f.DjangoModelFactory):
         lambda x: fake.date_between(end_date=datetime.date.today() + relativedelta(years=1))
     )
     status = lazy_attribute(
-        lambda x: fake.random_element(elements=BookInstance.LOAN_STATUS)
+        lambda x: fake.random_element(elements=BookInstance.LOAN_STATUS)[0]
     )
 
     @post_generation
     def borrower(self, create, extracted, **kwargs):
-        if not create or extracted:
+        if not create or not extracted:
             return
 
-        self.borrower.add(extracted)
\ No newline at end of file
+        self.borrower = extracted
+        self.save()
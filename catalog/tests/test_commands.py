@@ -0,0 +1,402 @@
+import datetime
+import gzip
+import io
+import json
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import Permission, User
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import connection, OperationalError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, \
+    override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+import catalog.models as models
+import catalog.search as search
+import catalog.prefix_index as prefix_index
+import catalog.sqlite as sqlite
+from catalog.export import export_catalog, iter_catalog
+from catalog.importer import import_catalog
+from catalog.management.periodic import PeriodicCommand
+from catalog.overdue import sweep
+from catalog.sessions import purge_expired
+from catalog import benchmark
+
+
+CSV_INPUT = '''isbn,title,summary,author_first_name,author_last_name,language,genres,copies,imprint
+9780000000001,Dune,Spice,Frank,Herbert,English,science fiction|drama,3,Ace
+9780000000002,Children of Dune,More spice,Frank,Herbert,English,science fiction,1,
+9780000000003,Untitled,,,,,,0,
+,Missing ISBN,,,,,,,
+'''
+
+
+class ImportCatalogTest(TestCase):
+    def _import(self, text, fmt='csv', **kwargs):
+        return import_catalog(io.StringIO(text), fmt, **kwargs)
+
+    def test_csv_import(self):
+        stats = self._import(CSV_INPUT, chunk_size=2)
+
+        self.assertEqual(stats.rows, 4)
+        self.assertEqual(stats.created, 3)
+        self.assertEqual(stats.copies, 4)
+        self.assertEqual(len(stats.errors), 1)
+
+        dune = models.Book.objects.get(isbn='9780000000001')
+        self.assertEqual(str(dune.author), 'Herbert, Frank')
+        self.assertEqual(dune.language.name, 'English')
+        self.assertCountEqual([g.name for g in dune.genre.all()],
+                              ['science fiction', 'drama'])
+        self.assertEqual(dune.genre_names, 'drama, science fiction')
+        self.assertEqual(dune.bookinstance_set.filter(status='a').count(), 3)
+
+        # Lookups were shared, not duplicated
+        self.assertEqual(models.Author.objects.count(), 1)
+        self.assertEqual(models.Genre.objects.count(), 2)
+        self.assertEqual(models.Language.objects.count(), 1)
+
+        self.assertEqual([b.title for b in search.search_books('spice')],
+                         ['Dune', 'Children of Dune'])
+
+    def test_prefix_index_cleared(self):
+        prefix_index.index.search('x')
+        self._import(CSV_INPUT)
+
+        self.assertEqual([title for _, title in
+                          prefix_index.index.search('dune')['book']],
+                         ['Dune'])
+        self.assertEqual([name for _, name in
+                          prefix_index.index.search('herb')['author']],
+                         ['Herbert, Frank'])
+
+    def test_upsert_on_isbn(self):
+        self._import(CSV_INPUT)
+        stats = self._import(json.dumps({
+            'isbn': '9780000000001', 'title': 'Dune (2nd ed.)',
+            'author_first_name': 'Frank', 'author_last_name': 'Herbert',
+            'genres': ['horror'], 'copies': 5}) + '\n', fmt='jsonl')
+
+        self.assertEqual((stats.created, stats.updated), (0, 1))
+        dune = models.Book.objects.get(isbn='9780000000001')
+        self.assertEqual(dune.title, 'Dune (2nd ed.)')
+        self.assertEqual([g.name for g in dune.genre.all()], ['horror'])
+        # Existing books don't get more copies
+        self.assertEqual(dune.bookinstance_set.count(), 3)
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            f.write(CSV_INPUT)
+            f.flush()
+
+            out = io.StringIO()
+            call_command('import_catalog', f.name, stdout=out,
+                         stderr=io.StringIO())
+
+        self.assertIn('3 books created', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+
+
+class ExportCatalogTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        import_catalog(io.StringIO(CSV_INPUT), 'csv')
+
+        dune = models.Book.objects.get(isbn='9780000000001')
+        for copy in dune.bookinstance_set.all():
+            copy.status = 'o'
+            copy.save()
+
+        cls.librarian = User.objects.create_user('librarian')
+        cls.librarian.user_permissions.add(
+            Permission.objects.get(codename='can_view_all_books'))
+
+    def test_rows(self):
+        rows = [row for chunk in iter_catalog(chunk_size=2) for row in chunk]
+
+        self.assertEqual([row['isbn'] for row in rows],
+                         ['9780000000001', '9780000000002', '9780000000003'])
+        self.assertEqual(rows[0]['on_loan'], 3)
+        self.assertEqual(rows[1]['available'], 1)
+        self.assertCountEqual(rows[0]['genres'], ['science fiction', 'drama'])
+        self.assertEqual(rows[2]['author_last_name'], '')
+
+    def test_csv_round_trips_through_import(self):
+        text = ''.join(export_catalog('csv', chunk_size=2))
+        stats = import_catalog(io.StringIO(text), 'csv')
+
+        self.assertEqual((stats.created, stats.updated, len(stats.errors)),
+                         (0, 3, 0))
+
+    def test_ndjson_gzip(self):
+        data = b''.join(export_catalog('ndjson-gzip', chunk_size=2))
+        lines = gzip.decompress(data).decode('utf-8').splitlines()
+
+        self.assertEqual([json.loads(line)['title'] for line in lines],
+                         ['Dune', 'Children of Dune', 'Untitled'])
+
+    def test_view_streams(self):
+        self.client.force_login(self.librarian)
+
+        response = self.client.get(reverse('catalog-export'),
+                                   {'format': 'jsonl'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 3)
+
+    def test_view_permission_required(self):
+        self.client.force_login(User.objects.create_user('patron'))
+
+        response = self.client.get(reverse('catalog-export'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('export_catalog', format='jsonl', stdout=out,
+                     stderr=io.StringIO())
+
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+
+
+class SweepOverdueTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = datetime.date.today()
+        cls.borrower = User.objects.create_user('patron')
+        book = models.Book.objects.create(title='Dune', isbn='9780000000001')
+
+        def copy(status, days):
+            return models.BookInstance.objects.create(
+                book=book, borrower=cls.borrower, status=status,
+                due_back=cls.today + datetime.timedelta(days=days))
+
+        cls.late = [copy('o', -d) for d in range(1, 6)]
+        cls.on_time = copy('o', 3)
+        cls.returned = copy('a', -10)
+
+    def test_sweep_records_overdue(self):
+        result = sweep(batch_size=2)
+
+        self.assertEqual(result.overdue, 5)
+        self.assertCountEqual(
+            models.OverdueLoan.objects.values_list('instance_id', flat=True),
+            [c.instance_id for c in self.late])
+
+        loan = models.OverdueLoan.objects.get(instance=self.late[-1])
+        self.assertEqual(loan.borrower, self.borrower)
+        self.assertEqual(loan.days_overdue, 5)
+        self.assertIsNone(loan.resolved)
+
+    def test_sweep_resolves_returned(self):
+        sweep(today=self.today - datetime.timedelta(days=1))
+
+        self.late[-1].status = 'a'
+        self.late[-1].save()
+        result = sweep()
+
+        self.assertEqual((result.overdue, result.resolved), (4, 1))
+        self.assertEqual(models.OverdueLoan.objects
+                         .filter(resolved__isnull=True).count(), 4)
+
+    def test_sweep_resolves_same_day(self):
+        sweep()
+        self.late[0].due_back = self.today + datetime.timedelta(days=7)
+        self.late[0].save()
+
+        self.assertEqual(sweep().resolved, 1)
+
+    def test_sweep_first_seen(self):
+        yesterday = self.today - datetime.timedelta(days=1)
+        sweep(today=yesterday)
+        sweep()
+
+        loan = models.OverdueLoan.objects.get(instance=self.late[-1])
+        self.assertEqual((loan.first_seen, loan.last_seen),
+                         (yesterday, self.today))
+
+        # Returned and lent again, overdue anew
+        self.late[-1].due_back = yesterday
+        self.late[-1].save()
+        sweep()
+
+        loan.refresh_from_db()
+        self.assertEqual(loan.first_seen, self.today)
+
+    def test_sweep_is_idempotent(self):
+        sweep()
+        sweep()
+
+        self.assertEqual(models.OverdueLoan.objects.count(), 5)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('sweep_overdue', stdout=out)
+
+        self.assertIn('5 overdue', out.getvalue())
+
+
+class PeriodicCommandTest(SimpleTestCase):
+    def test_repeats_until_stopped(self):
+        clock, runs = [0.0], []
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        class Command(PeriodicCommand):
+            def run_once(self):
+                runs.append(clock[0])
+                if len(runs) == 3:
+                    raise KeyboardInterrupt
+
+        out = io.StringIO()
+        with mock.patch('time.monotonic', lambda: clock[0]), \
+                mock.patch('time.sleep', sleep):
+            Command(stdout=out).schedule(every=60)
+
+        self.assertEqual(runs, [0, 60, 120])
+        self.assertIn('Stopped', out.getvalue())
+
+    def test_keeps_running_after_a_failure(self):
+        clock, runs = [0.0], []
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        class Command(PeriodicCommand):
+            def run_once(self):
+                runs.append(clock[0])
+                if len(runs) == 1:
+                    raise OperationalError('database is locked')
+                raise KeyboardInterrupt
+
+        err = io.StringIO()
+        with mock.patch('time.monotonic', lambda: clock[0]), \
+                mock.patch('time.sleep', sleep):
+            Command(stdout=io.StringIO(), stderr=err).schedule(every=60)
+
+        self.assertEqual(runs, [0, 60])
+        self.assertIn('database is locked', err.getvalue())
+
+    def test_single_run_failure_raised(self):
+        class Command(PeriodicCommand):
+            def run_once(self):
+                raise OperationalError('database is locked')
+
+        with self.assertRaises(OperationalError):
+            Command(stdout=io.StringIO()).schedule(every=None)
+
+
+@override_settings(
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+class PurgeSessionsTest(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        for number in range(5):
+            Session.objects.create(session_key=f'expired{number}',
+                                   session_data='',
+                                   expire_date=now - datetime.timedelta(1))
+        Session.objects.create(session_key='current', session_data='',
+                               expire_date=now + datetime.timedelta(1))
+
+    def test_purge_in_batches(self):
+        with self.assertNumQueries(3 * 4):
+            self.assertEqual(purge_expired(batch_size=2), 5)
+
+        self.assertEqual(list(Session.objects.values_list('session_key',
+                                                          flat=True)),
+                         ['current'])
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_engine_without_database(self):
+        self.assertIsNone(purge_expired())
+        self.assertEqual(Session.objects.count(), 6)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('purge_sessions', stdout=out)
+
+        self.assertIn('purged 5 expired sessions', out.getvalue())
+
+
+class BenchmarkTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        benchmark.seed_catalog(30)
+        benchmark.seed_users()
+
+    def test_seed(self):
+        self.assertEqual(models.Book.objects.count(), 30)
+        self.assertEqual(models.BookInstance.objects.count(),
+                         30 * benchmark.COPIES_PER_BOOK)
+        self.assertEqual(models.BookInstance.objects
+                         .filter(borrower__username='patron').count(),
+                         benchmark.LOANS)
+
+    def test_run(self):
+        results = benchmark.run_benchmark(benchmark.login_clients(),
+                                          iterations=3)
+
+        self.assertEqual(results['meta']['books'], 30)
+        for name in ('index', 'books-all', 'book-detail', 'authors-detail',
+                     'books-all-copies', 'my-books', 'books-renew-librarian'):
+            self.assertIn(name, results['routes'])
+            self.assertGreater(results['routes'][name]['p99_ms'], 0)
+        # Cold requests read what the cached ones find in the page cache
+        self.assertGreater(results['routes']['index']['queries'],
+                           results['routes']['index (cached)']['queries'])
+
+    def test_compare(self):
+        baseline = {'routes': {'index': {'p50_ms': 10.0, 'p95_ms': 10.0,
+                                         'p99_ms': 10.0, 'queries': 2}}}
+        same = {'routes': {'index': {'p50_ms': 11.0, 'p95_ms': 10.0,
+                                     'p99_ms': 10.5, 'queries': 2}}}
+        slower = {'routes': {'index': {'p50_ms': 10.0, 'p95_ms': 15.0,
+                                       'p99_ms': 10.0, 'queries': 3}}}
+
+        self.assertEqual(benchmark.compare(baseline, same), [])
+        self.assertEqual(len(benchmark.compare(baseline, slower)), 2)
+        self.assertEqual(len(benchmark.compare(baseline, {'routes': {}})), 1)
+
+
+class SqlitePragmaTest(TestCase):
+    def _pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_profile_applied_on_connect(self):
+        self.assertEqual(self._pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self._pragma('temp_store'), 2)  # MEMORY
+        self.assertEqual(self._pragma('cache_size'),
+                         sqlite.DEF_PRAGMAS['cache_size'])
+        self.assertEqual(self._pragma('busy_timeout'),
+                         sqlite.DEF_PRAGMAS['busy_timeout'])
+
+    @override_settings(CATALOG_SQLITE_PRAGMAS={'mmap_size': None,
+                                               'cache_size': -1024})
+    def test_profile_overrides(self):
+        profile = sqlite.pragma_profile()
+
+        self.assertNotIn('mmap_size', profile)
+        self.assertEqual(profile['cache_size'], -1024)
+        self.assertEqual(profile['journal_mode'], 'wal')
+
+    def test_rejects_injection(self):
+        with connection.cursor() as cursor:
+            with self.assertRaises(ValueError):
+                sqlite.apply_pragmas(cursor, {'cache_size': '1; DROP TABLE x'})
+
+
+class MaintainSqliteTest(TransactionTestCase):
+    # ANALYZE can't run inside TestCase's transaction
+    def test_command(self):
+        out = io.StringIO()
+        call_command('maintain_sqlite', stdout=out)
+
+        self.assertIn('optimized', out.getvalue())
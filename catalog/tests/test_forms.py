@@ -1,8 +1,9 @@
 import datetime
 
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
 
-from catalog.forms import RenewBookForm
+from catalog.forms import RenewBookForm, BookForm
+from catalog.models import Author, Book, Genre, Language
 
 
 class RenewBookFormTest(SimpleTestCase):
@@ -50,4 +51,41 @@ class RenewBookFormTest(SimpleTestCase):
         date = datetime.date.today() + datetime.timedelta(weeks=4)
         self.form = RenewBookForm(data={'due_back': date})
 
-        self.assertTrue(self.form.is_valid())
\ No newline at end of file
+        self.assertTrue(self.form.is_valid())
+
+
+class BookFormTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [Author.objects.create(first_name='J', last_name=f'A{n}')
+                       for n in range(30)]
+        cls.genres = [Genre.objects.create(name=f'G{n}') for n in range(30)]
+        cls.language = Language.objects.create(name='English')
+        cls.book = Book.objects.create(title='Dune', isbn='9780000000001',
+                                       author=cls.authors[5],
+                                       language=cls.language)
+        cls.book.genre.add(cls.genres[3])
+
+    def test_renders_selected_only(self):
+        form = BookForm(instance=self.book)
+
+        with self.assertNumQueries(3):
+            html = form.as_table()
+
+        self.assertIn(str(self.authors[5]), html)
+        self.assertNotIn(str(self.authors[6]), html)
+        self.assertIn('>G3<', html)
+        self.assertNotIn('>G4<', html)
+        self.assertIn('data-lookup-url="/catalog/lookup/author/"', html)
+
+    def test_validates_submitted_keys(self):
+        data = {'title': 'Dune', 'summary': 'Spice', 'isbn': '9780000000002',
+                'author': self.authors[7].pk,
+                'genre': [self.genres[1].pk, self.genres[2].pk],
+                'language': self.language.pk}
+
+        self.assertTrue(BookForm(data).is_valid())
+
+        form = BookForm({**data, 'author': 0})
+        self.assertFalse(form.is_valid())
+        self.assertIn('author', form.errors)
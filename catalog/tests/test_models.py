@@ -1,7 +1,18 @@
-from django.test import TestCase
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 import catalog.tests.factories as f
 import catalog.models as models
+import catalog.search as search
+import catalog.counters as counters
+import catalog.genre_names as genre_names
+import catalog.seeding as seeding
+import catalog.prefix_index as prefix_index
+from catalog.checks import check_query_plans, check_session_cache, \
+    full_scans
 import factory.random as frand
 
 
@@ -89,4 +100,315 @@ class BookModelTest(TestCase):
         self.books = models.Book.objects.all()
 
     def test_stuff(self):
-        pass
\ No newline at end of file
+        pass
+
+
+class BookSearchIndexTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        set_factory_seeds(DEF_FACTORY_SEED)
+
+        cls.author = f.AuthorFactory.create(first_name='Ursula',
+                                            last_name='Le Guin')
+        cls.genre = f.GenreFactory.create(name='science fiction')
+        cls.book = f.BookFactory.create(title='The Left Hand of Darkness',
+                                        author=cls.author,
+                                        summary='An envoy on a winter world',
+                                        post__genre=[cls.genre])
+        f.BookFactory.create(title='A Wizard of Earthsea',
+                             summary='Darkness follows a young wizard')
+
+    def _titles(self, query):
+        return [book.title for book in search.search_books(query)]
+
+    def test_prefix_match(self):
+        self.assertEqual(self._titles('wiz'), ['A Wizard of Earthsea'])
+        self.assertEqual(self._titles('lef ha'), ['The Left Hand of Darkness'])
+
+    def test_title_ranked_above_summary(self):
+        self.assertEqual(self._titles('darkness'),
+                         ['The Left Hand of Darkness', 'A Wizard of Earthsea'])
+
+    def test_author_and_genre_match(self):
+        self.assertEqual(self._titles('ursula'), ['The Left Hand of Darkness'])
+        self.assertEqual(self._titles('scien fic'),
+                         ['The Left Hand of Darkness'])
+
+    def test_empty_query(self):
+        self.assertEqual(self._titles(' ,. '), [])
+
+    def test_book_update_reindexed(self):
+        self.book.title = 'Winter'
+        self.book.save()
+
+        self.assertEqual(self._titles('winter'), ['Winter'])
+        self.assertEqual(self._titles('left'), [])
+
+    def test_book_delete_unindexed(self):
+        self.book.delete()
+
+        self.assertEqual(self._titles('left'), [])
+
+    def test_genre_changes_reindexed(self):
+        self.book.genre.clear()
+        self.assertEqual(self._titles('fiction'), [])
+
+        self.genre.book_set.add(self.book)
+        self.assertEqual(self._titles('fiction'), ['The Left Hand of Darkness'])
+
+        self.genre.name = 'speculative'
+        self.genre.save()
+        self.assertEqual(self._titles('specul'), ['The Left Hand of Darkness'])
+
+    def test_author_changes_reindexed(self):
+        self.author.first_name = 'Ursa'
+        self.author.save()
+        self.assertEqual(self._titles('ursula'), [])
+        self.assertEqual(self._titles('ursa'), ['The Left Hand of Darkness'])
+
+        self.author.delete()
+        self.assertEqual(self._titles('ursa'), [])
+
+    def test_written_to_the_books_database(self):
+        # Requests may read from a replica, the index is written with the books
+        with mock.patch.object(search, '_using', return_value='replica1'):
+            self.book.title = 'Winter'
+            self.book.save()
+            self.book.genre.clear()
+
+        self.assertEqual(self._titles('winter'), ['Winter'])
+
+    def test_rebuild(self):
+        search.rebuild_index()
+
+        self.assertEqual(self._titles('dark'),
+                         ['The Left Hand of Darkness', 'A Wizard of Earthsea'])
+
+
+class QueryPlanTest(TestCase):
+    def test_view_queries_use_indexes(self):
+        self.assertEqual(check_query_plans(databases=['default']), [])
+
+    def test_full_scan_detected(self):
+        plan = '2 0 0 SCAN catalog_bookinstance\n' \
+               '9 0 0 USE TEMP B-TREE FOR ORDER BY'
+        self.assertEqual(full_scans(plan),
+                         ['SCAN catalog_bookinstance',
+                          'USE TEMP B-TREE FOR ORDER BY'])
+
+    def test_index_scan_only_for_ordered_listings(self):
+        plan = '5 0 0 SCAN catalog_author USING INDEX author_name_idx'
+
+        self.assertEqual(full_scans(plan, ordered_scan=True), [])
+        self.assertEqual(len(full_scans(plan)), 1)
+
+    def test_unindexed_query_reported(self):
+        with mock.patch('catalog.checks.view_queries', return_value=[
+                ('summary', models.Book.objects.filter(summary='x'), False)]):
+            errors = check_query_plans(databases=['default'])
+
+        self.assertEqual([e.id for e in errors], ['catalog.E001'])
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+    def test_cached_sessions_need_a_shared_cache(self):
+        self.assertEqual([e.id for e in check_session_cache()],
+                         ['catalog.E002'])
+
+        with mock.patch('catalog.caching.is_shared_cache', return_value=True):
+            self.assertEqual(check_session_cache(), [])
+
+
+class BookCopyCountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        set_factory_seeds(DEF_FACTORY_SEED)
+
+        cls.book = f.BookFactory.create()
+        cls.other = f.BookFactory.create()
+
+    def _counts(self, book):
+        book.refresh_from_db()
+        return (book.copies_available, book.copies_on_loan,
+                book.copies_reserved, book.copies_maintenance)
+
+    def test_create(self):
+        f.BookInstanceFactory.create_batch(size=3, book=self.book, status='a')
+        f.BookInstanceFactory.create(book=self.book, status='m')
+
+        self.assertEqual(self._counts(self.book), (3, 0, 0, 1))
+
+    def test_status_change(self):
+        copy = f.BookInstanceFactory.create(book=self.book, status='a')
+
+        copy = models.BookInstance.objects.get(pk=copy.pk)
+        copy.status = 'o'
+        copy.save()
+        self.assertEqual(self._counts(self.book), (0, 1, 0, 0))
+
+        # Saving again without a change doesn't count twice
+        copy.save()
+        self.assertEqual(self._counts(self.book), (0, 1, 0, 0))
+
+    def test_stale_copies_saved_in_turn(self):
+        copy = f.BookInstanceFactory.create(book=self.book, status='a')
+        first, second = [models.BookInstance.objects.get(pk=copy.pk)
+                         for _ in range(2)]
+
+        first.status = 'o'
+        first.save()
+        # Loaded before the first save, still counted as available there
+        second.status = 'm'
+        second.save()
+
+        self.assertEqual(self._counts(self.book), (0, 0, 0, 1))
+
+    def test_stale_book_saved(self):
+        book = models.Book.objects.get(pk=self.book.pk)
+        f.BookInstanceFactory.create_batch(size=2, book=self.book, status='a')
+
+        book.title = 'Renamed'
+        book.save()
+
+        self.assertEqual(self._counts(self.book), (2, 0, 0, 0))
+        self.assertEqual(self.book.title, 'Renamed')
+
+    def test_book_change(self):
+        copy = f.BookInstanceFactory.create(book=self.book, status='r')
+
+        copy.book = self.other
+        copy.save()
+
+        self.assertEqual(self._counts(self.book), (0, 0, 0, 0))
+        self.assertEqual(self._counts(self.other), (0, 0, 1, 0))
+
+    def test_delete(self):
+        copies = f.BookInstanceFactory.create_batch(size=2, book=self.book,
+                                                    status='o')
+        copies[0].delete()
+
+        self.assertEqual(self._counts(self.book), (0, 1, 0, 0))
+
+    def test_reconcile(self):
+        f.BookInstanceFactory.create_batch(size=2, book=self.book, status='a')
+        # Queryset updates bypass the signals
+        models.BookInstance.objects.update(status='m')
+        models.Book.objects.update(copies_on_loan=7)
+
+        self.assertEqual(counters.reconcile(batch_size=1), 2)
+        self.assertEqual(self._counts(self.book), (0, 0, 0, 2))
+        self.assertEqual(self._counts(self.other), (0, 0, 0, 0))
+
+
+class BookGenreNamesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = models.Book.objects.create(title='Dune',
+                                              isbn='9780000000001')
+        cls.other = models.Book.objects.create(title='Emma',
+                                               isbn='9780000000002')
+        cls.drama, cls.scifi = [models.Genre.objects.create(name=name)
+                                for name in ('drama', 'science fiction')]
+
+    def _names(self, book):
+        return models.Book.objects.get(pk=book.pk).genre_names
+
+    def test_book_side_changes(self):
+        self.book.genre.add(self.scifi, self.drama)
+        self.assertEqual(self._names(self.book), 'drama, science fiction')
+        self.assertEqual(self.book.display_genre(), 'drama, science fiction')
+
+        self.book.genre.remove(self.drama)
+        self.assertEqual(self._names(self.book), 'science fiction')
+
+        self.book.genre.clear()
+        self.assertEqual(self._names(self.book), '')
+
+    def test_save_keeps_names(self):
+        self.book.genre.set([self.drama])
+        self.book.title = 'Dune Messiah'
+        self.book.save()
+
+        self.assertEqual(self._names(self.book), 'drama')
+
+    def test_genre_side_changes(self):
+        self.drama.book_set.add(self.book, self.other)
+        self.assertEqual(self._names(self.other), 'drama')
+
+        self.drama.book_set.clear()
+        self.assertEqual(self._names(self.book), '')
+        self.assertEqual(self._names(self.other), '')
+
+    def test_genre_rename_and_delete(self):
+        self.book.genre.set([self.drama, self.scifi])
+
+        self.drama.name = 'tragedy'
+        self.drama.save()
+        self.assertEqual(self._names(self.book), 'science fiction, tragedy')
+
+        self.scifi.delete()
+        self.assertEqual(self._names(self.book), 'tragedy')
+
+    def test_refresh(self):
+        self.book.genre.set([self.drama])
+        # Queryset updates bypass the signals
+        models.Book.objects.update(genre_names='stale')
+
+        self.assertEqual(genre_names.refresh(batch_size=1), 2)
+        self.assertEqual(self._names(self.book), 'drama')
+        self.assertEqual(self._names(self.other), '')
+        self.assertEqual(genre_names.refresh(), 0)
+
+
+class BulkSeederTest(TestCase):
+    def test_isbn13(self):
+        # Check digit of a published ISBN
+        self.assertEqual(seeding.isbn13(30640615, prefix='978'), '9780306406157')
+        self.assertEqual(len(seeding.isbn13(0)), 13)
+
+    def test_books(self):
+        borrower = models.User.objects.create_user('patron')
+        seeder = seeding.BulkSeeder(seed=DEF_FACTORY_SEED, batch_size=7)
+
+        with CaptureQueriesContext(connection) as queries:
+            copies = seeder.books(20, copies=(2, 4), genres=(1, 2),
+                                  borrowers=[borrower])
+
+        # A fixed number of queries per batch of books, not per row
+        self.assertLess(len(queries), 15 * 3)
+
+        books = models.Book.objects.all()
+        self.assertEqual(books.count(), 20)
+        self.assertEqual(models.BookInstance.objects.count(), copies)
+        self.assertEqual(models.Author.objects.count(), 2)
+        self.assertEqual(models.Language.objects.count(),
+                         len(models.LANGUAGES))
+        self.assertFalse(books.filter(genre=None).exists())
+        self.assertFalse(models.BookInstance.objects
+                         .filter(status='o', borrower=None).exists())
+        self.assertIn(books[0], search.search_books(books[0].title, 100))
+
+        # The counters were filled in before the books were inserted
+        before = list(books.values_list(*models.Book.COPY_COUNTERS.values()))
+        counters.reconcile()
+        self.assertEqual(
+            list(books.values_list(*models.Book.COPY_COUNTERS.values())),
+            before)
+        self.assertEqual(genre_names.refresh(), 0)
+
+    def test_prefix_index_cleared(self):
+        prefix_index.index.search('x')
+        seeding.BulkSeeder(seed=1).books(3)
+
+        titles = models.Book.objects.values_list('title', flat=True)
+        self.assertIn(titles[0], [title for _, title in prefix_index.index
+                                  .search(titles[0], limit=3)['book']])
+
+    def test_reuses_pools(self):
+        seeding.BulkSeeder(seed=1).books(3)
+        seeder = seeding.BulkSeeder(seed=2)
+        seeder.books(3)
+
+        self.assertEqual(models.Book.objects.count(), 6)
+        self.assertEqual(models.Genre.objects.count(),
+                         len(models.BOOK_GENRES))
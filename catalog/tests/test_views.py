@@ -1,12 +1,31 @@
-import re
-from math import ceil
+import datetime
+from unittest import mock
 
 import factory.random as frand
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission, User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
-from catalog.tests.factories import AuthorFactory
-from catalog.models import Author
+from catalog.tests.factories import AuthorFactory, BookFactory, \
+    BookInstanceFactory, GenreFactory, set_faker_seed
+from catalog.models import Author, Book, Genre, Language
+import catalog.models as models
+from catalog.metrics import Registry, registry
+from catalog.middleware import ReplicaRoutingMiddleware
+from catalog.routers import ReplicaRouter
+import catalog.caching as caching
+import catalog.counters as counters
+import catalog.prefix_index as prefix_index
+import catalog.visits as visits
+from catalog.stats import compute_dashboard_stats, get_dashboard_stats
 
 
 class AuthorListViewTest(TestCase):
@@ -17,12 +36,13 @@ class AuthorListViewTest(TestCase):
     @classmethod
     def setUpTestData(cls):
         frand.reseed_random(cls.FACTORY_SEED)
-        AuthorFactory.set_faker_seed(cls.FACTORY_SEED)
+        set_faker_seed(cls.FACTORY_SEED)
 
         AuthorFactory.create_batch(size=cls.BATCH_SIZE)
 
     def setUp(self):
         self.paginate_by = self.PAGINATE_BY
+        cache.clear()
 
     def test_view_url_at_specified(self):
         url = '/catalog/authors/all/'
@@ -59,12 +79,1126 @@ class AuthorListViewTest(TestCase):
 
         self.assertEqual(len(response.context['author_list']), self.PAGINATE_BY)
 
-        last_page_actual = response.context['paginator'].num_pages
-        last_page_expected = ceil(self.BATCH_SIZE/self.PAGINATE_BY)
+        # Cursor pagination never counts the table
+        self.assertTrue(response.context['page_obj'].has_next())
+        self.assertFalse(response.context['page_obj'].has_previous())
 
-        self.assertEqual(last_page_actual, last_page_expected)
+    def test_walk_all_pages(self):
+        seen = []
+        cursor = None
+
+        while True:
+            data = {'cursor': cursor} if cursor else {}
+            response = self.client.get(reverse('authors-all'), data)
+            seen.extend(a.id for a in response.context['author_list'])
+
+            page = response.context['page_obj']
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+
+        expected = list(Author.objects
+                        .order_by('last_name', 'first_name', 'id')
+                        .values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(seen), Author.objects.count())
+
+    def test_deep_page_same_cost(self):
+        with CaptureQueriesContext(connection) as first:
+            response = self.client.get(reverse('authors-all'))
+
+        last = Author.objects.order_by('last_name', 'first_name', 'id') \
+            [self.BATCH_SIZE - self.PAGINATE_BY - 1]
+        cursor = response.context['paginator'].encode_cursor(
+            [last.last_name, last.first_name, last.id], 'n')
+
+        with CaptureQueriesContext(connection) as deep:
+            response = self.client.get(reverse('authors-all'),
+                                       {'cursor': cursor})
+
+        self.assertEqual(len(response.context['author_list']),
+                         self.PAGINATE_BY)
+        self.assertFalse(response.context['page_obj'].has_next())
+        self.assertEqual(len(first), len(deep))
+        self.assertFalse(any('COUNT(' in q['sql'] for q in deep))
 
     def test_list_all_authors_shown(self):
         response = self.client.get(reverse('authors-all'))
         self.assertEqual(response.status_code, 200)
 
+
+
+class IndexViewTest(TestCase):
+    FACTORY_SEED = 'testing_seed'
+
+    @classmethod
+    def setUpTestData(cls):
+        frand.reseed_random(cls.FACTORY_SEED)
+        set_faker_seed(cls.FACTORY_SEED)
+
+        AuthorFactory.create(first_name='Rinat', last_name='Ibragimov')
+        BookInstanceFactory.create_batch(size=5, status='a')
+        BookInstanceFactory.create_batch(size=3, status='o')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_stats_single_query(self):
+        with self.assertNumQueries(1):
+            stats = compute_dashboard_stats()
+
+        self.assertEqual(stats['num_books'], Book.objects.count())
+        self.assertEqual(stats['num_authors'], Author.objects.count())
+        self.assertEqual(stats['num_author_rinat'], 1)
+        self.assertEqual(stats['num_instances'], 8)
+        self.assertEqual(stats['num_instances_available'], 5)
+        self.assertCountEqual(stats['num_languages'],
+                              Language.objects.values_list('name', flat=True))
+        self.assertCountEqual(stats['num_genres'],
+                              Genre.objects.values_list('name', flat=True))
+
+    def test_stats_cached(self):
+        get_dashboard_stats()
+
+        with self.assertNumQueries(0):
+            get_dashboard_stats()
+
+    def test_stats_timeout_bounded_by_a_local_cache(self):
+        with mock.patch.object(cache, 'set') as cache_set:
+            get_dashboard_stats()
+        self.assertEqual(cache_set.call_args.args[2],
+                         caching.DEF_LOCAL_TIMEOUT)
+
+    def test_stats_invalidated_on_change(self):
+        self.assertEqual(get_dashboard_stats()['num_genres'], [])
+
+        GenreFactory.create(name='history')
+
+        self.assertEqual(get_dashboard_stats()['num_genres'], ['history'])
+
+    def test_view_context(self):
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(response.context['num_instances_available'], 5)
+        self.assertEqual(response.context['num_author_rinat'], 1)
+
+    def test_visits_counted_without_session(self):
+        get_dashboard_stats()
+
+        for count in range(3):
+            with self.assertNumQueries(0):
+                response = self.client.get(reverse('index'))
+            self.assertEqual(response.context['num_visits'], count)
+
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertFalse(Session.objects.exists())
+
+    def test_visits_cookie_tampered(self):
+        self.client.cookies[visits.VISITS_COOKIE] = '41'
+
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['num_visits'], 0)
+
+    def test_visits_carried_over_from_session(self):
+        session = self.client.session
+        session[visits.SESSION_KEY] = 7
+        session.save()
+
+        self.client.get(reverse('index'))
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['num_visits'], 8)
+
+
+class BookInstanceListViewTest(TestCase):
+    FACTORY_SEED = 'testing_seed'
+    BATCH_SIZE = 50
+    PAGINATE_BY = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        frand.reseed_random(cls.FACTORY_SEED)
+        set_faker_seed(cls.FACTORY_SEED)
+
+        cls.librarian = User.objects.create_user('librarian', is_staff=True)
+        cls.librarian.user_permissions.add(
+            Permission.objects.get(codename='can_view_all_books'))
+
+        cls.book = BookFactory.create()
+        BookInstanceFactory.create_batch(size=cls.BATCH_SIZE, book=cls.book,
+                                         status='o')
+        # Copies without a due date are ordered last
+        BookInstanceFactory.create_batch(size=5, book=cls.book, status='o',
+                                         due_back=None)
+        BookInstanceFactory.create_batch(size=3, book=cls.book, status='a')
+
+    def setUp(self):
+        self.client.force_login(self.librarian)
+
+    def _section(self, response, status):
+        return next(s for s in response.context['sections']
+                    if s['status'] == status)
+
+    def test_permission_required(self):
+        self.client.logout()
+
+        response = self.client.get(reverse('books-all-copies'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_sections_bucketed(self):
+        response = self.client.get(reverse('books-all-copies'))
+        self.assertEqual(response.status_code, 200)
+
+        on_loan = self._section(response, 'o')['page']
+        self.assertEqual(len(on_loan), self.PAGINATE_BY)
+        self.assertTrue(all(inst.status == 'o' for inst in on_loan))
+        self.assertEqual(len(self._section(response, 'a')['page']), 3)
+        self.assertEqual(len(self._section(response, 'r')['page']), 0)
+
+    def test_walk_all_pages(self):
+        seen = []
+        url = reverse('books-all-copies')
+
+        while url:
+            response = self.client.get(url)
+            section = self._section(response, 'o')
+            seen.extend(inst.instance_id for inst in section['page'])
+            url = section['next_url']
+
+        expected = list(models.BookInstance.objects
+                        .filter(status='o')
+                        .order_by(F('due_back').asc(nulls_last=True),
+                                  'instance_id')
+                        .values_list('instance_id', flat=True))
+        self.assertEqual(seen, expected)
+
+        # Walk back from the last page to the first one
+        back = []
+        url = section['previous_url']
+        while url:
+            response = self.client.get(url)
+            section = self._section(response, 'o')
+            back = [inst.instance_id for inst in section['page']] + back
+            url = section['previous_url']
+
+        self.assertEqual(back, expected[:len(back)])
+        self.assertEqual(back[:self.PAGINATE_BY],
+                         expected[:self.PAGINATE_BY])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('books-all-copies'), {'o': 'bogus'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_query_count_flat(self):
+        self.client.get(reverse('books-all-copies'))
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('books-all-copies'))
+
+        BookInstanceFactory.create_batch(size=self.BATCH_SIZE, book=self.book,
+                                         status='a')
+
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(reverse('books-all-copies'))
+
+        self.assertEqual(len(small), len(large))
+
+
+class BookDetailViewTest(TestCase):
+    FACTORY_SEED = 'testing_seed'
+    QUERY_BUDGET = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        frand.reseed_random(cls.FACTORY_SEED)
+        set_faker_seed(cls.FACTORY_SEED)
+
+        cls.book = BookFactory.create(
+            post__genre=GenreFactory.create_batch(size=3))
+
+    def setUp(self):
+        cache.clear()
+
+    def _get(self):
+        return self.client.get(reverse('book-detail', args=[self.book.id]))
+
+    def test_view_renders(self):
+        BookInstanceFactory.create(book=self.book, status='o')
+
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'book_detail.html')
+        self.assertContains(response, 'Return due')
+
+    def test_query_budget_no_copies(self):
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            self._get()
+
+    def test_query_budget_many_copies(self):
+        for size in (1, 10, 100):
+            BookInstanceFactory.create_batch(size=size, book=self.book)
+
+            with self.assertNumQueries(self.QUERY_BUDGET):
+                response = self._get()
+
+            self.assertEqual(
+                len(response.context['book'].bookinstance_set.all()),
+                models.BookInstance.objects.filter(book=self.book).count())
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        BookFactory.create(title='Dune')
+
+    def test_results(self):
+        response = self.client.get(reverse('search'), {'q': 'du'})
+        self.assertEqual(response.status_code, 200)
+
+        self.assertTemplateUsed(response, 'search_results.html')
+        self.assertEqual([b.title for b in response.context['results']],
+                         ['Dune'])
+
+    def test_no_query(self):
+        response = self.client.get(reverse('search'))
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(response.context['results'], [])
+
+
+class MetricsViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='secret',
+                                             is_staff=True)
+        User.objects.create_user('patron', password='secret')
+        BookFactory.create_batch(size=3)
+
+    def setUp(self):
+        registry.reset()
+        cache.clear()
+
+    def test_staff_only(self):
+        self.client.login(username='patron', password='secret')
+        response = self.client.get(reverse('catalog-metrics'))
+
+        self.assertEqual(response.status_code, 302)
+
+    def test_records_view_metrics(self):
+        self.client.get(reverse('books-all'))
+        self.client.get(reverse('books-all'))
+
+        self.client.login(username='staff', password='secret')
+        response = self.client.get(reverse('catalog-metrics'))
+        text = response.content.decode()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('# TYPE catalog_request_queries histogram', text)
+        self.assertIn('catalog_requests_total{view="books-all"} 2', text)
+        self.assertIn('catalog_request_queries_count{view="books-all"} 2',
+                      text)
+        self.assertIn('catalog_request_render_seconds_count{view="books-all"}',
+                      text)
+        self.assertIn('catalog_request_queries_bucket{view="books-all",'
+                      'le="+Inf"} 2', text)
+
+    def test_histograms_cumulative(self):
+        metrics = Registry(window=2)
+        for seconds in (.001, .2, .3):
+            metrics.observe('books-all', 'catalog_request_seconds', seconds)
+        text = metrics.render()
+
+        # The window only holds the last two, the histogram all three
+        self.assertIn('catalog_request_seconds_count{view="books-all"} 3',
+                      text)
+        self.assertIn('catalog_request_seconds_bucket{view="books-all",'
+                      'le="0.005"} 1', text)
+        self.assertIn('# TYPE catalog_request_seconds_window gauge', text)
+        self.assertIn('catalog_request_seconds_window{view="books-all",'
+                      'quantile="0.5"} 0.2', text)
+
+    def test_query_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('books-all'))
+
+        samples, _ = registry.snapshot()
+        self.assertEqual(samples['catalog_request_queries', 'books-all'],
+                         [len(queries)])
+
+    @override_settings(CATALOG_QUERY_BUDGET=0)
+    def test_query_budget(self):
+        with self.assertLogs('catalog.metrics', 'WARNING') as logs:
+            self.client.get(reverse('books-all'))
+
+        self.assertIn('books-all', logs.output[0])
+        _, counters = registry.snapshot()
+        self.assertEqual(
+            counters['catalog_query_budget_exceeded_total', 'books-all'], 1)
+
+
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Frank',
+                                           last_name='Herbert')
+        cls.genre = Genre.objects.create(name='science fiction')
+        cls.book = Book.objects.create(title='Dune', isbn='9780000000001',
+                                       author=cls.author)
+        cls.book.genre.add(cls.genre)
+        cls.copy = models.BookInstance.objects.create(book=cls.book,
+                                                      imprint='Ace',
+                                                      status='a')
+        cls.user = User.objects.create_user('patron')
+
+    def setUp(self):
+        cache.clear()
+
+    def _assert_cached(self, url, *texts):
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        for text in texts:
+            self.assertContains(response, text)
+
+    def _assert_evicted(self, url, change, text):
+        self._assert_cached(url)
+        change()
+        self.assertContains(self.client.get(url), text)
+
+    def test_timeouts_bounded_by_a_local_cache(self):
+        self.assertFalse(caching.is_shared_cache())
+        self.assertEqual(caching.cache_timeout(), caching.DEF_LOCAL_TIMEOUT)
+        self.assertEqual(caching.stamp_timeout(), caching.DEF_LOCAL_TIMEOUT)
+
+        with mock.patch('catalog.caching.is_shared_cache', return_value=True):
+            self.assertEqual(caching.cache_timeout(), caching.DEF_TIMEOUT)
+            self.assertIsNone(caching.stamp_timeout())
+
+    def test_anonymous_pages_cached(self):
+        self._assert_cached(reverse('books-all'), 'Dune')
+        self._assert_cached(reverse('book-detail', args=[self.book.pk]),
+                            'Ace')
+        self._assert_cached(reverse('authors-all'), 'Herbert')
+        self._assert_cached(reverse('authors-detail', args=[self.author.pk]),
+                            'Dune')
+
+    def test_authenticated_not_cached(self):
+        self.client.force_login(self.user)
+        url = reverse('books-all')
+
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertTrue(queries)
+
+    def test_copies_fragment_cached(self):
+        self.client.force_login(self.user)
+        url = reverse('book-detail', args=[self.book.pk])
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse([q for q in queries.captured_queries
+                          if q['sql'].startswith(
+                              'SELECT "catalog_bookinstance"')])
+
+    def test_book_change_evicts(self):
+        def rename():
+            self.book.title = 'Dune Messiah'
+            self.book.save()
+
+        for url in (reverse('books-all'),
+                    reverse('book-detail', args=[self.book.pk]),
+                    reverse('authors-detail', args=[self.author.pk])):
+            self._assert_evicted(url, rename, 'Dune Messiah')
+
+    def test_book_author_change_evicts_both_authors(self):
+        other = Author.objects.create(first_name='Brian', last_name='Herbert')
+        url = reverse('authors-detail', args=[self.author.pk])
+
+        def reassign():
+            book = Book.objects.get(pk=self.book.pk)
+            book.author = other
+            book.save()
+
+        self._assert_evicted(url, reassign, 'Herbert')
+        self.assertNotContains(self.client.get(url), 'Dune')
+
+    def test_copy_change_evicts(self):
+        def lend():
+            copy = models.BookInstance.objects.get(pk=self.copy.pk)
+            copy.status = 'o'
+            copy.save()
+
+        self._assert_evicted(reverse('book-detail', args=[self.book.pk]),
+                             lend, 'On loan')
+        self.assertContains(self.client.get(reverse('books-all')),
+                            '(0 available)')
+
+    def test_author_change_evicts_books(self):
+        def rename():
+            self.author.first_name = 'F.'
+            self.author.save()
+
+        self._assert_evicted(reverse('book-detail', args=[self.book.pk]),
+                             rename, 'Herbert, F.')
+
+    def test_genre_change_evicts_books(self):
+        def rename():
+            self.genre.name = 'sci-fi'
+            self.genre.save()
+
+        self._assert_evicted(reverse('book-detail', args=[self.book.pk]),
+                             rename, 'sci-fi')
+
+    def test_bulk_update_evicts(self):
+        def update():
+            models.BookInstance.objects.update(status='m')
+            counters.reconcile()
+
+        self._assert_evicted(reverse('books-all'), update, '(0 available)')
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Frank',
+                                           last_name='Herbert')
+        cls.book = Book.objects.create(title='Dune', isbn='9780000000001',
+                                       author=cls.author)
+        cls.user = User.objects.create_user('patron')
+
+    def setUp(self):
+        cache.clear()
+        self.urls = [reverse('books-all'), reverse('authors-all'),
+                     reverse('book-detail', args=[self.book.pk]),
+                     reverse('authors-detail', args=[self.author.pk])]
+
+    def test_etag_not_modified(self):
+        for url in self.urls:
+            etag = self.client.get(url)['ETag']
+
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+    def test_last_modified_not_modified(self):
+        for url in self.urls:
+            modified = self.client.get(url)['Last-Modified']
+
+            with self.assertNumQueries(0):
+                response = self.client.get(url,
+                                           HTTP_IF_MODIFIED_SINCE=modified)
+            self.assertEqual(response.status_code, 304)
+
+    def test_change_modifies(self):
+        responses = [self.client.get(url) for url in self.urls]
+
+        models.BookInstance.objects.create(book=self.book, status='a')
+
+        # The book pages show the copies, the author pages don't
+        for url, response, status in zip(self.urls, responses,
+                                         (200, 304, 200, 304)):
+            changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(changed.status_code, status, url)
+
+    def test_last_modified_follows_copies(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        before = self.client.get(url)['Last-Modified']
+
+        with mock.patch('django.utils.timezone.now',
+                        return_value=timezone.now()
+                        + datetime.timedelta(days=1)):
+            models.BookInstance.objects.create(book=self.book, status='a')
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=before)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_per_user(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        anonymous = self.client.get(url)['ETag']
+
+        self.client.force_login(self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=anonymous)
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CATALOG_READ_REPLICAS=['replica1'])
+class ReplicaRoutingTest(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def _route(self, request):
+        """Where the view handling 'request' reads books and users from"""
+        seen = {}
+
+        def view(request):
+            seen['book'] = self.router.db_for_read(Book)
+            seen['user'] = self.router.db_for_read(User)
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(request)
+
+        return seen, response
+
+    def test_safe_request_reads_replica(self):
+        seen, response = self._route(self.factory.get('/'))
+
+        self.assertEqual(seen, {'book': 'replica1', 'user': 'default'})
+        self.assertNotIn(ReplicaRoutingMiddleware.PIN_COOKIE,
+                         response.cookies)
+
+    def test_write_pins_to_primary(self):
+        seen, response = self._route(self.factory.post('/'))
+
+        self.assertEqual(seen['book'], 'default')
+        self.assertIn(ReplicaRoutingMiddleware.PIN_COOKIE, response.cookies)
+
+        request = self.factory.get('/')
+        request.COOKIES[ReplicaRoutingMiddleware.PIN_COOKIE] = '1'
+        seen, _ = self._route(request)
+        self.assertEqual(seen['book'], 'default')
+
+    def test_outside_requests(self):
+        self.assertEqual(self.router.db_for_read(Book), 'default')
+        self.assertEqual(self.router.db_for_write(Book), 'default')
+        self.assertFalse(self.router.allow_migrate('replica1', 'catalog'))
+
+    @override_settings(CATALOG_READ_REPLICAS=[])
+    def test_no_replicas(self):
+        seen, response = self._route(self.factory.post('/'))
+
+        self.assertEqual(seen['book'], 'default')
+        self.assertFalse(response.cookies)
+
+
+@override_settings(ROOT_URLCONF='locallibrary.asgi_urls')
+class AsyncViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Frank',
+                                           last_name='Herbert')
+        cls.books = [Book.objects.create(title=f'Dune {number}',
+                                         isbn=f'978000000000{number}',
+                                         author=cls.author)
+                     for number in range(3)]
+        models.BookInstance.objects.create(book=cls.books[0], status='o')
+        models.BookInstance.objects.create(book=cls.books[1], status='a')
+
+        cls.librarian = User.objects.create_user('librarian')
+        cls.librarian.user_permissions.add(
+            Permission.objects.get(codename='can_view_all_books'))
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+
+    async def test_index(self):
+        for visits in range(2):
+            response = await self.async_client.get(reverse('index'))
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['num_visits'], visits)
+            self.assertEqual(response.context['num_books'], 3)
+
+    async def test_book_list(self):
+        response = await self.async_client.get(reverse('books-all'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([book.title
+                          for book in response.context['book_list']],
+                         ['Dune 0', 'Dune 1'])
+        self.assertTrue(response.context['is_paginated'])
+
+        cursor = response.context['page_obj'].next_cursor
+        response = await self.async_client.get(reverse('books-all'),
+                                               {'cursor': cursor})
+        self.assertEqual([book.title
+                          for book in response.context['book_list']],
+                         ['Dune 2'])
+
+        response = await self.async_client.get(reverse('books-all'),
+                                               {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 404)
+
+    async def test_detail_pages(self):
+        for url, text in (
+                (reverse('book-detail', args=[self.books[0].pk]), 'Dune 0'),
+                (reverse('authors-detail', args=[self.author.pk]), 'Herbert')):
+            response = await self.async_client.get(url)
+            self.assertContains(response, text)
+
+            response = await self.async_client.get(
+                url, headers={'If-None-Match': response['ETag']})
+            self.assertEqual(response.status_code, 304)
+
+        response = await self.async_client.get(
+            reverse('book-detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_page_cached(self):
+        url = reverse('authors-all')
+        first = await self.async_client.get(url)
+        second = await self.async_client.get(url)
+
+        self.assertEqual(first.content, second.content)
+        # Served from the cache, the template isn't rendered again
+        self.assertIsNone(second.context)
+
+    async def test_copies_list(self):
+        url = reverse('books-all-copies')
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 302)
+
+        await self.async_client.aforce_login(self.librarian)
+        response = await self.async_client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([len(section['page'])
+                          for section in response.context['sections']],
+                         [1, 1, 0, 0])
+
+    async def test_queries_recorded(self):
+        await self.async_client.get(reverse('book-detail',
+                                            args=[self.books[0].pk]))
+
+        samples, _ = registry.snapshot()
+        self.assertGreater(samples['catalog_request_queries',
+                                   'book-detail'][0], 0)
+
+
+class AdminChangelistTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin')
+        cls.author = Author.objects.create(first_name='Frank',
+                                           last_name='Herbert')
+        cls.book = Book.objects.create(title='Dune', isbn='9780000000001',
+                                       author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def _add_books(self, count, start=2):
+        for number in range(start, start + count):
+            book = Book.objects.create(title=f'Dune {number}',
+                                       isbn=f'978{number:010d}',
+                                       author=self.author)
+            models.BookInstance.objects.create(book=book, status='o',
+                                               borrower=self.admin)
+
+    def _changelist_queries(self, name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f'admin:catalog_{name}_'
+                                               f'changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_independent_of_rows(self):
+        self._add_books(2)
+        few = {name: self._changelist_queries(name)
+               for name in ('book', 'bookinstance', 'author')}
+
+        self._add_books(10, start=10)
+        for name, count in few.items():
+            self.assertEqual(self._changelist_queries(name), count, name)
+
+    @override_settings(CATALOG_EXACT_COUNT=3)
+    def test_large_counts_cached(self):
+        self._add_books(4)
+        models.BookInstance.objects.create(book=self.book, status='a')
+        url = reverse('admin:catalog_bookinstance_changelist')
+
+        self.assertEqual(self.client.get(url).context['cl'].result_count, 5)
+        self._add_books(1, start=20)
+        # Above the limit the count is served from the cache
+        self.assertEqual(self.client.get(url).context['cl'].result_count, 5)
+
+        # Small results are always counted exactly
+        response = self.client.get(url, {'status__exact': 'a'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_inline_limited(self):
+        models.BookInstance.objects.bulk_create(
+            [models.BookInstance(book=self.book, status='a')
+             for _ in range(25)])
+
+        response = self.client.get(reverse('admin:catalog_book_change',
+                                           args=[self.book.pk]))
+
+        formset = response.context['inline_admin_formsets'][0].formset
+        self.assertEqual(len(formset.forms), 20)
+
+
+class BulkLoansTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patron = User.objects.create_user('patron')
+        cls.librarian = User.objects.create_user('librarian')
+        cls.librarian.user_permissions.add(
+            Permission.objects.get(codename='can_mark_returned_books'))
+
+        cls.book = Book.objects.create(title='Dune', isbn='9780000000001')
+        due = datetime.date.today() + datetime.timedelta(days=2)
+        cls.loans = [models.BookInstance.objects.create(
+            book=cls.book, status='o', borrower=cls.patron, due_back=due)
+            for _ in range(3)]
+        cls.available = models.BookInstance.objects.create(book=cls.book,
+                                                           status='a')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.librarian)
+        self.url = reverse('books-bulk')
+        self.due_back = datetime.date.today() + datetime.timedelta(weeks=3)
+
+    def _ids(self, *copies):
+        return '\n'.join(str(copy.instance_id) for copy in copies)
+
+    def test_permission_required(self):
+        self.client.force_login(self.patron)
+
+        response = self.client.post(self.url, {'action': 'check_in',
+                                               'instance_ids': 'x'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_renew(self):
+        missing = '00000000-0000-4000-8000-000000000000'
+        response = self.client.post(self.url, {
+            'action': 'renew',
+            'due_back': self.due_back,
+            'instance_ids': f'{self._ids(*self.loans, self.available)}\n'
+                            f'{missing}, bogus',
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [outcome for _, outcome in response.context['results']],
+            ['renewed'] * 3 + ['not on loan', 'not found', 'invalid id'])
+        self.assertEqual(models.BookInstance.objects
+                         .filter(due_back=self.due_back).count(), 3)
+
+    def test_renew_date_rules(self):
+        past = datetime.date.today() - datetime.timedelta(days=1)
+
+        for data in ({'due_back': past}, {}):
+            response = self.client.post(self.url, {
+                'action': 'renew', 'instance_ids': self._ids(*self.loans),
+                **data})
+            self.assertIn('due_back', response.context['form'].errors)
+
+    def test_check_in_json(self):
+        with self.assertNumQueries(9):
+            response = self.client.post(
+                self.url,
+                {'action': 'check_in',
+                 'instance_ids': self._ids(*self.loans[:2])},
+                HTTP_ACCEPT='application/json')
+
+        self.assertEqual(response.json()['summary'], {'returned': 2})
+        self.assertEqual(models.BookInstance.objects
+                         .filter(status='o').count(), 1)
+
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.copies_available,
+                          self.book.copies_on_loan), (3, 1))
+
+    def test_json_errors(self):
+        response = self.client.post(self.url, {'action': 'lend'},
+                                    HTTP_ACCEPT='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']),
+                         {'action', 'instance_ids'})
+
+
+class RenewBookLibrarianTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user('librarian')
+        cls.librarian.user_permissions.add(
+            Permission.objects.get(codename='can_mark_returned_books'))
+        book = Book.objects.create(title='Dune', isbn='9780000000001')
+        cls.copy = models.BookInstance.objects.create(
+            book=book, status='o', due_back=datetime.date.today())
+
+    def setUp(self):
+        self.client.force_login(self.librarian)
+        self.url = reverse('books-renew-librarian',
+                           args=[self.copy.instance_id])
+
+    def test_initial_date(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.context['form'].initial['due_back'],
+                         datetime.date.today() + datetime.timedelta(weeks=3))
+
+    def test_renew(self):
+        due_back = datetime.date.today() + datetime.timedelta(weeks=2)
+        response = self.client.post(self.url, {'due_back': due_back})
+
+        self.assertRedirects(response, reverse('books-all-copies'),
+                             fetch_redirect_response=False)
+        self.copy.refresh_from_db()
+        self.assertEqual(self.copy.due_back, due_back)
+
+
+@mock.patch('catalog.permissions.is_shared_cache', return_value=True)
+class PermissionCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarians = Group.objects.create(name='Librarians')
+        cls.librarians.permissions.add(
+            Permission.objects.get(codename='can_view_all_books'))
+        cls.user = User.objects.create_user('librarian')
+        cls.user.groups.add(cls.librarians)
+
+    def setUp(self):
+        cache.clear()
+
+    def _has_perm(self, codename):
+        # A fresh instance, as every request loads one
+        user = User.objects.get(pk=self.user.pk)
+        return user.has_perm(f'catalog.{codename}')
+
+    def test_cached_across_requests(self, shared):
+        self.assertTrue(self._has_perm('can_view_all_books'))
+
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm('catalog.can_view_all_books'))
+            self.assertFalse(user.has_perm('catalog.can_edit_books'))
+
+    def test_page_checks(self, shared):
+        self.client.force_login(self.user)
+        self.client.get(reverse('books-all-copies'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('books-all-copies'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'auth_permission' in query['sql']])
+
+    def test_group_permission_change(self, shared):
+        self.assertFalse(self._has_perm('can_edit_books'))
+
+        self.librarians.permissions.add(
+            Permission.objects.get(codename='can_edit_books'))
+        self.assertTrue(self._has_perm('can_edit_books'))
+
+        Permission.objects.get(codename='can_edit_books').group_set.clear()
+        self.assertFalse(self._has_perm('can_edit_books'))
+
+    def test_membership_change(self, shared):
+        self.assertTrue(self._has_perm('can_view_all_books'))
+
+        self.librarians.user_set.remove(self.user)
+        self.assertFalse(self._has_perm('can_view_all_books'))
+
+        self.user.groups.add(self.librarians)
+        self.assertTrue(self._has_perm('can_view_all_books'))
+
+        self.librarians.delete()
+        self.assertFalse(self._has_perm('can_view_all_books'))
+
+    def test_user_change(self, shared):
+        self.assertFalse(self._has_perm('can_edit_books'))
+
+        self.user.user_permissions.add(
+            Permission.objects.get(codename='can_edit_books'))
+        self.assertTrue(self._has_perm('can_edit_books'))
+
+        self.user.user_permissions.clear()
+        self.user.is_superuser = True
+        self.user.save()
+        self.assertTrue(self._has_perm('can_edit_books'))
+
+    def test_not_cached_in_process_memory(self, shared):
+        shared.return_value = False
+        self.assertTrue(self._has_perm('can_view_all_books'))
+
+        user = User.objects.get(pk=self.user.pk)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(user.has_perm('catalog.can_view_all_books'))
+            self.assertFalse(user.has_perm('catalog.can_edit_books'))
+        self.assertTrue(queries)
+
+
+class LookupViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user('librarian')
+        cls.librarian.user_permissions.add(
+            Permission.objects.get(codename='can_edit_books'))
+
+        for last_name, first_name in [('Tolkien', 'Christopher'),
+                                      ('Tolkien', 'John'), ('Tolstoy', 'Leo'),
+                                      ('Twain', 'Mark'), ('tolle', 'Eckhart'),
+                                      ('McCarthy', 'Cormac'),
+                                      ('Le Guin', 'Ursula')]:
+            Author.objects.create(first_name=first_name, last_name=last_name)
+        for name in ['Fantasy', 'Fiction', 'science fiction']:
+            Genre.objects.create(name=name)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.librarian)
+
+    def _lookup(self, kind, **params):
+        return self.client.get(reverse('catalog-lookup', args=[kind]), params)
+
+    def _texts(self, response):
+        return [result['text'] for result in response.json()['results']]
+
+    def test_prefix(self):
+        self.assertEqual(self._texts(self._lookup('author', q='Tol')),
+                         ['Tolkien, Christopher', 'Tolkien, John',
+                          'tolle, Eckhart', 'Tolstoy, Leo'])
+        self.assertEqual(self._texts(self._lookup('author', q='tols')),
+                         ['Tolstoy, Leo'])
+        self.assertEqual(self._texts(self._lookup('author', q='Tolkien, J')),
+                         ['Tolkien, John'])
+        self.assertEqual(self._texts(self._lookup('genre', q='Fa')),
+                         ['Fantasy'])
+
+    def test_case_and_spacing_insensitive(self):
+        self.assertEqual(self._texts(self._lookup('author', q='mccarthy')),
+                         ['McCarthy, Cormac'])
+        self.assertEqual(self._texts(self._lookup('author', q='le  guin')),
+                         ['Le Guin, Ursula'])
+        self.assertEqual(self._texts(self._lookup('author', q='TOLKIEN,j')),
+                         ['Tolkien, John'])
+        self.assertEqual(self._texts(self._lookup('genre', q='fi')),
+                         ['Fiction'])
+        self.assertEqual(self._texts(self._lookup('genre', q='Science F')),
+                         ['science fiction'])
+
+    def test_key_kept_in_step(self):
+        author = Author.objects.get(last_name='Twain')
+        author.last_name = 'Clemens'
+        author.save(update_fields=['last_name'])
+
+        self.assertEqual(self._texts(self._lookup('author', q='clem')),
+                         ['Clemens, Mark'])
+        self.assertEqual(self._texts(self._lookup('author', q='twa')), [])
+
+    def test_paging(self):
+        with mock.patch('catalog.views.LOOKUP_RESULTS', 3):
+            first = self._lookup('author', q='T').json()
+            second = self._lookup('author', q='T',
+                                  cursor=first['next']).json()
+
+        self.assertEqual([r['text'] for r in first['results']],
+                         ['Tolkien, Christopher', 'Tolkien, John',
+                          'tolle, Eckhart'])
+        self.assertEqual([r['text'] for r in second['results']],
+                         ['Tolstoy, Leo', 'Twain, Mark'])
+        self.assertIsNone(second['next'])
+
+    def test_unknown_kind(self):
+        self.assertEqual(self._lookup('user').status_code, 404)
+        self.assertEqual(self._lookup('author', cursor='x').status_code, 404)
+
+    def test_permission_required(self):
+        self.client.force_login(User.objects.create_user('patron'))
+
+        self.assertEqual(self._lookup('author').status_code, 403)
+
+
+class AutocompleteTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tolkien = Author.objects.create(first_name='John',
+                                            last_name='Tolkien')
+        cls.books = [Book.objects.create(title=title, author=cls.tolkien,
+                                         isbn=f'978000000000{number}')
+                     for number, title in enumerate(
+                         ['The Hobbit', 'The Silmarillion', 'Tolstoy Lives'])]
+
+    def setUp(self):
+        prefix_index.index.clear()
+        registry.reset()
+
+    def _search(self, q):
+        response = self.client.get(reverse('autocomplete'), {'q': q})
+        data = response.json()
+        return [item['text'] for item in data['books']], \
+            [item['text'] for item in data['authors']]
+
+    def test_prefixes(self):
+        self.assertEqual(self._search('the '),
+                         (['The Hobbit', 'The Silmarillion'], []))
+        self.assertEqual(self._search('TOL'),
+                         (['Tolstoy Lives'], ['Tolkien, John']))
+        self.assertEqual(self._search('john t'), ([], ['Tolkien, John']))
+        self.assertEqual(self._search('tolkien,j'), ([], ['Tolkien, John']))
+        self.assertEqual(self._search(''), ([], []))
+
+    def test_no_queries_once_built(self):
+        prefix_index.index.search('x')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(prefix_index.index.search('the h')['book'],
+                             [(self.books[0].pk, 'The Hobbit')])
+
+    def test_kept_current_by_signals(self):
+        prefix_index.index.search('x')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books[0].title = 'There and Back Again'
+            self.books[0].save()
+            self.books[1].delete()
+            Author.objects.create(first_name='Leo', last_name='Tolstoy')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self._search('the'),
+                             (['There and Back Again'], []))
+            self.assertEqual(self._search('tol')[1],
+                             ['Tolkien, John', 'Tolstoy, Leo'])
+
+    def test_changes_during_a_build_kept(self):
+        prefix_index.index.search('x')
+        load = prefix_index.PrefixIndex._load
+
+        def load_and_change():
+            kinds = load()
+            # Committed after the build read the tables, before the swap
+            title = 'Unfinished Tales'
+            prefix_index.index.update(prefix_index.BOOK, self.books[0].pk,
+                                      title, prefix_index.book_keys(title))
+            prefix_index.index.remove(prefix_index.BOOK, self.books[1].pk)
+            return kinds
+
+        with mock.patch.object(prefix_index.index, '_load', load_and_change):
+            prefix_index.index.build()
+
+        self.assertEqual(self._search('unf')[0], ['Unfinished Tales'])
+        self.assertEqual(self._search('the')[0], [])
+
+    @override_settings(CATALOG_PREFIX_INDEX_MAX_AGE=0)
+    def test_rebuilt_when_expired(self):
+        prefix_index.index.search('x')
+        Author.objects.create(first_name='Leo', last_name='Tolstoy')
+
+        self.assertEqual(self._search('tols')[1], ['Tolstoy, Leo'])
+
+    @override_settings(CATALOG_PREFIX_INDEX_MAX_AGE=0)
+    def test_old_index_searched_during_a_rebuild(self):
+        prefix_index.index.search('x')
+        Author.objects.create(first_name='Leo', last_name='Tolstoy')
+
+        # Another thread is rebuilding it
+        with prefix_index.index.build_lock, self.assertNumQueries(0):
+            self.assertEqual(self._search('tol')[1], ['Tolkien, John'])
+
+    def test_metrics(self):
+        prefix_index.index.search('x')
+        metrics = registry.render()
+
+        self.assertIn('catalog_prefix_index_keys 5\n', metrics)
+        self.assertRegex(metrics, r'catalog_prefix_index_bytes [1-9]\d*\n')
+        self.assertIn('catalog_prefix_index_build_seconds ', metrics)
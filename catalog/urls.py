@@ -3,6 +3,10 @@ from . import views
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('search/', views.search, name='search'),
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
+    path('export/', views.export_catalog_view, name='catalog-export'),
+    path('_metrics', views.metrics, name='catalog-metrics'),
     path('books/<int:pk>', views.BookDetailView.as_view(), name='book-detail'),
     path('books/create/', views.BookCreate.as_view(), name='books-create'),
     path('books/<int:pk>/update/', views.BookUpdate.as_view(), name='books-update'),
@@ -10,6 +14,8 @@ urlpatterns = [
     path('books/<uuid:inst_id>/renew/', views.renew_book_librarian, name='books-renew-librarian'),
     path('books/all/', views.BookListView.as_view(), name='books-all'),
     path('books/all/copies', views.BookInstanceListView.as_view(), name='books-all-copies'),
+    path('books/bulk/', views.bulk_loans, name='books-bulk'),
+    path('lookup/<slug:kind>/', views.lookup, name='catalog-lookup'),
 
     path('my/books/', views.UserLoanedBooksListView.as_view(), name='my-books'),
 
@@ -1,46 +1,96 @@
-import datetime
-
 from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect, Http404, \
+    JsonResponse, StreamingHttpResponse
 from django.urls import reverse, reverse_lazy
+from django.db.models import Max, OuterRef, Subquery
 from django.views import generic
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.contrib.auth.decorators import login_required, permission_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 
-from .models import Book, Author, BookInstance, Genre, Language
-from .forms import RenewBookForm
+from .models import Book, Author, BookInstance
+from . import export, loans, lookups, prefix_index, visits
+from .forms import RenewBookForm, BulkLoanForm, BookForm, \
+    default_renewal_date
+from .metrics import registry
+from .caching import ConditionalPageMixin, version_key, cache_timeout, \
+    latest
+from .pagination import KeysetPaginator, InvalidCursor, \
+    CursorPaginationMixin
+from .search import search_books
+from .stats import get_dashboard_stats
+
+
+SEARCH_RESULTS = 20
+LOOKUP_RESULTS = 20
+AUTOCOMPLETE_RESULTS = 10
 
 
 def index(request):
-    num_visits = request.session.get('num_visits', 0)
-    request.session['num_visits'] = num_visits + 1
-
-    num_books = Book.objects.all().count()
-    languages = list(Language.objects.all().values_list('name', flat=True))
-    genres = list(Genre.objects.all().values_list('name', flat=True))
-    num_authors = Author.objects.all().count()
-    num_author_rinat = Author.objects\
-        .filter(first_name__iexact='rinat',
-                last_name__iexact='ibragimov')\
-        .count()
-    num_instances = BookInstance.objects.all().count()
-    num_instances_available = BookInstance\
-        .objects.filter(status__exact='a').count()
-
-    # A dictionary mapping above variables to names
+    # Counted in a signed cookie, the homepage writes nothing server-side
+    num_visits = visits.visit_count(request)
+
+    # All record counts come from one aggregated query, usually served
+    #   from the cached snapshot (see catalog.stats)
     context = {
         'num_visits': num_visits,
-        'num_books': num_books,
-        'num_languages': languages,
-        'num_genres': genres,
-        'num_authors': num_authors,
-        'num_author_rinat': num_author_rinat,
-        'num_instances': num_instances,
-        'num_instances_available': num_instances_available,
+        **get_dashboard_stats(),
     }
 
-    return render(request, 'index.html', context=context)
+    return visits.record_visit(
+        render(request, 'index.html', context=context), num_visits)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    results = search_books(query, limit=SEARCH_RESULTS) if query else []
+
+    context = {'query': query,
+               'results': results}
+
+    return render(request, 'search_results.html', context)
+
+
+def autocomplete(request):
+    """
+    Books and authors whose title or name starts with 'q', answered from the
+      in-process prefix index without a query (see catalog.prefix_index)
+    """
+    matches = prefix_index.index.search(request.GET.get('q', ''),
+                                        AUTOCOMPLETE_RESULTS)
+
+    return JsonResponse({
+        'books': [{'id': pk, 'text': title,
+                   'url': reverse('book-detail', args=[pk])}
+                  for pk, title in matches[prefix_index.BOOK]],
+        'authors': [{'id': pk, 'text': name,
+                     'url': reverse('authors-detail', args=[pk])}
+                    for pk, name in matches[prefix_index.AUTHOR]],
+    })
+
+
+@login_required
+@permission_required('catalog.can_view_all_books', raise_exception=True)
+def export_catalog_view(request):
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in export.FORMATS:
+        raise Http404(f'Unknown export format "{fmt}"')
+
+    content_type, extension = export.FORMATS[fmt]
+    response = StreamingHttpResponse(export.export_catalog(fmt),
+                                     content_type=content_type)
+    response['Content-Disposition'] = \
+        f'attachment; filename="catalog.{extension}"'
+
+    return response
+
+
+@staff_member_required
+def metrics(request):
+    return HttpResponse(registry.render(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
 
 @login_required
 @permission_required('catalog.can_mark_returned_books', raise_exception=True)
@@ -53,15 +103,13 @@ def renew_book_librarian(request, inst_id):
         form = RenewBookForm(request.POST)
 
         if form.is_valid():
-            # Save the cleaned input data
-            book_inst.due_back = form.cleaned_data['renewal_date']
-            book_inst.save()
+            # Save the cleaned input data, writing the changed column only
+            book_inst.due_back = form.cleaned_data['due_back']
+            book_inst.save(update_fields=['due_back', 'updated_at'])
             # Redirect to a new url
             return HttpResponseRedirect(reverse('books-all-copies'))
     else:
-        def_renew_date = datetime.date.today() + datetime.timedelta(weeks=3)
-
-        form = RenewBookForm(initial={'renewal_date': def_renew_date})
+        form = RenewBookForm(initial={'due_back': default_renewal_date()})
 
     context = {'form': form,
                'book_instance': book_inst}
@@ -69,52 +117,257 @@ def renew_book_librarian(request, inst_id):
     return render(request, 'book_renew_librarian.html', context)
 
 
-class UserLoanedBooksListView(LoginRequiredMixin, generic.ListView):
+@login_required
+@permission_required('catalog.can_mark_returned_books', raise_exception=True)
+def bulk_loans(request):
+    """
+    Renew or check in many copies in one go; answers with JSON when the
+      client prefers it, eg. a scanner posting the IDs
+    """
+    results = None
+
+    if request.method == 'POST':
+        form = BulkLoanForm(request.POST)
+
+        if form.is_valid():
+            results = loans.apply(form.cleaned_data['action'],
+                                  form.cleaned_data['instance_ids'],
+                                  form.cleaned_data['due_back'])
+    else:
+        form = BulkLoanForm(initial={'due_back': default_renewal_date()})
+
+    if request.get_preferred_type(['text/html', 'application/json']) \
+            == 'application/json':
+        if results is None:
+            return JsonResponse({'errors': form.errors.get_json_data()},
+                                status=400)
+        return JsonResponse({
+            'results': [{'instance_id': token, 'result': outcome}
+                        for token, outcome in results],
+            'summary': loans.summarize(results),
+        })
+
+    context = {'form': form,
+               'results': results,
+               'summary': loans.summarize(results) if results else None}
+
+    return render(request, 'bookinstance_bulk.html', context)
+
+
+@login_required
+@permission_required('catalog.can_edit_books', raise_exception=True)
+def lookup(request, kind):
+    """
+    A page of the authors, genres or languages whose names start with 'q',
+      for the book form's autocomplete widgets (see catalog.lookups)
+    """
+    if kind not in lookups.LOOKUPS:
+        raise Http404(f'Unknown lookup "{kind}"')
+
+    lookup = lookups.LOOKUPS[kind]
+    try:
+        page = lookup.page(request.GET.get('q', ''),
+                           request.GET.get('cursor'), LOOKUP_RESULTS)
+    except InvalidCursor as e:
+        raise Http404(str(e))
+
+    return JsonResponse({'results': lookup.results(page),
+                         'next': page.next_cursor})
+
+
+class UserLoanedBooksListView(LoginRequiredMixin, CursorPaginationMixin,
+                              generic.ListView):
     template_name = 'bookinstance_user_borrowed_list.html'
     model = BookInstance
     paginate_by = 2
+    cursor_ordering = ('due_back', 'instance_id')
 
     def get_queryset(self):
         return BookInstance.objects\
             .filter(borrower=self.request.user)\
             .filter(status__exact='o')\
-            .order_by('due_back')
+            .select_related('book')
 
 
-class BookInstanceListView(PermissionRequiredMixin, generic.ListView):
+class BookInstanceListView(PermissionRequiredMixin, generic.TemplateView):
+    """
+    All copies grouped by loan status, each status section paged on its own
+      by (due_back, instance_id) so every section costs one LIMIT query
+    """
     template_name = 'bookinstance_list.html'
-    model = BookInstance
-    context_object_name = 'instance_list'
-
     permission_required = 'catalog.can_view_all_books'
 
-    def get_queryset(self):
-        return BookInstance.objects.all()
-
+    paginate_by = 20
+    ordering = ('due_back', 'instance_id')
+    sections = (('a', 'Available'),
+                ('o', 'On Loan'),
+                ('r', 'Reserved'),
+                ('m', 'Unavailable'))
 
-class BookListView(generic.ListView):
+    def get_queryset(self):
+        return BookInstance.objects.select_related('book', 'borrower')
+
+    def _section_url(self, status, cursor):
+        # Keep the position of the other sections when paging this one
+        query = self.request.GET.copy()
+        query[status] = cursor
+
+        return f'{self.request.path}?{query.urlencode()}'
+
+    def get_paginators(self):
+        """A KeysetPaginator for each section, with the section's cursor"""
+        queryset = self.get_queryset()
+
+        return [(KeysetPaginator(queryset.filter(status=status),
+                                 self.ordering, self.paginate_by),
+                 self.request.GET.get(status))
+                for status, _ in self.sections]
+
+    def get_context_data(self, pages=None, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        if pages is None:
+            try:
+                pages = [paginator.page(cursor)
+                         for paginator, cursor in self.get_paginators()]
+            except InvalidCursor:
+                raise Http404('Invalid page cursor')
+
+        sections = []
+        for (status, heading), page in zip(self.sections, pages):
+            sections.append({
+                'status': status,
+                'heading': heading,
+                'page': page,
+                'next_url': self._section_url(status, page.next_cursor)
+                if page.has_next() else None,
+                'previous_url': self._section_url(status,
+                                                  page.previous_cursor)
+                if page.has_previous() else None,
+            })
+
+        context['sections'] = sections
+        context['has_instances'] = any(s['page'] for s in sections)
+
+        return context
+
+
+class BookListView(ConditionalPageMixin, CursorPaginationMixin, generic.ListView):
     template_name = 'book_list.html'
     model = Book
     context_object_name = 'book_list'
     paginate_by = 2
+    cursor_ordering = ('title', 'id')
+    cache_scopes = ('books',)
 
+    def get_queryset(self):
+        return Book.objects.select_related('author')
 
-class BookDetailView(generic.DetailView):
+    def get_last_modified(self):
+        authors = Author.objects.order_by('-updated_at').values('updated_at')
+        row = Book.objects\
+            .order_by('-updated_at')\
+            .annotate(author_at=Subquery(authors[:1]))\
+            .values_list('updated_at', 'author_at')\
+            .first()
+
+        return latest(*row) if row else None
+
+
+class BookDetailView(ConditionalPageMixin, generic.DetailView):
+    """
+    Book with its author, language and genres in two queries; its copies
+      are read by a third one unless the copies fragment is cached
+    """
     template_name = 'book_detail.html'
     model = Book
 
+    def get_cache_scopes(self):
+        return (f'book:{self.kwargs["pk"]}', 'genres', 'languages')
+
+    def get_queryset(self):
+        copies = BookInstance.objects\
+            .filter(book=OuterRef('pk'))\
+            .order_by()\
+            .values('book')\
+            .annotate(latest=Max('updated_at'))\
+            .values('latest')
+
+        return Book.objects\
+            .select_related('author', 'language')\
+            .prefetch_related('genre')\
+            .annotate(copies_updated_at=Subquery(copies))
+
+    def get_object(self, queryset=None):
+        # Loaded once, for Last-Modified and for the page
+        if getattr(self, 'object', None) is None:
+            self.object = super().get_object(queryset)
+        return self.object
 
-class AuthorListView(generic.ListView):
+    def get_last_modified(self):
+        book = self.get_object()
+
+        return latest(book.updated_at, book.copies_updated_at,
+                      book.author.updated_at if book.author else None)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['copies_version'] = version_key(f'copies:{self.object.pk}')
+        context['cache_timeout'] = cache_timeout()
+
+        return context
+
+
+class AuthorListView(ConditionalPageMixin, CursorPaginationMixin, generic.ListView):
     template_name = 'author_list.html'
     model = Author
     context_object_name = 'author_list'
     paginate_by = 5
+    cursor_ordering = ('last_name', 'first_name', 'id')
+    cache_scopes = ('authors',)
+
+    def get_last_modified(self):
+        return Author.objects.order_by('-updated_at')\
+            .values_list('updated_at', flat=True)\
+            .first()
 
 
-class AuthorDetailView(generic.DetailView):
+class AuthorDetailView(ConditionalPageMixin, generic.DetailView):
     template_name = 'author_detail.html'
     model = Author
 
+    def get_cache_scopes(self):
+        return (f'author:{self.kwargs["pk"]}',)
+
+    def get_queryset(self):
+        books = Book.objects\
+            .filter(author=OuterRef('pk'))\
+            .order_by()\
+            .values('author')\
+            .annotate(latest=Max('updated_at'))\
+            .values('latest')
+
+        return Author.objects\
+            .annotate(books_updated_at=Subquery(books))
+
+    def get_object(self, queryset=None):
+        if getattr(self, 'object', None) is None:
+            self.object = super().get_object(queryset)
+        return self.object
+
+    def get_last_modified(self):
+        author = self.get_object()
+
+        return latest(author.updated_at, author.books_updated_at)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['books_version'] = \
+            version_key(f'author-books:{self.object.pk}')
+        context['cache_timeout'] = cache_timeout()
+
+        return context
+
 
 class AuthorCreate(PermissionRequiredMixin, CreateView):
     template_name = 'author_edit_form.html'
@@ -146,7 +399,7 @@ class BookCreate(PermissionRequiredMixin, CreateView):
     permission_required = 'catalog.can_edit_books'
 
     model = Book
-    fields = ['title', 'author', 'summary', 'isbn', 'genre', 'language']
+    form_class = BookForm
 
 
 class BookUpdate(PermissionRequiredMixin, UpdateView):
@@ -154,7 +407,7 @@ class BookUpdate(PermissionRequiredMixin, UpdateView):
     permission_required = 'catalog.can_edit_books'
 
     model = Book
-    fields = ['title', 'author', 'summary', 'isbn', 'genre', 'language']
+    form_class = BookForm
 
 
 class BookDelete(PermissionRequiredMixin, DeleteView):
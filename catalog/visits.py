@@ -0,0 +1,46 @@
+from django.conf import settings
+
+
+# The homepage's visit count is kept by the client in a signed cookie, so
+#   counting a visit never writes the session (or anything else) server-side
+VISITS_COOKIE = getattr(settings, 'CATALOG_VISITS_COOKIE', 'catalog_visits')
+VISITS_COOKIE_AGE = getattr(settings, 'CATALOG_VISITS_COOKIE_AGE',
+                            365 * 24 * 60 * 60)
+VISITS_SALT = 'catalog.visits'
+
+# Where the count used to be kept, read once for visitors who still have it
+SESSION_KEY = 'num_visits'
+
+
+def _cookie_count(request):
+    value = request.get_signed_cookie(VISITS_COOKIE, default=None,
+                                      salt=VISITS_SALT)
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def visit_count(request):
+    """Visits before this one, a tampered or missing cookie counts as none"""
+    count = _cookie_count(request)
+    if count is None:
+        count = request.session.get(SESSION_KEY, 0)
+    return count
+
+
+async def avisit_count(request):
+    """visit_count() for async views"""
+    count = _cookie_count(request)
+    if count is None:
+        count = await request.session.aget(SESSION_KEY, 0)
+    return count
+
+
+def record_visit(response, count):
+    """Store the count including this visit in the response's cookie"""
+    response.set_signed_cookie(VISITS_COOKIE, str(count + 1),
+                               salt=VISITS_SALT, max_age=VISITS_COOKIE_AGE,
+                               secure=settings.SESSION_COOKIE_SECURE,
+                               httponly=True, samesite='Lax')
+    return response
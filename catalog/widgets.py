@@ -0,0 +1,51 @@
+from django import forms
+from django.urls import reverse
+
+
+class AutocompleteMixin:
+    """
+    Select widget for a model choice field which renders only the selected
+      options, the rest are searched for through the lookup endpoint
+      (catalog.lookups) by static/js/autocomplete.js. Rendering a form no
+      longer reads the whole table.
+    """
+    def __init__(self, kind, attrs=None, choices=()):
+        self.kind = kind
+        super().__init__(attrs, choices)
+
+    @property
+    def media(self):
+        return forms.Media(js=['js/autocomplete.js'])
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        attrs['data-lookup-url'] = reverse('catalog-lookup', args=[self.kind])
+        return attrs
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [v for v in value if v not in ('', None)]
+        choices = self.choices
+        options = []
+
+        if choices.field.empty_label is not None \
+                and not self.allow_multiple_selected:
+            options.append(self.create_option(
+                name, '', choices.field.empty_label, not selected, 0))
+
+        if selected:
+            objects = choices.queryset.filter(pk__in=selected)
+            for index, obj in enumerate(objects, start=len(options)):
+                option_value = choices.choice(obj)[0]
+                options.append(self.create_option(
+                    name, option_value, choices.field.label_from_instance(obj),
+                    True, index))
+
+        return [(None, options, 0)]
+
+
+class AutocompleteSelect(AutocompleteMixin, forms.Select):
+    pass
+
+
+class AutocompleteSelectMultiple(AutocompleteMixin, forms.SelectMultiple):
+    pass
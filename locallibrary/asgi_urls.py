@@ -0,0 +1,14 @@
+"""
+URL configuration of the ASGI application: locallibrary.urls with the
+  catalog's read-only pages served by their async views (catalog.async_urls)
+"""
+from django.urls import path, include
+
+from . import urls
+
+
+urlpatterns = [
+    path('catalog/', include('catalog.async_urls'))
+    if str(pattern.pattern) == 'catalog/' else pattern
+    for pattern in urls.urlpatterns
+]
@@ -47,6 +47,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the middleware as well
+    'catalog.middleware.RequestMetricsMiddleware',
+    'catalog.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,7 +59,12 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware'
 ]
 
-ROOT_URLCONF = 'locallibrary.urls'
+# The catalog's read-only pages have async versions, served when
+#   DJANGO_ASYNC_VIEWS is True (the default under ASGI, see asgi.py)
+CATALOG_ASYNC_VIEWS = os.environ.get('DJANGO_ASYNC_VIEWS', '') == 'True'
+
+ROOT_URLCONF = 'locallibrary.asgi_urls' if CATALOG_ASYNC_VIEWS \
+    else 'locallibrary.urls'
 
 TEMPLATES = [
     {
@@ -80,12 +88,91 @@ WSGI_APPLICATION = 'locallibrary.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
+# Connections are kept open between requests (checked before reuse).
+#   DJANGO_REPLICA_DBS adds read replicas, a comma-separated list of SQLite
+#   files kept in step with the primary (see the sync_replica command).
+#   Every SQLite connection gets the pragma profile of catalog.sqlite (WAL,
+#   mmap...), CATALOG_SQLITE_PRAGMAS overrides single pragmas; run the
+#   maintain_sqlite command periodically to optimize and checkpoint. WAL is
+#   stored in the database file, so db.sqlite3 stays in WAL mode once opened,
+#   next to its (ignored) -wal and -shm files
+CONN_MAX_AGE = int(os.environ.get('DJANGO_CONN_MAX_AGE', 60))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+CATALOG_READ_REPLICAS = []
+for number, name in enumerate(
+        filter(None, os.environ.get('DJANGO_REPLICA_DBS', '').split(',')),
+        start=1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name.strip(),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    }
+    CATALOG_READ_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['catalog.routers.ReplicaRouter']
+
+
+# Cache for the dashboard and the catalog's pages and fragments, shared
+#   between processes through DJANGO_REDIS_URL (eg. redis://localhost:6379,
+#   needs the redis package) or DJANGO_CACHE_DIR (a directory on this host).
+#   Otherwise it is in process memory, where a change only retires the pages
+#   of the process making it: the others keep serving theirs for up to
+#   CATALOG_LOCAL_CACHE_TIMEOUT seconds (see catalog.caching)
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+SHARED_CACHE = True
+
+if os.environ.get('DJANGO_REDIS_URL'):
+    DEFAULT_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['DJANGO_REDIS_URL'],
+    }
+elif os.environ.get('DJANGO_CACHE_DIR'):
+    DEFAULT_CACHE = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['DJANGO_CACHE_DIR'],
     }
+else:
+    DEFAULT_CACHE = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+    SHARED_CACHE = False
+
+CACHES = {'default': DEFAULT_CACHE}
+
+
+# Sessions in the database and, with cached_db (the default when the cache
+#   above is shared), in the cache too, so authenticated requests read them
+#   without a query; 'file' keeps them in DJANGO_SESSION_DIR instead
+#   (default: the system's temp directory). cached_db falls back to db with
+#   a process-local cache, where a logout would only retire the session in
+#   the process serving it. Purge expired ones with the purge_sessions command
+# https://docs.djangoproject.com/en/4.0/topics/http/sessions/
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'file': 'django.contrib.sessions.backends.file',
 }
+SESSION_ENGINE_NAME = os.environ.get('DJANGO_SESSION_ENGINE',
+                                    'cached_db' if SHARED_CACHE else 'db')
+if SESSION_ENGINE_NAME == 'cached_db' and not SHARED_CACHE:
+    SESSION_ENGINE_NAME = 'db'
+SESSION_ENGINE = SESSION_ENGINES[SESSION_ENGINE_NAME]
+SESSION_FILE_PATH = os.environ.get('DJANGO_SESSION_DIR')
 
 
 # Password validation
@@ -106,6 +193,11 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Permission checks (PermissionRequiredMixin, {{ perms }}) read each user's
+#   permissions from the cache above when it is shared (Redis or files),
+#   retired when they or their groups change; from the database otherwise
+AUTHENTICATION_BACKENDS = ['catalog.permissions.CachedModelBackend']
+
 # Redirect to homepage after logging in
 LOGIN_REDIRECT_URL = '/'
 
@@ -134,3 +226,8 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Request metrics (catalog.middleware), served to staff at /catalog/_metrics.
+#   Requests running more queries than the budget are logged, unset disables it
+CATALOG_QUERY_BUDGET = int(os.environ['CATALOG_QUERY_BUDGET']) \
+    if os.environ.get('CATALOG_QUERY_BUDGET') else None